@@ -2,16 +2,68 @@
 Funciones CRUD genéricas y reutilizables
 Operaciones comunes de base de datos para todos los modelos
 """
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy import or_, and_, func
-from typing import Optional, List, Dict, Any, Type, TypeVar
+from sqlalchemy import or_, and_, func, insert, select, bindparam
+from typing import Optional, List, Dict, Any, Tuple, Type, TypeVar
+from functools import lru_cache
 from fastapi import HTTPException
 from app.database import Base
+from app.utils.helpers import dividir_lista
+from app.services import indice_busqueda
 
 # TypeVar para tipado genérico
 ModelType = TypeVar("ModelType", bound=Base)
 
+# =============================================
+# CONSULTAS PRECOMPILADAS
+# =============================================
+
+@lru_cache(maxsize=256)
+def consulta_por_campos(model: Type[ModelType], *campos: str, nulos: Tuple[str, ...] = ()):
+    """
+    SELECT de un registro filtrado por igualdad en los campos indicados
+    
+    La sentencia se construye una sola vez por (modelo, campos, nulos) con
+    parámetros nombrados igual que los campos, así que las búsquedas
+    repetidas no vuelven a armar el Query y reutilizan la compilación
+    en caché de SQLAlchemy
+    
+    Los campos en nulos se filtran con IS NULL y no llevan parámetro
+    (`campo = NULL` no coincide con ninguna fila): un parámetro con valor
+    None exige la variante con ese campo en nulos (obtener_por_campos la elige)
+    
+    Example:
+        stmt = consulta_por_campos(Producto, "CodigoBarras", "Activo")
+        producto = db.execute(stmt, {"CodigoBarras": codigo, "Activo": True}).scalars().first()
+    """
+    return select(model).where(
+        *[
+            getattr(model, campo).is_(None) if campo in nulos else getattr(model, campo) == bindparam(campo)
+            for campo in campos
+        ]
+    ).limit(1)
+
+
+def obtener_por_campos(db: Session, model: Type[ModelType], **valores) -> Optional[ModelType]:
+    """
+    Un registro por igualdad en uno o más campos usando la sentencia en caché
+    Los valores None se comparan con IS NULL
+    
+    Example:
+        usuario = obtener_por_campos(db, Usuario, IdUsuario=1, NombreUsuario="admin")
+    """
+    nulos = tuple(campo for campo, valor in valores.items() if valor is None)
+    stmt = consulta_por_campos(model, *valores.keys(), nulos=nulos)
+    if nulos:
+        valores = {campo: valor for campo, valor in valores.items() if valor is not None}
+    return db.execute(stmt, valores).scalars().first()
+
+
 # =============================================
 # OPERACIONES BÁSICAS CRUD
 # =============================================
@@ -100,9 +152,7 @@ def obtener_registro(
         HTTPException: Si raise_not_found=True y no se encuentra
     """
     try:
-        registro = db.query(model).filter(
-            getattr(model, id_field) == id_val
-        ).first()
+        registro = obtener_por_campos(db, model, **{id_field: id_val})
         
         if not registro and raise_not_found:
             raise HTTPException(
@@ -140,9 +190,7 @@ def obtener_por_campo(
         Instancia del modelo o None
     """
     try:
-        registro = db.query(model).filter(
-            getattr(model, campo) == valor
-        ).first()
+        registro = obtener_por_campos(db, model, **{campo: valor})
         
         if not registro and raise_not_found:
             raise HTTPException(
@@ -194,24 +242,7 @@ def listar_registros(
         )
     """
     try:
-        query = db.query(model)
-        
-        # Aplicar filtros exactos
-        if filtros:
-            for field, val in filtros.items():
-                if hasattr(model, field):
-                    query = query.filter(getattr(model, field) == val)
-        
-        # Aplicar búsqueda con LIKE
-        if buscar:
-            condiciones = []
-            for field, texto in buscar.items():
-                if hasattr(model, field):
-                    condiciones.append(
-                        getattr(model, field).like(f"%{texto}%")
-                    )
-            if condiciones:
-                query = query.filter(or_(*condiciones))
+        query = aplicar_filtros(db.query(model), model, filtros, buscar)
         
         # Aplicar ordenamiento
         if ordenar_por and hasattr(model, ordenar_por):
@@ -231,6 +262,36 @@ def listar_registros(
         )
 
 
+def aplicar_filtros(
+    query,
+    model: Type[ModelType],
+    filtros: Optional[Dict[str, Any]] = None,
+    buscar: Optional[Dict[str, str]] = None
+):
+    """
+    Aplica filtros exactos {campo: valor} y búsqueda LIKE {campo: texto}
+    Sirve tanto para Query como para select()
+    """
+    # Aplicar filtros exactos
+    if filtros:
+        for field, val in filtros.items():
+            if hasattr(model, field):
+                query = query.where(getattr(model, field) == val)
+    
+    # Aplicar búsqueda con LIKE
+    if buscar:
+        condiciones = []
+        for field, texto in buscar.items():
+            if hasattr(model, field):
+                condiciones.append(
+                    getattr(model, field).like(f"%{texto}%")
+                )
+        if condiciones:
+            query = query.where(or_(*condiciones))
+    
+    return query
+
+
 def contar_registros(
     db: Session,
     model: Type[ModelType],
@@ -436,6 +497,9 @@ def buscar_registros(
 ) -> List[ModelType]:
     """
     Búsqueda avanzada en múltiples campos
+    Si hay un índice de trigramas listo para el modelo y los campos
+    (services/indice_busqueda) se usa en lugar de LIKE, con resultados
+    ordenados por relevancia
     
     Args:
         db: Sesión de base de datos
@@ -459,6 +523,21 @@ def buscar_registros(
         )
     """
     try:
+        # Índice de trigramas en memoria si cubre el modelo, campos y filtros
+        indice = indice_busqueda.indice_para(model, campos_busqueda, filtros_adicionales)
+        if indice is not None:
+            ids = indice.buscar(termino_busqueda, filtros_adicionales, skip, limit)
+            if not ids:
+                return []
+            # Los filtros se repiten en SQL: el índice puede estar desactualizado
+            # respecto de cambios confirmados por otros workers
+            query = select(model).where(getattr(model, indice.id_field).in_(ids))
+            for field, val in (filtros_adicionales or {}).items():
+                if val is not None and hasattr(model, field):
+                    query = query.where(getattr(model, field) == val)
+            registros = db.scalars(query)
+            return indice_busqueda.ordenar_por_ids(registros, ids, indice.id_field)
+        
         query = db.query(model)
         
         # Aplicar filtros adicionales
@@ -533,6 +612,28 @@ def existe_registro(
         return False
 
 
+def valores_existentes(
+    db: Session,
+    model: Type[ModelType],
+    campo: str,
+    valores: List[Any],
+    tamano_lote: int = 2000
+) -> set:
+    """
+    Valores de un campo que ya existen en la base de datos
+    Una consulta IN por lote en lugar de una consulta por valor
+    (SQL Server admite como máximo 2100 parámetros por sentencia)
+    
+    Example:
+        repetidos = valores_existentes(db, Proveedor, "RUC", rucs)
+    """
+    columna = getattr(model, campo)
+    existentes = set()
+    for lote in dividir_lista(list(set(valores)), tamano_lote):
+        existentes.update(db.scalars(select(columna).where(columna.in_(lote))))
+    return existentes
+
+
 def obtener_o_crear(
     db: Session,
     model: Type[ModelType],
@@ -654,35 +755,61 @@ def actualizar_o_crear(
 # OPERACIONES MASIVAS
 # =============================================
 
-def crear_multiples(
+def insertar_en_bloque(
     db: Session,
     model: Type[ModelType],
     registros: List[Dict[str, Any]],
+    retornar: bool = True,
     commit: bool = True
 ) -> List[ModelType]:
     """
-    Crear múltiples registros en una sola transacción
+    Inserción masiva por la ruta de bulk insert del ORM
+    
+    Con retornar=True los registros se insertan por lotes con
+    INSERT ... OUTPUT INSERTED / RETURNING y las llaves generadas vuelven
+    en el mismo viaje, en el mismo orden que `registros`. Con retornar=False se usa executemany
+    (fast_executemany en SQL Server) y no se retorna nada
     
     Args:
         db: Sesión de base de datos
         model: Clase del modelo
         registros: Lista de diccionarios con datos
+        retornar: Si se retornan las instancias creadas
         commit: Si hace commit inmediatamente
         
     Returns:
-        Lista de instancias creadas
+        Lista de instancias creadas (vacía si retornar=False)
     """
+    if not registros:
+        return []
+    
     try:
-        instancias = [model(**datos) for datos in registros]
-        db.add_all(instancias)
+        if retornar:
+            # Con executemany el orden del RETURNING no está garantizado (SQL
+            # Server devuelve OUTPUT INSERTED en cualquier orden): se pide en el
+            # orden de `registros` para que instancias[i] corresponda a registros[i]
+            instancias = list(db.scalars(
+                insert(model).returning(model, sort_by_parameter_order=True), registros
+            ))
+        else:
+            db.execute(insert(model), registros)
+            instancias = []
         
         if commit:
-            db.commit()
+            # Las instancias ya vienen completas del RETURNING: se separan
+            # de la sesión para que el commit no las expire
             for inst in instancias:
-                db.refresh(inst)
+                db.expunge(inst)
+            db.commit()
         
         return instancias
         
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error de integridad en inserción masiva: {str(e.orig)}"
+        )
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(
@@ -691,6 +818,28 @@ def crear_multiples(
         )
 
 
+def crear_multiples(
+    db: Session,
+    model: Type[ModelType],
+    registros: List[Dict[str, Any]],
+    commit: bool = True
+) -> List[ModelType]:
+    """
+    Crear múltiples registros en una sola transacción
+    Usa insertar_en_bloque: sin un SELECT por cada registro creado
+    
+    Args:
+        db: Sesión de base de datos
+        model: Clase del modelo
+        registros: Lista de diccionarios con datos
+        commit: Si hace commit inmediatamente
+        
+    Returns:
+        Lista de instancias creadas
+    """
+    return insertar_en_bloque(db, model, registros, retornar=True, commit=commit)
+
+
 def eliminar_multiples(
     db: Session,
     model: Type[ModelType],
@@ -736,4 +885,164 @@ def eliminar_multiples(
         raise HTTPException(
             status_code=500,
             detail=f"Error al eliminar múltiples registros: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+# =============================================
+# PAGINACIÓN POR CURSOR (KEYSET)
+# =============================================
+
+def codificar_cursor(valores: List[Any]) -> str:
+    """
+    Token opaco con los valores de la última fila de la página
+    """
+    datos = json.dumps(
+        [v.isoformat() if isinstance(v, (datetime, date)) else v for v in valores],
+        default=str,
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(datos.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, columnas: List[Any]) -> List[Any]:
+    """
+    Recupera los valores del cursor con el tipo Python de cada columna
+    
+    Raises:
+        HTTPException 400: Si el cursor no es válido
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(valores, list) or len(valores) != len(columnas):
+            raise ValueError("Cantidad de valores incorrecta")
+        
+        convertidos = []
+        for columna, valor in zip(columnas, valores):
+            tipo = columna.type.python_type
+            if tipo is datetime:
+                valor = datetime.fromisoformat(valor)
+            elif tipo is date:
+                valor = date.fromisoformat(valor)
+            elif tipo is Decimal:
+                valor = Decimal(valor)
+            elif valor is not None:
+                valor = tipo(valor)
+            convertidos.append(valor)
+        return convertidos
+    except (ValueError, TypeError, json.JSONDecodeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def paginar_por_cursor(
+    query,
+    model: Type[ModelType],
+    id_field: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    ordenar_por: Optional[str] = None,
+    orden_desc: bool = False
+):
+    """
+    Ordena por (ordenar_por, id) y filtra las filas posteriores al cursor
+    Cada página es una búsqueda por índice sin importar su profundidad
+    
+    Sirve tanto para Query como para select(). Se pide limit + 1 filas
+    para saber si hay página siguiente (ver siguiente_cursor)
+    
+    Raises:
+        HTTPException 400: Si el campo de orden no existe o admite NULL
+    """
+    pk = getattr(model, id_field)
+    columnas = [pk]
+    if ordenar_por and ordenar_por != id_field:
+        if not hasattr(model, ordenar_por):
+            raise HTTPException(status_code=400, detail=f"Campo de orden '{ordenar_por}' no existe")
+        campo = getattr(model, ordenar_por)
+        if campo.nullable:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No se puede paginar por cursor sobre '{ordenar_por}' (admite NULL)"
+            )
+        columnas = [campo, pk]
+    
+    if cursor:
+        valores = decodificar_cursor(cursor, columnas)
+        if len(columnas) == 1:
+            condicion = pk < valores[0] if orden_desc else pk > valores[0]
+        else:
+            # El primer término (>= / <=) permite que el motor busque en el
+            # índice del campo; el resto desempata por id
+            campo, ultimo_id = columnas[0], valores[1]
+            if orden_desc:
+                condicion = and_(campo <= valores[0], or_(campo < valores[0], pk < ultimo_id))
+            else:
+                condicion = and_(campo >= valores[0], or_(campo > valores[0], pk > ultimo_id))
+        query = query.where(condicion)
+    
+    orden = [c.desc() if orden_desc else c for c in columnas]
+    return query.order_by(*orden).limit(limit + 1)
+
+
+def siguiente_cursor(
+    registros: List[ModelType],
+    limit: int,
+    id_field: str,
+    ordenar_por: Optional[str] = None
+) -> Optional[str]:
+    """
+    Recorta la fila extra de paginar_por_cursor y arma el cursor siguiente
+    Retorna None si no hay más páginas
+    """
+    if len(registros) <= limit:
+        return None
+    del registros[limit:]
+    ultimo = registros[-1]
+    if ordenar_por and ordenar_por != id_field:
+        return codificar_cursor([getattr(ultimo, ordenar_por), getattr(ultimo, id_field)])
+    return codificar_cursor([getattr(ultimo, id_field)])
+
+
+def listar_registros_cursor(
+    db: Session,
+    model: Type[ModelType],
+    id_field: str,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    filtros: Optional[Dict[str, Any]] = None,
+    ordenar_por: Optional[str] = None,
+    orden_desc: bool = False,
+    buscar: Optional[Dict[str, str]] = None
+) -> Tuple[List[ModelType], Optional[str]]:
+    """
+    Variante de listar_registros con paginación por cursor
+    
+    Args:
+        db: Sesión de base de datos
+        model: Clase del modelo
+        id_field: Nombre del campo ID (desempate del orden)
+        cursor: Token next_cursor de la página anterior (None = primera página)
+        limit: Máximo de registros a retornar
+        filtros: Diccionario de filtros exactos {campo: valor}
+        ordenar_por: Campo (NOT NULL) por el cual ordenar
+        orden_desc: Si el orden es descendente
+        buscar: Diccionario para búsqueda con LIKE {campo: texto}
+        
+    Returns:
+        (registros, next_cursor); next_cursor es None en la última página
+        
+    Example:
+        productos, cursor = listar_registros_cursor(db, Producto, "IdProducto", limit=50)
+        siguientes, cursor = listar_registros_cursor(db, Producto, "IdProducto", cursor=cursor, limit=50)
+    """
+    try:
+        query = aplicar_filtros(select(model), model, filtros, buscar)
+        query = paginar_por_cursor(query, model, id_field, limit, cursor, ordenar_por, orden_desc)
+        registros = list(db.scalars(query))
+        return registros, siguiente_cursor(registros, limit, id_field, ordenar_por)
+        
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al listar registros: {str(e)}"
+        )
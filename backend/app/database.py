@@ -1,13 +1,21 @@
 """
 Configuración de conexión a SQL Server usando SQLAlchemy
+Permite usar otro motor (ej: SQLite para pruebas de carga) con DATABASE_URL
 """
+import hashlib
 import os
+import time
+from typing import Dict
+from fastapi import Request
 from sqlalchemy import create_engine, event
 from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import urllib.parse
+from app.services import metricas_pool, metricas_sql
 
 # Cargar variables de entorno
 load_dotenv()
@@ -30,19 +38,96 @@ params = urllib.parse.quote_plus(
     "TrustServerCertificate=yes;"
 )
 
-SQLALCHEMY_DATABASE_URL = f"mssql+pyodbc:///?odbc_connect={params}"
+# DATABASE_URL reemplaza la conexión a SQL Server (ej: sqlite:///./jey2_bench.db)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"mssql+pyodbc:///?odbc_connect={params}"
+
+
+def opciones_engine(url: str, asincrono: bool = False) -> dict:
+    """
+    Opciones de create_engine según el motor de la URL
+    SQLite no admite pool_size con bases en memoria y sus conexiones
+    se comparten entre los hilos del threadpool
+    """
+    url_obj = make_url(url)
+    opciones = {}
+    
+    if url_obj.get_backend_name() == "sqlite":
+        opciones["connect_args"] = {"check_same_thread": False}
+        if url_obj.database in (None, "", ":memory:"):
+            return opciones
+    
+    opciones.update({
+        "pool_pre_ping": True,  # Verificar conexiones antes de usarlas
+        "pool_size": int(os.getenv("POOL_SIZE", 10)),  # Número de conexiones en el pool
+        "max_overflow": int(os.getenv("POOL_MAX_OVERFLOW", 20)),  # Conexiones adicionales si se necesitan
+        # Pool que mide la espera de checkout (ver services/metricas_pool.py)
+        "poolclass": metricas_pool.AsyncQueuePoolMedido if asincrono else metricas_pool.QueuePoolMedido,
+    })
+    
+    # executemany en un solo viaje con arreglos de parámetros (pyodbc)
+    # Los INSERT con RETURNING usan insertmanyvalues (OUTPUT INSERTED por lotes)
+    if url_obj.get_backend_name() == "mssql" and url_obj.get_driver_name() in ("pyodbc", "aioodbc"):
+        opciones["fast_executemany"] = True
+    return opciones
+
 
 # Crear engine de SQLAlchemy
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     echo=False,  # Cambiar a True para ver queries SQL en consola (útil para debug)
-    pool_pre_ping=True,  # Verificar conexiones antes de usarlas
-    pool_size=10,  # Número de conexiones en el pool
-    max_overflow=20,  # Conexiones adicionales si se necesitan
+    **opciones_engine(SQLALCHEMY_DATABASE_URL)
+)
+
+# =============================================
+# ENGINE ASÍNCRONO
+# =============================================
+
+# Equivalencias de driver síncrono -> asíncrono
+ASYNC_DRIVERS = {
+    "mssql": "mssql+aioodbc",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def obtener_url_async(url: str) -> str:
+    """
+    Deriva la URL asíncrona a partir de una URL síncrona
+    Ejemplo: mssql+pyodbc://... -> mssql+aioodbc://...
+    """
+    url_obj = make_url(url)
+    driver = ASYNC_DRIVERS.get(url_obj.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No hay driver asíncrono configurado para '{url_obj.drivername}'")
+    return url_obj.set(drivername=driver).render_as_string(hide_password=False)
+
+
+# ASYNC_DATABASE_URL permite apuntar a otra base (ej: sqlite+aiosqlite:///./jey2.db)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or obtener_url_async(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    **opciones_engine(ASYNC_DATABASE_URL, asincrono=True)
 )
 
+# =============================================
+# RÉPLICA DE LECTURA
+# =============================================
+
+# DATABASE_REPLICA_URL: réplica de solo lectura para listados y reportes
+# Sin ella, get_read_db usa el primario
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+replica_async_engine = None
+if DATABASE_REPLICA_URL:
+    ASYNC_DATABASE_REPLICA_URL = obtener_url_async(DATABASE_REPLICA_URL)
+    replica_async_engine = create_async_engine(
+        ASYNC_DATABASE_REPLICA_URL,
+        echo=False,
+        **opciones_engine(ASYNC_DATABASE_REPLICA_URL, asincrono=True)
+    )
+
 # Configurar opciones de sesión para SQL Server
-@event.listens_for(engine, "connect")
 def set_connection_options(dbapi_conn, connection_record):
     """Configurar opciones de conexión específicas de SQL Server"""
     cursor = dbapi_conn.cursor()
@@ -50,6 +135,20 @@ def set_connection_options(dbapi_conn, connection_record):
     cursor.execute("SET ARITHABORT ON")
     cursor.close()
 
+_engines = {"principal": engine, "principal_async": async_engine.sync_engine}
+if replica_async_engine is not None:
+    _engines["replica_async"] = replica_async_engine.sync_engine
+
+for _nombre, _engine in _engines.items():
+    if _engine.dialect.name == "mssql":
+        event.listen(_engine, "connect", set_connection_options)
+    
+    # Telemetría de pools (consultable en /api/interno/pool)
+    metricas_pool.instrumentar(_engine, _nombre)
+    
+    # Contabilidad de sentencias por petición y log de SQL lento
+    metricas_sql.instrumentar(_engine)
+
 # Crear SessionLocal para manejar sesiones de base de datos
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -57,6 +156,23 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# Sesiones asíncronas: expire_on_commit=False evita recargas implícitas
+# (lazy load) al serializar la respuesta después del commit
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# Sesiones de solo lectura contra la réplica (o el primario si no hay réplica)
+ReplicaSessionLocal = async_sessionmaker(
+    bind=replica_async_engine or async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base para los modelos
 Base = declarative_base()
 
@@ -75,6 +191,103 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    """
+    Generador de sesiones asíncronas de base de datos.
+    Uso en FastAPI:
+        @app.get("/usuarios/")
+        async def read_users(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(Usuario))
+            ...
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# =============================================
+# LECTURA DE LAS PROPIAS ESCRITURAS
+# =============================================
+
+# Segundos que un cliente sigue leyendo del primario después de escribir
+# (cubre el retraso de replicación)
+LECTURA_PROPIA_SEGUNDOS = float(os.getenv("LECTURA_PROPIA_SEGUNDOS", 5))
+
+# Cookie con el instante (epoch) hasta el que el cliente lee del primario
+# Permite respetar la ventana aunque la siguiente petición la atienda otro worker
+COOKIE_LECTURA_PRIMARIO = "jey2_lectura_primario"
+
+_ultimas_escrituras: Dict[str, float] = {}
+
+
+def clave_cliente(request: Request) -> str:
+    """
+    Identifica al cliente por su token (hash) o, si no tiene, por su IP
+    """
+    autorizacion = request.headers.get("authorization")
+    if autorizacion:
+        return "t:" + hashlib.sha1(autorizacion.encode("utf-8")).hexdigest()
+    return "ip:" + (request.client.host if request.client else "-")
+
+
+def registrar_escritura(request: Request) -> float:
+    """
+    Marca que el cliente acaba de escribir
+    Retorna el instante (epoch) hasta el que debe leer del primario
+    """
+    hasta = time.time() + LECTURA_PROPIA_SEGUNDOS
+    _ultimas_escrituras[clave_cliente(request)] = hasta
+    
+    if len(_ultimas_escrituras) > 10000:
+        ahora = time.time()
+        for clave, limite in list(_ultimas_escrituras.items()):
+            if limite < ahora:
+                _ultimas_escrituras.pop(clave, None)
+    return hasta
+
+
+def lectura_propia_pendiente(request: Request) -> bool:
+    """
+    True si el cliente escribió hace menos de LECTURA_PROPIA_SEGUNDOS
+    """
+    ahora = time.time()
+    if _ultimas_escrituras.get(clave_cliente(request), 0) > ahora:
+        return True
+    try:
+        return float(request.cookies.get(COOKIE_LECTURA_PRIMARIO, 0)) > ahora
+    except ValueError:
+        return False
+
+
+async def get_read_db(request: Request):
+    """
+    Sesión para endpoints de solo lectura (listados y reportes)
+    Usa la réplica, salvo que el cliente haya escrito recientemente
+    Uso en FastAPI:
+        @app.get("/productos/")
+        async def listar(db: AsyncSession = Depends(get_read_db)):
+            ...
+    """
+    async with fabrica_lectura(request)() as db:
+        yield db
+
+
+def fabrica_lectura(request: Request) -> async_sessionmaker:
+    """
+    Fábrica de sesiones de lectura para la petición: réplica, salvo que no
+    haya o que el cliente haya escrito recientemente
+    Útil para abrir la sesión dentro de un StreamingResponse, que sigue
+    leyendo después de que terminan las dependencias
+    """
+    if replica_async_engine is None or lectura_propia_pendiente(request):
+        return AsyncSessionLocal
+    return ReplicaSessionLocal
+
+# Consulta de versión por motor
+CONSULTAS_VERSION = {
+    "mssql": "SELECT @@VERSION",
+    "sqlite": "SELECT 'SQLite ' || sqlite_version()",
+}
+
 # Función para verificar conexión
 def test_connection():
     """
@@ -82,10 +295,11 @@ def test_connection():
     """
     try:
         with engine.connect() as connection:
-            result = connection.execute(text("SELECT @@VERSION"))
+            consulta = CONSULTAS_VERSION.get(engine.dialect.name, "SELECT 1")
+            result = connection.execute(text(consulta))
             version = result.fetchone()
-            print("✅ Conexión exitosa a SQL Server")
-            print(f"📊 Versión: {version[0][:50]}...")
+            print(f"✅ Conexión exitosa a la base de datos ({engine.dialect.name})")
+            print(f"📊 Versión: {str(version[0])[:50]}...")
             return True
     except Exception as e:
         print(f"❌ Error al conectar con la base de datos: {e}")
@@ -94,11 +308,25 @@ def test_connection():
 # Función para inicializar la base de datos
 def init_db():
     """
-    Crea todas las tablas en la base de datos (si no existen)
-    NOTA: Como tu BD ya existe, esto solo verificará las tablas
+    Prepara el esquema de la base de datos según ESQUEMA_MODO
+    Por defecto solo compara la huella de los modelos con la guardada en
+    ConfiguracionSistema y omite create_all si no hubo cambios
     """
+    from app.services import esquema
+    
     try:
-        Base.metadata.create_all(bind=engine)
-        print("✅ Base de datos verificada/inicializada")
+        resultado = esquema.preparar_esquema(engine)
+        if resultado["estado"] == "desactualizado":
+            print("⚠️  Los modelos cambiaron desde la última verificación del esquema")
+            print("   La reflexión no encontró tablas, columnas ni índices faltantes")
+            print("   Ejecute: python -m scripts.esquema verificar | migrar")
+        else:
+            print(f"✅ Base de datos {resultado['estado']} ({resultado['tiempo_ms']} ms)")
+        return resultado
+    except esquema.EsquemaInconsistente as e:
+        # No se atiende contra un esquema que no coincide con los modelos
+        print(f"❌ {e}")
+        raise
     except Exception as e:
-        print(f"❌ Error al inicializar base de datos: {e}")
\ No newline at end of file
+        print(f"❌ Error al inicializar base de datos: {e}")
+        return None
@@ -5,8 +5,13 @@ Sistema Jey2 - Abarrotería, Carnicería y Bodega Elda
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import test_connection, init_db
+from fastapi.responses import JSONResponse
+from app.database import test_connection, init_db, async_engine, replica_async_engine
+from app import database
+from app.services import metricas_pool, metricas_sql, monitor_salud, indice_busqueda, resumen_movimientos
+from starlette.concurrency import run_in_threadpool
 import os
+import time
 
 # Crear instancia de FastAPI
 app = FastAPI(
@@ -28,8 +33,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permitir todos los métodos (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Permitir todos los headers
+    expose_headers=["X-Next-Cursor", "ETag"],  # Headers legibles desde el frontend
 )
 
+# Contabilizar SQL por petición y devolverlo en el header Server-Timing
+@app.middleware("http")
+async def contabilizar_sql(request, call_next):
+    consultas, token = metricas_sql.iniciar_request(request.scope)
+    inicio = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metricas_sql.finalizar_request(token)
+    
+    tiempo_total_ms = (time.perf_counter() - inicio) * 1000
+    response.headers["Server-Timing"] = metricas_sql.server_timing(consultas, tiempo_total_ms)
+    metricas_sql.acumular(consultas, tiempo_total_ms)
+    
+    # Detector de N+1 (DETECTAR_N_MAS_1=log|error)
+    metricas_sql.verificar_n_mas_1(consultas)
+    return response
+
+# Después de una escritura el cliente lee del primario durante unos segundos
+# (solo aplica con réplica configurada en DATABASE_REPLICA_URL)
+@app.middleware("http")
+async def lectura_propia(request, call_next):
+    response = await call_next(request)
+    
+    if replica_async_engine is not None and request.method not in ("GET", "HEAD", "OPTIONS") \
+            and response.status_code < 400:
+        hasta = database.registrar_escritura(request)
+        response.set_cookie(
+            database.COOKIE_LECTURA_PRIMARIO,
+            f"{hasta:.3f}",
+            max_age=int(database.LECTURA_PROPIA_SEGUNDOS) + 1,
+            httponly=True,
+            samesite="lax"
+        )
+    return response
+
 # Montar carpeta de archivos estáticos (imágenes)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -37,14 +79,16 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # IMPORTAR Y REGISTRAR ROUTERS
 # =============================================
 
-from app.routers import auth, productos, usuarios, proveedores, imagenes
+from app.routers import auth, productos, usuarios, proveedores, inventario, imagenes, interno
 
 # Registrar routers con prefijos
 app.include_router(auth.router, prefix="/api/auth", tags=["Autenticación"])
 app.include_router(productos.router, prefix="/api/productos", tags=["Productos"])
 app.include_router(usuarios.router, prefix="/api/usuarios", tags=["Usuarios"])
 app.include_router(proveedores.router, prefix="/api/proveedores", tags=["Proveedores"])
+app.include_router(inventario.router, prefix="/api/inventario", tags=["Inventario"])
 app.include_router(imagenes.router, prefix="/api/imagenes", tags=["Imágenes"])
+app.include_router(interno.router, prefix="/api/interno", tags=["Interno"], include_in_schema=False)
 
 # =============================================
 # EVENTOS DE INICIO Y CIERRE
@@ -55,6 +99,7 @@ async def startup_event():
     """
     Se ejecuta al iniciar la aplicación
     """
+    inicio = time.perf_counter()
     print("=" * 50)
     print("Iniciando Sistema Jey2 API...")
     print("=" * 50)
@@ -64,9 +109,10 @@ async def startup_event():
         print("Base de datos conectada correctamente")
     else:
         print("Advertencia: No se pudo conectar a la base de datos")
+    conexion_ms = (time.perf_counter() - inicio) * 1000
     
-    # Inicializar base de datos (crear tablas si no existen)
-    init_db()
+    # Verificar el esquema (create_all solo si cambió la huella de los modelos)
+    esquema = init_db()
     
     # Crear carpetas para imágenes si no existen
     os.makedirs("static/imagenes/productos", exist_ok=True)
@@ -74,8 +120,33 @@ async def startup_event():
     os.makedirs("static/imagenes/proveedores", exist_ok=True)
     print("Carpetas de imágenes verificadas")
     
+    # Sondeo periódico de la base de datos para /health
+    monitor_salud.monitor.iniciar()
+    print(f"Monitor de salud activo (cada {monitor_salud.monitor.intervalo_seg:g} s)")
+    
+    # Índices de búsqueda en memoria (se construyen en segundo plano)
+    indice_busqueda.constructor.iniciar()
+    print("Construyendo índices de búsqueda en segundo plano")
+    
+    # Resúmenes de tendencias: incorporan los movimientos fuera de la venta
+    resumen_movimientos.actualizador.iniciar()
+    if resumen_movimientos.actualizador.intervalo_seg > 0:
+        print(f"Resúmenes de movimientos al día cada {resumen_movimientos.actualizador.intervalo_seg:g} s")
+    
+    # Ajuste automático del pool según la espera observada
+    if metricas_pool.autoajuste_habilitado():
+        metricas_pool.controlador.iniciar()
+        print("Autoajuste del pool de conexiones activado")
+    
+    # Tiempo de arranque en frío del worker
+    app.state.arranque = {
+        "conexion_ms": round(conexion_ms, 2),
+        "esquema": esquema,
+        "total_ms": round((time.perf_counter() - inicio) * 1000, 2),
+    }
+    
     print("=" * 50)
-    print("istema Jey2 API iniciado correctamente")
+    print(f"istema Jey2 API iniciado correctamente en {app.state.arranque['total_ms']:.0f} ms")
     print("Documentación disponible en: http://localhost:8000/docs")
     print("=" * 50)
 
@@ -87,6 +158,15 @@ async def shutdown_event():
     """
     print("=" * 50)
     print("Cerrando Sistema Jey2 API...")
+    
+    # Detener hilos de fondo y cerrar conexiones del pool asíncrono
+    monitor_salud.monitor.detener()
+    indice_busqueda.constructor.detener()
+    resumen_movimientos.actualizador.detener()
+    metricas_pool.controlador.detener()
+    await async_engine.dispose()
+    if replica_async_engine is not None:
+        await replica_async_engine.dispose()
     print("=" * 50)
 
 # =============================================
@@ -108,17 +188,23 @@ async def root():
 
 
 @app.get("/health")
-async def health_check():
+async def health_check(profundo: bool = False):
     """
     Verificar el estado de salud de la API
+    
+    Responde con el último sondeo del monitor de salud, sin tocar la base
+    de datos. Con profundo=true ejecuta un sondeo nuevo en el momento
     """
-    db_status = test_connection()
+    if profundo:
+        estado = await run_in_threadpool(monitor_salud.monitor.sondear)
+        estado = {**estado, "antiguedad_seg": 0.0, "sondeo": monitor_salud.monitor.resumen()}
+    else:
+        estado = monitor_salud.monitor.estado()
     
-    return {
-        "status": "healthy" if db_status else "unhealthy",
-        "database": "connected" if db_status else "disconnected",
-        "api_version": "1.0.0"
-    }
+    contenido = {**estado, "api_version": "1.0.0"}
+    if estado["status"] == "unhealthy":
+        return JSONResponse(status_code=503, content=contenido)
+    return contenido
 
 
 # =============================================
@@ -126,7 +212,6 @@ async def health_check():
 # =============================================
 
 from fastapi import Request
-from fastapi.responses import JSONResponse
 from sqlalchemy.exc import SQLAlchemyError
 
 @app.exception_handler(SQLAlchemyError)
@@ -1,12 +1,22 @@
 """
 Modelos SQLAlchemy para el sistema Jey2
 Mapean las tablas de SQL Server a clases Python
+Los valores por defecto usan func.now() (CURRENT_TIMESTAMP), válido también en SQLite
 """
-from sqlalchemy import Column, Integer, String, DECIMAL, DateTime, Boolean, ForeignKey, Date, Text, LargeBinary
+from sqlalchemy import Column, Integer, String, DECIMAL, DateTime, Boolean, ForeignKey, Date, Text, LargeBinary, Computed, Index
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from app.database import Base
 
+# En SQLite las fechas son texto y CURRENT_TIMESTAMP guarda "AAAA-MM-DD HH:MM:SS":
+# las columnas que se comparan con parámetros (cursores de sincronización)
+# usan ese mismo formato para que la comparación de texto sea correcta
+FechaHora = DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite"
+)
+
 # =============================================
 # MÓDULO DE SEGURIDAD Y USUARIOS
 # =============================================
@@ -17,7 +27,7 @@ class Rol(Base):
     IdRol = Column(Integer, primary_key=True, index=True)
     NombreRol = Column(String(50), unique=True, nullable=False)
     Descripcion = Column(String(200))
-    FechaCreacion = Column(DateTime, server_default=func.getdate())
+    FechaCreacion = Column(DateTime, server_default=func.now())
     Activo = Column(Boolean, default=True)
     
     # Relaciones
@@ -35,7 +45,7 @@ class Usuario(Base):
     IdRol = Column(Integer, ForeignKey("Roles.IdRol"), nullable=False)
     IntentosLogin = Column(Integer, default=0)
     Bloqueado = Column(Boolean, default=False)
-    FechaCreacion = Column(DateTime, server_default=func.getdate())
+    FechaCreacion = Column(DateTime, server_default=func.now())
     UltimoAcceso = Column(DateTime)
     Activo = Column(Boolean, default=True)
     FotoPerfilURL = Column(String(500))
@@ -90,11 +100,16 @@ class Producto(Base):
     StockActual = Column(Integer, nullable=False, default=0, index=True)
     StockMinimo = Column(Integer, nullable=False, default=5)
     StockMaximo = Column(Integer)
+    # Calculada por el motor: cambia sola con cada movimiento de stock o de
+    # StockMinimo. Con el índice (Activo, CantidadFaltante) el stock bajo
+    # (CantidadFaltante >= 0) es una búsqueda por rango ya ordenada por déficit
+    CantidadFaltante = Column(Integer, Computed("StockMinimo - StockActual", persisted=True), nullable=False)
     FechaVencimiento = Column(Date)
     Lote = Column(String(50))
     Ubicacion = Column(String(100))
-    FechaCreacion = Column(DateTime, server_default=func.getdate())
-    FechaActualizacion = Column(DateTime, server_default=func.getdate())
+    FechaCreacion = Column(DateTime, server_default=func.now())
+    # Se actualiza en cada escritura: base de la sincronización por cambios
+    FechaActualizacion = Column(FechaHora, nullable=False, server_default=func.now(), onupdate=func.now(), index=True)
     Activo = Column(Boolean, default=True)
     ImagenURL = Column(String(500))
     ImagenTipo = Column(String(10))
@@ -106,6 +121,12 @@ class Producto(Base):
     detalles_venta = relationship("DetalleVenta", back_populates="producto")
     movimientos_inventario = relationship("MovimientoInventario", back_populates="producto")
     imagenes = relationship("ImagenProducto", back_populates="producto")
+    
+    __table_args__ = (
+        Index("IX_Productos_Activo_CantidadFaltante", "Activo", "CantidadFaltante"),
+        # Reporte de vencimientos (services/vencimientos.py)
+        Index("IX_Productos_Activo_FechaVencimiento", "Activo", "FechaVencimiento"),
+    )
 
 
 class ImagenProducto(Base):
@@ -118,7 +139,7 @@ class ImagenProducto(Base):
     ImagenNombre = Column(String(100), nullable=False)
     EsPrincipal = Column(Boolean, default=False)
     Orden = Column(Integer, default=1)
-    FechaSubida = Column(DateTime, server_default=func.getdate())
+    FechaSubida = Column(DateTime, server_default=func.now())
     Activo = Column(Boolean, default=True)
     
     # Relaciones
@@ -136,12 +157,74 @@ class MovimientoInventario(Base):
     StockNuevo = Column(Integer, nullable=False)
     Motivo = Column(String(200))
     IdUsuario = Column(Integer, ForeignKey("Usuarios.IdUsuario"), nullable=False)
-    FechaMovimiento = Column(DateTime, server_default=func.getdate())
+    # Se compara con cortes de fecha (ledger de inventario) y es la llave
+    # de la paginación por cursor del historial
+    FechaMovimiento = Column(FechaHora, nullable=False, server_default=func.now(), index=True)
     Referencia = Column(String(100))
+    # Ya sumado a ResumenMovimientos: se inserta en 0 y lo incorpora
+    # resumen_movimientos.actualizar (en segundo plano, fuera de la venta)
+    Resumido = Column(Boolean, nullable=False, default=False, server_default=text("0"))
     
     # Relaciones
     producto = relationship("Producto", back_populates="movimientos_inventario")
     usuario = relationship("Usuario", back_populates="movimientos_inventario")
+    
+    __table_args__ = (
+        # Historial de un producto por rango de fechas
+        Index("IX_MovimientosInventario_Producto_Fecha", "IdProducto", "FechaMovimiento"),
+        # Índice filtrado: solo los movimientos pendientes de resumir
+        Index(
+            "IX_MovimientosInventario_PendientesResumen", "IdMovimiento",
+            mssql_where=text("Resumido = 0"), sqlite_where=text("Resumido = 0")
+        ),
+    )
+
+
+class ResumenMovimientos(Base):
+    """
+    Totales de movimientos por producto, tipo y día o semana (Periodo D / S;
+    FechaInicio es el día o el lunes de la semana). Se actualiza al registrar
+    cada movimiento (services/resumen_movimientos.py)
+    """
+    __tablename__ = "ResumenMovimientos"
+    
+    IdResumen = Column(Integer, primary_key=True, index=True)
+    Periodo = Column(String(1), nullable=False)
+    FechaInicio = Column(Date, nullable=False)
+    IdProducto = Column(Integer, ForeignKey("Productos.IdProducto"), nullable=False)
+    TipoMovimiento = Column(String(20), nullable=False)
+    Cantidad = Column(Integer, nullable=False, default=0)
+    Movimientos = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index(
+            "IX_ResumenMovimientos_Producto_Periodo",
+            "IdProducto", "Periodo", "FechaInicio", "TipoMovimiento",
+            unique=True
+        ),
+        Index("IX_ResumenMovimientos_Periodo_Fecha", "Periodo", "FechaInicio"),
+    )
+
+
+class SnapshotStock(Base):
+    """
+    Stock de un producto en un corte (movimientos con IdMovimiento <=
+    IdUltimoMovimiento). Solo se guarda para productos que tuvieron
+    movimientos desde su snapshot anterior: sin fila en un corte, el
+    stock es el de su snapshot anterior
+    """
+    __tablename__ = "SnapshotsStock"
+    
+    IdSnapshot = Column(Integer, primary_key=True, index=True)
+    IdProducto = Column(Integer, ForeignKey("Productos.IdProducto"), nullable=False)
+    FechaCorte = Column(FechaHora, nullable=False)
+    IdUltimoMovimiento = Column(Integer, nullable=False, default=0)
+    Stock = Column(Integer, nullable=False)
+    FechaCreacion = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        Index("IX_SnapshotsStock_Producto_Corte", "IdProducto", "FechaCorte", unique=True),
+    )
 
 
 # =============================================
@@ -159,7 +242,7 @@ class Proveedor(Base):
     Direccion = Column(String(300))
     ContactoPrincipal = Column(String(100))
     TelefonoContacto = Column(String(30))
-    FechaRegistro = Column(DateTime, server_default=func.getdate())
+    FechaRegistro = Column(DateTime, server_default=func.now())
     Activo = Column(Boolean, default=True)
     LogoURL = Column(String(500))
     LogoTipo = Column(String(10))
@@ -175,7 +258,7 @@ class OrdenCompra(Base):
     IdOrdenCompra = Column(Integer, primary_key=True, index=True)
     NumeroOrden = Column(String(50), unique=True, nullable=False, index=True)
     IdProveedor = Column(Integer, ForeignKey("Proveedores.IdProveedor"), nullable=False)
-    FechaOrden = Column(DateTime, server_default=func.getdate())
+    FechaOrden = Column(DateTime, server_default=func.now())
     FechaEntregaEstimada = Column(Date)
     EstadoOrden = Column(String(20), nullable=False, default='PENDIENTE', index=True)
     SubTotal = Column(DECIMAL(12, 2), nullable=False)
@@ -218,7 +301,7 @@ class Cliente(Base):
     Telefono = Column(String(30))
     Email = Column(String(100))
     Direccion = Column(String(300))
-    FechaRegistro = Column(DateTime, server_default=func.getdate())
+    FechaRegistro = Column(DateTime, server_default=func.now())
     Activo = Column(Boolean, default=True)
     
     # Relaciones
@@ -242,7 +325,7 @@ class Venta(Base):
     
     IdVenta = Column(Integer, primary_key=True, index=True)
     NumeroVenta = Column(String(50), unique=True, nullable=False, index=True)
-    FechaVenta = Column(DateTime, server_default=func.getdate(), index=True)
+    FechaVenta = Column(DateTime, server_default=func.now(), index=True)
     IdCliente = Column(Integer, ForeignKey("Clientes.IdCliente"))
     IdUsuario = Column(Integer, ForeignKey("Usuarios.IdUsuario"), nullable=False)
     SubTotal = Column(DECIMAL(12, 2), nullable=False)
@@ -287,4 +370,4 @@ class ConfiguracionSistema(Base):
     ClaveConfig = Column(String(100), unique=True, nullable=False, index=True)
     ValorConfig = Column(String(500))
     Descripcion = Column(String(200))
-    FechaActualizacion = Column(DateTime, server_default=func.getdate())
\ No newline at end of file
+    FechaActualizacion = Column(DateTime, server_default=func.now())
\ No newline at end of file
@@ -2,11 +2,12 @@
 Router para autenticación y manejo de sesiones
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
-from app.database import get_db
-from app import models, schemas
+from app.database import get_async_db
+from app import models, schemas, crud
 from app.utils import security
 
 router = APIRouter()
@@ -18,9 +19,9 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 # DEPENDENCIAS
 # =============================================
 
-def get_current_user(
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> models.Usuario:
     """
     Obtiene el usuario actual desde el token JWT
@@ -43,10 +44,11 @@ def get_current_user(
         raise credentials_exception
     
     # Buscar usuario en la base de datos
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.IdUsuario == id_usuario,
-        models.Usuario.NombreUsuario == username
-    ).first()
+    result = await db.execute(
+        crud.consulta_por_campos(models.Usuario, "IdUsuario", "NombreUsuario"),
+        {"IdUsuario": id_usuario, "NombreUsuario": username}
+    )
+    usuario = result.scalars().first()
     
     if usuario is None:
         raise credentials_exception
@@ -66,7 +68,7 @@ def get_current_user(
     return usuario
 
 
-def get_current_active_user(
+async def get_current_active_user(
     current_user: models.Usuario = Depends(get_current_user)
 ) -> models.Usuario:
     """
@@ -82,17 +84,19 @@ def get_current_active_user(
 # =============================================
 
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Inicio de sesión - Genera token JWT
     """
     # Buscar usuario
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.NombreUsuario == form_data.username
-    ).first()
+    result = await db.execute(
+        crud.consulta_por_campos(models.Usuario, "NombreUsuario"),
+        {"NombreUsuario": form_data.username}
+    )
+    usuario = result.scalars().first()
     
     if not usuario:
         raise HTTPException(
@@ -108,21 +112,21 @@ def login(
             detail="Usuario bloqueado por múltiples intentos fallidos. Contacte al administrador."
         )
     
-    # Verificar contraseña
-    if not security.verify_password(form_data.password, usuario.ContrasenaHash):
+    # Verificar contraseña (bcrypt es costoso: se ejecuta fuera del event loop)
+    if not await run_in_threadpool(security.verify_password, form_data.password, usuario.ContrasenaHash):
         # Incrementar intentos fallidos
         usuario.IntentosLogin += 1
         
         # Bloquear si excede los intentos permitidos (3 por defecto)
         if usuario.IntentosLogin >= 3:
             usuario.Bloqueado = True
-            db.commit()
+            await db.commit()
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Cuenta bloqueada por múltiples intentos fallidos"
             )
         
-        db.commit()
+        await db.commit()
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -140,7 +144,7 @@ def login(
     # Login exitoso - resetear intentos y actualizar último acceso
     usuario.IntentosLogin = 0
     usuario.UltimoAcceso = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     # Crear token JWT
     access_token_expires = timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -160,7 +164,7 @@ def login(
         Exitoso=True
     )
     db.add(auditoria)
-    db.commit()
+    await db.commit()
     
     # Preparar respuesta con datos del usuario
     usuario_out = schemas.UsuarioOut.from_orm(usuario)
@@ -173,17 +177,19 @@ def login(
 
 
 @router.post("/login-json", response_model=schemas.Token)
-def login_json(
+async def login_json(
     login_data: schemas.Login,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Inicio de sesión alternativo con JSON (para frontend Vue)
     """
     # Buscar usuario
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.NombreUsuario == login_data.nombre_usuario
-    ).first()
+    result = await db.execute(
+        crud.consulta_por_campos(models.Usuario, "NombreUsuario"),
+        {"NombreUsuario": login_data.nombre_usuario}
+    )
+    usuario = result.scalars().first()
     
     if not usuario:
         raise HTTPException(
@@ -199,13 +205,13 @@ def login_json(
         )
     
     # Verificar contraseña
-    if not security.verify_password(login_data.contrasena, usuario.ContrasenaHash):
+    if not await run_in_threadpool(security.verify_password, login_data.contrasena, usuario.ContrasenaHash):
         usuario.IntentosLogin += 1
         
         if usuario.IntentosLogin >= 3:
             usuario.Bloqueado = True
         
-        db.commit()
+        await db.commit()
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -221,7 +227,7 @@ def login_json(
     # Login exitoso
     usuario.IntentosLogin = 0
     usuario.UltimoAcceso = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     # Crear token
     access_token = security.create_access_token(
@@ -239,7 +245,7 @@ def login_json(
         Exitoso=True
     )
     db.add(auditoria)
-    db.commit()
+    await db.commit()
     
     usuario_out = schemas.UsuarioOut.from_orm(usuario)
     
@@ -251,9 +257,9 @@ def login_json(
 
 
 @router.post("/logout")
-def logout(
+async def logout(
     current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cerrar sesión (registrar en auditoría)
@@ -264,13 +270,13 @@ def logout(
         Exitoso=True
     )
     db.add(auditoria)
-    db.commit()
+    await db.commit()
     
     return {"mensaje": "Sesión cerrada correctamente"}
 
 
 @router.get("/me", response_model=schemas.UsuarioOut)
-def obtener_usuario_actual(
+async def obtener_usuario_actual(
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -280,16 +286,16 @@ def obtener_usuario_actual(
 
 
 @router.post("/cambiar-contrasena")
-def cambiar_contrasena(
+async def cambiar_contrasena(
     datos: schemas.CambiarContrasena,
     current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Cambiar contraseña del usuario actual
     """
     # Verificar contraseña actual
-    if not security.verify_password(datos.contrasena_actual, current_user.ContrasenaHash):
+    if not await run_in_threadpool(security.verify_password, datos.contrasena_actual, current_user.ContrasenaHash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Contraseña actual incorrecta"
@@ -304,8 +310,8 @@ def cambiar_contrasena(
         )
     
     # Actualizar contraseña
-    current_user.ContrasenaHash = security.hash_password(datos.contrasena_nueva)
-    db.commit()
+    current_user.ContrasenaHash = await run_in_threadpool(security.hash_password, datos.contrasena_nueva)
+    await db.commit()
     
     # Registrar en auditoría
     auditoria = models.AuditoriaAccesos(
@@ -314,16 +320,16 @@ def cambiar_contrasena(
         Exitoso=True
     )
     db.add(auditoria)
-    db.commit()
+    await db.commit()
     
     return {"mensaje": "Contraseña cambiada correctamente"}
 
 
 @router.post("/desbloquear-usuario/{id_usuario}")
-def desbloquear_usuario(
+async def desbloquear_usuario(
     id_usuario: int,
     current_user: models.Usuario = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Desbloquear un usuario (solo administradores)
@@ -336,9 +342,7 @@ def desbloquear_usuario(
         )
     
     # Buscar usuario a desbloquear
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.IdUsuario == id_usuario
-    ).first()
+    usuario = await db.get(models.Usuario, id_usuario)
     
     if not usuario:
         raise HTTPException(
@@ -349,6 +353,6 @@ def desbloquear_usuario(
     # Desbloquear
     usuario.Bloqueado = False
     usuario.IntentosLogin = 0
-    db.commit()
+    await db.commit()
     
     return {"mensaje": f"Usuario {usuario.NombreUsuario} desbloqueado correctamente"}
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Router interno de diagnóstico (métricas de pool, SQL, caches)
+No aparece en la documentación pública. Exige TOKEN_INTERNO en el header
+X-Token-Interno; si TOKEN_INTERNO no está definido el router queda
+deshabilitado (404)
+"""
+import os
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from typing import Optional
+from app.services import metricas_pool, metricas_sql, monitor_salud, indice_busqueda
+from app.services.cache_productos import cache as cache_productos
+
+TOKEN_INTERNO = os.getenv("TOKEN_INTERNO")
+
+# =============================================
+# DEPENDENCIAS
+# =============================================
+
+def verificar_acceso_interno(x_token_interno: Optional[str] = Header(None)):
+    """
+    Valida el token interno. Sin TOKEN_INTERNO configurado no hay acceso
+    (404: no se revela que el router existe)
+    """
+    if not TOKEN_INTERNO:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    if not secrets.compare_digest(x_token_interno or "", TOKEN_INTERNO):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso interno no autorizado"
+        )
+
+
+router = APIRouter(dependencies=[Depends(verificar_acceso_interno)])
+
+# =============================================
+# ENDPOINTS DE DIAGNÓSTICO
+# =============================================
+
+@router.get("/pool")
+async def metricas_de_pool():
+    """
+    Histogramas de espera de checkout, retención y overflow por engine
+    """
+    return {
+        "engines": {
+            nombre: metricas.resumen()
+            for nombre, metricas in metricas_pool.REGISTRO.items()
+        },
+        "autoajuste": {
+            "habilitado": metricas_pool.autoajuste_habilitado(),
+            "objetivo_espera_ms": metricas_pool.controlador.objetivo_ms,
+            "ajustes_recientes": metricas_pool.controlador.ajustes,
+        }
+    }
+
+
+@router.get("/sql")
+async def metricas_de_sql():
+    """
+    Sentencias, filas y tiempo de BD por ruta, y últimas sentencias lentas
+    """
+    return metricas_sql.resumen()
+
+
+@router.get("/salud")
+async def metricas_de_salud():
+    """
+    Histograma de latencia del sondeo de salud y último estado medido
+    """
+    return {
+        "estado": monitor_salud.monitor.estado(),
+        "sondeo": monitor_salud.monitor.resumen(),
+    }
+
+
+@router.get("/arranque")
+async def tiempos_de_arranque(request: Request):
+    """
+    Tiempo de arranque en frío del worker y resultado de la verificación del esquema
+    """
+    return getattr(request.app.state, "arranque", None)
+
+
+@router.get("/cache/productos")
+async def metricas_cache_productos():
+    """
+    Aciertos, fallos e invalidaciones de la caché de códigos de barras
+    """
+    return cache_productos.resumen()
+
+
+@router.delete("/cache/productos")
+async def limpiar_cache_productos():
+    """
+    Vacía la caché de códigos de barras de este worker
+    """
+    cache_productos.limpiar()
+    return {"mensaje": "Caché de productos vaciada"}
+
+
+@router.get("/indices")
+async def estado_indices_busqueda():
+    """
+    Estado de los índices de búsqueda en memoria
+    """
+    return {
+        "indices": {indice.nombre: indice.resumen() for indice in indice_busqueda.INDICES.values()},
+        "reconstruir_cada_seg": indice_busqueda.constructor.intervalo_seg,
+        "errores": indice_busqueda.constructor.errores,
+    }
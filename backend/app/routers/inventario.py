@@ -0,0 +1,192 @@
+"""
+Router de inventario: historial de movimientos, tendencias, vencimientos,
+stock histórico, valorización, snapshots y consistencia del ledger
+"""
+from datetime import date, datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.database import get_async_db, get_read_db
+from app import models, schemas
+from app.routers.auth import get_current_active_user
+from app.services import ledger_inventario, resumen_movimientos, valorizacion, vencimientos
+
+router = APIRouter()
+
+# =============================================
+# ENDPOINTS DE INVENTARIO
+# =============================================
+
+@router.get("/movimientos", response_model=List[schemas.MovimientoOut])
+async def listar_movimientos(
+    response: Response,
+    desde: Optional[datetime] = Query(None, description="Desde (incluida)"),
+    hasta: Optional[datetime] = Query(None, description="Hasta (excluida)"),
+    tipo: Optional[str] = Query(None, pattern="^(ENTRADA|SALIDA|AJUSTE)$", description="Tipo de movimiento"),
+    id_usuario: Optional[int] = Query(None, description="Filtrar por usuario"),
+    limit: int = Query(100, ge=1, le=1000, description="Máximo de registros a retornar"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    orden_desc: bool = Query(True, description="Más recientes primero"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Movimientos de toda la tienda paginados por cursor sobre
+    (FechaMovimiento, IdMovimiento); el header X-Next-Cursor trae la
+    siguiente página
+    """
+    movimientos, siguiente = await ledger_inventario.historial_movimientos(
+        db, limit, cursor, orden_desc,
+        tipo_movimiento=tipo, id_usuario=id_usuario, desde=desde, hasta=hasta
+    )
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
+    return movimientos
+
+
+@router.get("/tendencias", response_model=schemas.TendenciaMovimientos)
+async def tendencia_movimientos(
+    periodo: str = Query("dia", pattern="^(dia|semana)$"),
+    id_producto: Optional[int] = Query(None, description="Producto (por defecto toda la tienda)"),
+    tipo: Optional[str] = Query(None, pattern="^(ENTRADA|SALIDA|AJUSTE)$", description="Tipo de movimiento"),
+    desde: Optional[date] = Query(None),
+    hasta: Optional[date] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Cantidades y número de movimientos por día o semana y tipo, leídos de
+    ResumenMovimientos. Los movimientos se incorporan en segundo plano cada
+    RESUMEN_INTERVALO_SEG; movimientos_pendientes indica cuántos faltan
+    """
+    puntos = await resumen_movimientos.tendencia(
+        db, resumen_movimientos.PERIODOS[periodo], id_producto, tipo, desde, hasta
+    )
+    return {
+        "periodo": periodo,
+        "id_producto": id_producto,
+        "movimientos_pendientes": await resumen_movimientos.pendientes(db),
+        "puntos": puntos,
+    }
+
+
+@router.get("/vencimientos", response_model=schemas.ReporteVencimientos)
+async def reporte_vencimientos(
+    dias: int = Query(7, ge=0, le=vencimientos.VENCIMIENTOS_HORIZONTE_DIAS, description="Vence en N días o menos"),
+    agrupar: str = Query("categoria", pattern="^(categoria|ubicacion|ninguno)$"),
+    incluir_vencidos: bool = Query(True, description="Incluir productos ya vencidos"),
+    categoria: Optional[int] = Query(None, description="Filtrar por categoría"),
+    actualizar: bool = Query(False, description="Reconstruir el tablero antes de responder"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Productos activos con stock que vencen en N días (o ya vencidos),
+    agrupados por categoría o ubicación, con totales por tramo de días
+    
+    Se sirve desde el tablero precalculado (se reconstruye cada día y
+    cada VENCIMIENTOS_TTL_SEG)
+    """
+    tablero = await vencimientos.tablero.obtener(db, forzar=actualizar)
+    return tablero.reporte(dias, agrupar, incluir_vencidos, categoria)
+
+
+@router.get("/valorizacion", response_model=schemas.ReporteValorizacion)
+async def valorizacion_inventario(
+    activo: Optional[bool] = Query(True, description="Solo productos activos (vacío = todos)"),
+    solo_con_stock: bool = Query(False, description="Excluir productos sin stock"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Valor del inventario al costo y a precio de venta, margen ponderado y
+    distribución de márgenes por categoría (una sola consulta agregada)
+    """
+    return await valorizacion.valorizar(db, activo, solo_con_stock)
+
+
+@router.post("/valorizacion/simulacion", response_model=schemas.ResultadoSimulacion)
+async def simular_precios(
+    escenario: schemas.SimulacionPrecios,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Simula un reprecio (ajuste de costo / precio, margen mínimo, redondeo)
+    sobre los productos activos sin modificar la base de datos
+    """
+    return await valorizacion.simular(db, escenario)
+
+
+@router.get("/stock/{id_producto}", response_model=schemas.StockEnFecha)
+async def stock_en_fecha(
+    id_producto: int,
+    fecha: datetime = Query(..., description="Instante (incluye los movimientos anteriores a esta fecha)"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Stock de un producto en un instante, reproduciendo los movimientos
+    desde el snapshot más cercano anterior
+    """
+    return await ledger_inventario.stock_en(db, id_producto, fecha)
+
+
+@router.get("/existencias", response_model=schemas.ExistenciasAlCorte)
+async def existencias_al_corte(
+    fecha: Optional[datetime] = Query(None, description="Instante del corte"),
+    mes: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Cierre de mes AAAA-MM"),
+    categoria: Optional[int] = Query(None, description="Filtrar por categoría"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Inventario de todos los productos en un instante (fecha) o al cierre
+    de un mes (mes=AAAA-MM: stock al inicio del mes siguiente)
+    """
+    if (fecha is None) == (mes is None):
+        raise HTTPException(status_code=400, detail="Indique fecha o mes (solo uno)")
+    if mes:
+        anio, numero = (int(parte) for parte in mes.split("-"))
+        fecha = ledger_inventario.fin_de_mes(anio, numero)
+    return await ledger_inventario.existencias_al(db, fecha, categoria)
+
+
+@router.post("/snapshots", response_model=schemas.ResultadoSnapshot, status_code=201)
+async def crear_snapshot(
+    corte: Optional[datetime] = Query(None, description="Instante del corte (por defecto ahora)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Guarda un snapshot del stock (solo productos con movimientos desde su
+    snapshot anterior). Normalmente lo ejecuta scripts.snapshot_stock
+    """
+    if current_user.IdRol != 1:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para crear snapshots de inventario"
+        )
+    return await ledger_inventario.tomar_snapshot(db, corte)
+
+
+@router.get("/consistencia", response_model=schemas.ReporteConsistencia)
+async def verificar_consistencia(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.Usuario = Depends(get_current_active_user)
+):
+    """
+    Reproduce el ledger de cada producto desde su primer movimiento y lo
+    compara con Producto.StockActual y con cada snapshot; lista también los
+    movimientos que no encadenan
+    
+    Recorre toda la tabla de movimientos (segundos por cada millón): solo
+    administradores y contra la réplica. La verificación programada es
+    scripts.snapshot_stock --verificar
+    """
+    if current_user.IdRol != 1:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para verificar la consistencia del inventario"
+        )
+    return await ledger_inventario.verificar_consistencia(db)
@@ -1,11 +1,20 @@
 """
 Router para operaciones CRUD de productos
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import os
+import tempfile
+import time
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
 from typing import List, Optional
-from app.database import get_db
-from app import models, schemas
+from app.database import get_async_db, get_read_db, fabrica_lectura
+from app import models, schemas, crud
+from app.utils.helpers import dividir_lista
+from app.services import cache_http, exportacion, importacion, indice_busqueda, inventario, ledger_inventario
+from app.services.cache_productos import cache as cache_productos
 
 router = APIRouter()
 
@@ -13,68 +22,291 @@ router = APIRouter()
 # ENDPOINTS DE PRODUCTOS
 # =============================================
 
+# Segundos hacia atrás desde el reloj de la BD que /cambios todavía no entrega:
+# una transacción en curso puede confirmar filas con FechaActualizacion
+# anterior al momento de la consulta
+SINCRONIZACION_MARGEN_SEG = float(os.getenv("SINCRONIZACION_MARGEN_SEG", 5))
+
+# Campos por los que se puede ordenar la paginación por cursor (NOT NULL e indexados)
+ORDEN_CURSOR_PRODUCTOS = "^(IdProducto|NombreProducto|StockActual)$"
+
+
 @router.get("/", response_model=List[schemas.ProductoOut])
-def listar_productos(
+async def listar_productos(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros a saltar"),
     limit: int = Query(100, ge=1, le=1000, description="Máximo de registros a retornar"),
     activo: Optional[bool] = Query(None, description="Filtrar por estado activo"),
     categoria: Optional[int] = Query(None, description="Filtrar por categoría"),
     buscar: Optional[str] = Query(None, description="Buscar por nombre o código"),
-    db: Session = Depends(get_db)
+    paginacion: str = Query("offset", pattern="^(offset|cursor)$", description="offset (skip/limit) o cursor"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    ordenar_por: str = Query("IdProducto", pattern=ORDEN_CURSOR_PRODUCTOS, description="Orden en modo cursor"),
+    orden_desc: bool = Query(False, description="Orden descendente en modo cursor"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Listar todos los productos con filtros opcionales
+    
+    Con paginacion=cursor las páginas no se vuelven más lentas con la
+    profundidad: el header X-Next-Cursor trae el token de la siguiente
+    página (ausente en la última)
+    
+    buscar usa el índice de trigramas (sin acentos, por prefijo y tolerante
+    a errores de tipeo) ordenado por relevancia; mientras el índice se
+    construye, o en modo cursor, se usa LIKE
+    
+    Responde 304 si If-None-Match coincide con el ETag (MAX(FechaActualizacion))
     """
-    query = db.query(models.Producto)
+    etag = await cache_http.etag_productos(db, request.url.query)
+    no_modificado = cache_http.responder_condicional(request, response, etag, cache_http.CACHE_CONTROL_PRODUCTOS)
+    if no_modificado:
+        return no_modificado
+    
+    query = select(models.Producto)
     
     # Aplicar filtros
     if activo is not None:
-        query = query.filter(models.Producto.Activo == activo)
+        query = query.where(models.Producto.Activo == activo)
     
     if categoria:
-        query = query.filter(models.Producto.IdCategoria == categoria)
+        query = query.where(models.Producto.IdCategoria == categoria)
+    
+    # Búsqueda con el índice de trigramas (ranking por relevancia)
+    indice = indice_busqueda.indice_para(
+        models.Producto, ["NombreProducto", "CodigoBarras"], {"Activo": activo, "IdCategoria": categoria}
+    )
+    if buscar and indice is not None and paginacion == "offset":
+        ids = indice.buscar(buscar, {"Activo": activo, "IdCategoria": categoria}, skip, limit)
+        if not ids:
+            return []
+        # query ya lleva los filtros: descarta lo que el índice aún no reflejó
+        result = await db.execute(query.where(models.Producto.IdProducto.in_(ids)))
+        return indice_busqueda.ordenar_por_ids(result.scalars(), ids, "IdProducto")
     
     if buscar:
-        query = query.filter(
+        query = query.where(
             (models.Producto.NombreProducto.like(f"%{buscar}%")) |
             (models.Producto.CodigoBarras.like(f"%{buscar}%"))
         )
     
-    # Paginación
-    productos = query.offset(skip).limit(limit).all()
-    return productos
+    # Paginación por cursor (keyset)
+    if paginacion == "cursor":
+        query = crud.paginar_por_cursor(
+            query, models.Producto, "IdProducto", limit, cursor, ordenar_por, orden_desc
+        )
+        result = await db.execute(query)
+        productos = list(result.scalars())
+        siguiente = crud.siguiente_cursor(productos, limit, "IdProducto", ordenar_por)
+        if siguiente:
+            response.headers["X-Next-Cursor"] = siguiente
+        return productos
+    
+    # Paginación (SQL Server exige ORDER BY para usar OFFSET)
+    result = await db.execute(query.order_by(models.Producto.IdProducto).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+@router.get("/export")
+async def exportar_productos(
+    request: Request,
+    formato: str = Query("csv", pattern="^(csv|ndjson)$", description="csv o ndjson"),
+    comprimir: bool = Query(False, description="Comprimir con gzip al vuelo"),
+    activo: Optional[bool] = Query(None, description="Filtrar por estado activo"),
+    categoria: Optional[int] = Query(None, description="Filtrar por categoría")
+):
+    """
+    Exportar el catálogo completo en streaming (CSV o NDJSON)
+    Las filas se leen por lotes con un cursor del lado del servidor y se
+    envían a medida que se leen: la memoria no crece con el catálogo
+    """
+    columnas = list(schemas.ProductoOut.model_fields)
+    query = select(*(getattr(models.Producto, columna) for columna in columnas))
+    
+    if activo is not None:
+        query = query.where(models.Producto.Activo == activo)
+    
+    if categoria:
+        query = query.where(models.Producto.IdCategoria == categoria)
+    
+    query = query.order_by(models.Producto.IdProducto)
+    
+    # La sesión se abre dentro del generador: la respuesta sigue leyendo
+    # después de que el endpoint retorna
+    cuerpo = exportacion.exportar(fabrica_lectura(request), query, columnas, formato, comprimir)
+    nombre = f"productos.{formato}" + (".gz" if comprimir else "")
+    return StreamingResponse(
+        cuerpo,
+        media_type="application/gzip" if comprimir else exportacion.TIPOS_CONTENIDO[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
+
+
+@router.post("/importar")
+async def importar_productos(
+    archivo: UploadFile = File(..., description="Lista de productos en CSV o XLSX"),
+    actualizar_existentes: bool = Query(True, description="Actualizar los productos cuyo código ya existe"),
+    id_categoria: Optional[int] = Query(None, gt=0, description="Categoría para filas sin categoría"),
+    id_unidad: Optional[int] = Query(None, gt=0, description="Unidad para filas sin unidad"),
+    tamano_lote: int = Query(importacion.IMPORTACION_LOTE, ge=100, le=10000, description="Filas por lote")
+):
+    """
+    Importar productos desde CSV o XLSX con upsert por CodigoBarras
+    
+    La respuesta es NDJSON y se envía mientras se importa: un evento
+    "error" por línea rechazada, "progreso" por lote confirmado y un
+    "resumen" final con el rendimiento (líneas por segundo)
+    El stock de los productos existentes no se modifica (use movimientos)
+    """
+    nombre = (archivo.filename or "").lower()
+    formato = "xlsx" if nombre.endswith((".xlsx", ".xlsm")) else "csv"
+    if formato == "xlsx" and importacion.openpyxl is None:
+        raise HTTPException(status_code=400, detail="Para importar XLSX instale openpyxl")
+    
+    # Copia propia del archivo: la importación sigue leyéndolo después de
+    # que el endpoint retorna y FastAPI cierra el UploadFile
+    copia = tempfile.TemporaryFile()
+    while bloque := await archivo.read(1024 * 1024):
+        copia.write(bloque)
+    copia.seek(0)
+    
+    importador = importacion.ImportadorProductos(
+        tamano_lote=tamano_lote,
+        actualizar_existentes=actualizar_existentes,
+        id_categoria=id_categoria,
+        id_unidad=id_unidad
+    )
+    
+    def eventos():
+        try:
+            yield from importador.ejecutar(copia, formato)
+        finally:
+            copia.close()
+    
+    # Generador síncrono: Starlette lo recorre en el threadpool
+    return StreamingResponse(eventos(), media_type="application/x-ndjson")
+
+
+@router.get("/cambios", response_model=schemas.CambiosProductos)
+async def cambios_productos(
+    desde: Optional[str] = Query(None, description="Token 'siguiente' de la sincronización anterior"),
+    limit: int = Query(1000, ge=1, le=5000, description="Máximo de productos por llamada"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Sincronización por cambios para los catálogos locales de los terminales
+    
+    Sin desde retorna todo el catálogo (sincronización inicial); con desde,
+    solo los productos creados, modificados o desactivados desde ese token,
+    ordenados por (FechaActualizacion, IdProducto)
+    Mientras completo sea false hay que volver a llamar con siguiente
+    
+    Lee del primario: el retraso de una réplica podría saltarse cambios
+    """
+    # Solo se entregan cambios con cierta antigüedad (ver SINCRONIZACION_MARGEN_SEG)
+    corte = await db.scalar(select(func.now())) - timedelta(seconds=SINCRONIZACION_MARGEN_SEG)
+    query = select(models.Producto).where(models.Producto.FechaActualizacion <= corte)
+    query = crud.paginar_por_cursor(
+        query, models.Producto, "IdProducto", limit, desde, "FechaActualizacion"
+    )
+    result = await db.execute(query)
+    productos = list(result.scalars())
+    
+    completo = len(productos) <= limit
+    del productos[limit:]
+    siguiente = desde
+    if productos:
+        ultimo = productos[-1]
+        siguiente = crud.codificar_cursor([ultimo.FechaActualizacion, ultimo.IdProducto])
+    
+    return {
+        "productos": [p for p in productos if p.Activo],
+        "desactivados": [p.IdProducto for p in productos if not p.Activo],
+        "siguiente": siguiente,
+        "completo": completo
+    }
 
 
 @router.get("/{id_producto}", response_model=schemas.ProductoOut)
-def obtener_producto(
+async def obtener_producto(
     id_producto: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Obtener un producto específico por ID
+    Obtener un producto específico por ID (304 si el ETag no cambió)
+    El ETag se calcula del contenido de la fila: el 304 ahorra la
+    serialización y la transferencia, no la lectura por llave primaria
     """
-    producto = db.query(models.Producto).filter(
-        models.Producto.IdProducto == id_producto
-    ).first()
+    producto = await db.get(models.Producto, id_producto)
     
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
+    etag = cache_http.etag_producto(producto)
+    no_modificado = cache_http.responder_condicional(request, response, etag, cache_http.CACHE_CONTROL_PRODUCTOS)
+    if no_modificado:
+        return no_modificado
     return producto
 
 
+@router.get("/{id_producto}/movimientos", response_model=List[schemas.MovimientoOut])
+async def movimientos_producto(
+    id_producto: int,
+    response: Response,
+    desde: Optional[datetime] = Query(None, description="Desde (incluida)"),
+    hasta: Optional[datetime] = Query(None, description="Hasta (excluida)"),
+    tipo: Optional[str] = Query(None, pattern="^(ENTRADA|SALIDA|AJUSTE)$", description="Tipo de movimiento"),
+    limit: int = Query(100, ge=1, le=1000, description="Máximo de registros a retornar"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    orden_desc: bool = Query(True, description="Más recientes primero"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Historial de movimientos de inventario de un producto, paginado por
+    cursor sobre (FechaMovimiento, IdMovimiento); el header X-Next-Cursor
+    trae la siguiente página
+    """
+    existe = await db.scalar(select(models.Producto.IdProducto).where(models.Producto.IdProducto == id_producto))
+    if existe is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    
+    movimientos, siguiente = await ledger_inventario.historial_movimientos(
+        db, limit, cursor, orden_desc,
+        id_producto=id_producto, tipo_movimiento=tipo, desde=desde, hasta=hasta
+    )
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
+    return movimientos
+
+
 @router.get("/codigo/{codigo_barras}", response_model=schemas.ProductoOut)
-def obtener_producto_por_codigo(
+async def obtener_producto_por_codigo(
     codigo_barras: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Obtener un producto por su código de barras
+    Se atiende desde la caché de productos (incluye códigos inexistentes)
     """
-    producto = db.query(models.Producto).filter(
-        models.Producto.CodigoBarras == codigo_barras,
-        models.Producto.Activo == True
-    ).first()
+    en_cache, producto = cache_productos.obtener(codigo_barras)
+    
+    if not en_cache:
+        generacion = cache_productos.generacion
+        result = await db.execute(
+            crud.consulta_por_campos(models.Producto, "CodigoBarras", "Activo"),
+            {"CodigoBarras": codigo_barras, "Activo": True}
+        )
+        encontrado = result.scalars().first()
+        producto = schemas.ProductoOut.model_validate(encontrado) if encontrado else None
+        cache_productos.guardar(
+            codigo_barras,
+            producto,
+            id_producto=encontrado.IdProducto if encontrado else None,
+            generacion=generacion
+        )
     
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
@@ -82,19 +314,76 @@ def obtener_producto_por_codigo(
     return producto
 
 
+@router.post("/codigo/batch", response_model=List[schemas.ResultadoCodigo])
+async def obtener_productos_por_codigos(
+    datos: schemas.CodigosBatch,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Resolver varios códigos de barras en una sola petición
+    
+    Pensado para terminales que reenvían escaneos acumulados sin conexión.
+    Los códigos que no están en la caché se buscan con una consulta IN por
+    lote. Los resultados respetan el orden de entrada (incluye repetidos)
+    """
+    productos = {}
+    pendientes = []
+    for codigo in dict.fromkeys(datos.codigos):
+        en_cache, producto = cache_productos.obtener(codigo)
+        if en_cache:
+            productos[codigo] = producto
+        else:
+            pendientes.append(codigo)
+    
+    # SQL Server admite como máximo 2100 parámetros por sentencia
+    generacion = cache_productos.generacion
+    for lote in dividir_lista(pendientes, 2000):
+        result = await db.execute(
+            select(models.Producto).where(
+                models.Producto.CodigoBarras.in_(lote),
+                models.Producto.Activo == True
+            )
+        )
+        for encontrado in result.scalars():
+            producto = schemas.ProductoOut.model_validate(encontrado)
+            productos[encontrado.CodigoBarras] = producto
+            cache_productos.guardar(
+                encontrado.CodigoBarras, producto,
+                id_producto=encontrado.IdProducto, generacion=generacion
+            )
+    
+    # Caché negativa para los códigos que no existen
+    for codigo in pendientes:
+        if codigo not in productos:
+            productos[codigo] = None
+            cache_productos.guardar(codigo, None, generacion=generacion)
+    
+    return [
+        schemas.ResultadoCodigo(
+            codigo_barras=codigo,
+            encontrado=productos[codigo] is not None,
+            producto=productos[codigo]
+        )
+        for codigo in datos.codigos
+    ]
+
+
 @router.post("/", response_model=schemas.ProductoOut, status_code=201)
-def crear_producto(
+async def crear_producto(
     producto: schemas.ProductoCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crear un nuevo producto
     """
     # Verificar si el código de barras ya existe
     if producto.CodigoBarras:
-        existe = db.query(models.Producto).filter(
-            models.Producto.CodigoBarras == producto.CodigoBarras
-        ).first()
+        result = await db.execute(
+            select(models.Producto.IdProducto).where(
+                models.Producto.CodigoBarras == producto.CodigoBarras
+            )
+        )
+        existe = result.first()
         if existe:
             raise HTTPException(
                 status_code=400,
@@ -111,24 +400,25 @@ def crear_producto(
     # Crear nuevo producto
     nuevo_producto = models.Producto(**producto.dict())
     db.add(nuevo_producto)
-    db.commit()
-    db.refresh(nuevo_producto)
+    await db.commit()
+    await db.refresh(nuevo_producto)
+    
+    # El código pudo estar en la caché negativa
+    cache_productos.invalidar(nuevo_producto.IdProducto, nuevo_producto.CodigoBarras)
     
     return nuevo_producto
 
 
 @router.put("/{id_producto}", response_model=schemas.ProductoOut)
-def actualizar_producto(
+async def actualizar_producto(
     id_producto: int,
     producto_update: schemas.ProductoUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Actualizar un producto existente
     """
-    producto = db.query(models.Producto).filter(
-        models.Producto.IdProducto == id_producto
-    ).first()
+    producto = await db.get(models.Producto, id_producto)
     
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
@@ -146,98 +436,140 @@ def actualizar_producto(
             detail="El precio de venta debe ser mayor o igual al precio de compra"
         )
     
+    codigo_anterior = producto.CodigoBarras
     for field, value in update_data.items():
         setattr(producto, field, value)
     
-    db.commit()
-    db.refresh(producto)
+    await db.commit()
+    await db.refresh(producto)
+    cache_productos.invalidar(id_producto, codigo_anterior, producto.CodigoBarras)
     
     return producto
 
 
 @router.delete("/{id_producto}")
-def eliminar_producto(
+async def eliminar_producto(
     id_producto: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Eliminar (desactivar) un producto
     """
-    producto = db.query(models.Producto).filter(
-        models.Producto.IdProducto == id_producto
-    ).first()
+    producto = await db.get(models.Producto, id_producto)
     
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
     # Soft delete - solo marcar como inactivo
     producto.Activo = False
-    db.commit()
+    await db.commit()
+    cache_productos.invalidar(id_producto, producto.CodigoBarras)
     
     return {"mensaje": "Producto eliminado correctamente"}
 
 
 @router.get("/stock-bajo/", response_model=List[schemas.ProductoStockBajo])
-def productos_con_stock_bajo(
-    db: Session = Depends(get_db)
+async def productos_con_stock_bajo(
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Obtener productos con stock bajo (stock actual <= stock mínimo)
+    Obtener productos con stock bajo (stock actual <= stock mínimo),
+    de mayor a menor cantidad faltante
+    
+    Búsqueda por el índice (Activo, CantidadFaltante): la columna calculada
+    se mantiene sola con cada cambio de stock o de StockMinimo
     """
-    productos = db.query(models.Producto).filter(
-        models.Producto.StockActual <= models.Producto.StockMinimo,
-        models.Producto.Activo == True
-    ).all()
+    result = await db.execute(
+        select(models.Producto)
+        .where(models.Producto.Activo == True, models.Producto.CantidadFaltante >= 0)
+        .order_by(models.Producto.CantidadFaltante.desc(), models.Producto.IdProducto.desc())
+    )
     
+    return result.scalars().all()
+
+
+@router.get("/stock-bajo/paginado", response_model=List[schemas.ProductoStockBajo])
+async def productos_con_stock_bajo_paginado(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000, description="Máximo de registros a retornar"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    orden_desc: bool = Query(True, description="Mayor déficit primero"),
+    categoria: Optional[int] = Query(None, description="Filtrar por categoría"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Productos con stock bajo paginados por cursor y ordenados por déficit
+    (CantidadFaltante); el header X-Next-Cursor trae la siguiente página
+    """
+    query = select(models.Producto).where(
+        models.Producto.Activo == True,
+        models.Producto.CantidadFaltante >= 0
+    )
+    if categoria:
+        query = query.where(models.Producto.IdCategoria == categoria)
+    
+    query = crud.paginar_por_cursor(
+        query, models.Producto, "IdProducto", limit, cursor, "CantidadFaltante", orden_desc
+    )
+    result = await db.execute(query)
+    productos = list(result.scalars())
+    siguiente = crud.siguiente_cursor(productos, limit, "IdProducto", "CantidadFaltante")
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
     return productos
 
 
 @router.patch("/{id_producto}/stock")
-def ajustar_stock(
+async def ajustar_stock(
     id_producto: int,
     ajuste: schemas.AjusteStock,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Ajustar el stock de un producto
+    El cambio se aplica con un UPDATE condicional (ver services/inventario.py):
+    ventas simultáneas del mismo producto no pierden actualizaciones
     """
-    producto = db.query(models.Producto).filter(
-        models.Producto.IdProducto == id_producto
-    ).first()
-    
-    if not producto:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    
-    stock_anterior = producto.StockActual
-    
-    # Aplicar ajuste según el tipo
-    if ajuste.tipo_movimiento == "ENTRADA":
-        producto.StockActual += ajuste.cantidad
-    elif ajuste.tipo_movimiento == "SALIDA":
-        if producto.StockActual < ajuste.cantidad:
-            raise HTTPException(status_code=400, detail="Stock insuficiente")
-        producto.StockActual -= ajuste.cantidad
-    elif ajuste.tipo_movimiento == "AJUSTE":
-        producto.StockActual = ajuste.cantidad
-    
-    # Registrar movimiento en el historial
-    movimiento = models.MovimientoInventario(
-        IdProducto=id_producto,
-        TipoMovimiento=ajuste.tipo_movimiento,
-        Cantidad=ajuste.cantidad,
-        StockAnterior=stock_anterior,
-        StockNuevo=producto.StockActual,
-        Motivo=ajuste.motivo,
-        IdUsuario=ajuste.id_usuario,
-        Referencia=ajuste.referencia
+    resultado = await inventario.mover_stock(
+        db,
+        id_producto,
+        ajuste.tipo_movimiento,
+        ajuste.cantidad,
+        ajuste.id_usuario,
+        motivo=ajuste.motivo,
+        referencia=ajuste.referencia
     )
-    
-    db.add(movimiento)
-    db.commit()
-    db.refresh(producto)
+    cache_productos.invalidar(id_producto, resultado["CodigoBarras"])
     
     return {
         "mensaje": "Stock ajustado correctamente",
-        "stock_anterior": stock_anterior,
-        "stock_nuevo": producto.StockActual
-    }
\ No newline at end of file
+        "stock_anterior": resultado["stock_anterior"],
+        "stock_nuevo": resultado["stock_nuevo"]
+    }
+
+
+@router.post("/stock/bulk", response_model=schemas.ResultadoAjustesBulk)
+async def ajustar_stock_bulk(
+    datos: schemas.AjustesStockBulk,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Ajustar el stock de muchos productos en una sola transacción
+    (ej: recepción de un camión)
+    Aplica UPDATEs por lotes y una inserción masiva de movimientos, y
+    retorna el resultado de cada línea en el orden recibido
+    """
+    inicio = time.perf_counter()
+    resultados, codigos = await inventario.mover_stock_bulk(db, datos.ajustes, datos.todo_o_nada)
+    for id_producto, codigo in codigos.items():
+        cache_productos.invalidar(id_producto, codigo)
+    duracion = time.perf_counter() - inicio
+    
+    aplicados = sum(1 for resultado in resultados if resultado["aplicado"])
+    return {
+        "aplicados": aplicados,
+        "rechazados": len(resultados) - aplicados,
+        "duracion_ms": round(duracion * 1000, 2),
+        "lineas_por_segundo": round(len(resultados) / duracion, 1) if duracion else 0.0,
+        "resultados": resultados
+    }
@@ -2,12 +2,14 @@
 Router para operaciones CRUD de proveedores
 Gestión completa de proveedores con validaciones y búsqueda avanzada
 """
-from fastapi import APIRouter, HTTPException, Depends, Query, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_async_db, get_read_db
 from app import models, schemas, crud
 from app.routers.auth import get_current_active_user
+from app.services import cache_http, indice_busqueda
 
 router = APIRouter()
 
@@ -16,14 +18,16 @@ router = APIRouter()
 # =============================================
 
 @router.get("/", response_model=List[schemas.ProveedorOut])
-def listar_proveedores(
+async def listar_proveedores(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros a saltar"),
     limit: int = Query(100, ge=1, le=1000, description="Máximo de registros a retornar"),
     activo: Optional[bool] = Query(None, description="Filtrar por estado activo/inactivo"),
     buscar: Optional[str] = Query(None, description="Buscar por nombre, RUC o contacto"),
     ordenar_por: str = Query("NombreProveedor", description="Campo para ordenar"),
     orden_desc: bool = Query(False, description="Orden descendente"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -35,7 +39,14 @@ def listar_proveedores(
     - **buscar**: Buscar en nombre, RUC o contacto principal
     - **ordenar_por**: Campo para ordenar resultados
     - **orden_desc**: Si el orden es descendente
+    
+    Responde 304 si If-None-Match coincide con la versión de la tabla
     """
+    etag = await cache_http.etag_tabla(db, models.Proveedor, request.url.query)
+    no_modificado = cache_http.responder_condicional(request, response, etag, cache_http.CACHE_CONTROL_PROVEEDORES)
+    if no_modificado:
+        return no_modificado
+    
     try:
         # Construir filtros
         filtros = {}
@@ -44,8 +55,8 @@ def listar_proveedores(
         
         # Búsqueda avanzada si se proporciona término
         if buscar:
-            proveedores = crud.buscar_registros(
-                db=db,
+            proveedores = await db.run_sync(
+                crud.buscar_registros,
                 model=models.Proveedor,
                 termino_busqueda=buscar,
                 campos_busqueda=["NombreProveedor", "RUC", "ContactoPrincipal", "Email"],
@@ -55,8 +66,8 @@ def listar_proveedores(
             )
         else:
             # Listado normal con filtros
-            proveedores = crud.listar_registros(
-                db=db,
+            proveedores = await db.run_sync(
+                crud.listar_registros,
                 model=models.Proveedor,
                 skip=skip,
                 limit=limit,
@@ -75,29 +86,29 @@ def listar_proveedores(
 
 
 @router.get("/stats", response_model=dict)
-def obtener_estadisticas_proveedores(
-    db: Session = Depends(get_db),
+async def obtener_estadisticas_proveedores(
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
     Obtener estadísticas generales de proveedores
     """
-    total = crud.contar_registros(db, models.Proveedor)
-    activos = crud.contar_registros(db, models.Proveedor, filtros={"Activo": True})
-    inactivos = crud.contar_registros(db, models.Proveedor, filtros={"Activo": False})
+    total = await db.run_sync(crud.contar_registros, models.Proveedor)
+    activos = await db.run_sync(crud.contar_registros, models.Proveedor, filtros={"Activo": True})
+    inactivos = await db.run_sync(crud.contar_registros, models.Proveedor, filtros={"Activo": False})
     
     # Proveedores con más órdenes de compra
-    top_proveedores = db.query(
+    top_proveedores = await db.execute(select(
         models.Proveedor.NombreProveedor,
-        db.func.count(models.OrdenCompra.IdOrdenCompra).label("total_ordenes")
+        func.count(models.OrdenCompra.IdOrdenCompra).label("total_ordenes")
     ).join(
         models.OrdenCompra
     ).group_by(
         models.Proveedor.IdProveedor,
         models.Proveedor.NombreProveedor
     ).order_by(
-        db.func.count(models.OrdenCompra.IdOrdenCompra).desc()
-    ).limit(5).all()
+        func.count(models.OrdenCompra.IdOrdenCompra).desc()
+    ).limit(5))
     
     return {
         "total_proveedores": total,
@@ -111,16 +122,16 @@ def obtener_estadisticas_proveedores(
 
 
 @router.get("/buscar/ruc/{ruc}", response_model=schemas.ProveedorOut)
-def buscar_proveedor_por_ruc(
+async def buscar_proveedor_por_ruc(
     ruc: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
     Buscar un proveedor por su RUC
     """
-    proveedor = crud.obtener_por_campo(
-        db=db,
+    proveedor = await db.run_sync(
+        crud.obtener_por_campo,
         model=models.Proveedor,
         campo="RUC",
         valor=ruc,
@@ -130,16 +141,23 @@ def buscar_proveedor_por_ruc(
 
 
 @router.get("/{proveedor_id}", response_model=schemas.ProveedorOut)
-def obtener_proveedor(
+async def obtener_proveedor(
     proveedor_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
-    Obtener un proveedor específico por su ID
+    Obtener un proveedor específico por su ID (304 si la versión no cambió)
     """
-    proveedor = crud.obtener_registro(
-        db=db,
+    etag = await cache_http.etag_tabla(db, models.Proveedor, proveedor_id)
+    no_modificado = cache_http.responder_condicional(request, response, etag, cache_http.CACHE_CONTROL_PROVEEDORES)
+    if no_modificado:
+        return no_modificado
+    
+    proveedor = await db.run_sync(
+        crud.obtener_registro,
         model=models.Proveedor,
         id_field="IdProveedor",
         id_val=proveedor_id,
@@ -149,20 +167,20 @@ def obtener_proveedor(
 
 
 @router.get("/{proveedor_id}/ordenes")
-def obtener_ordenes_proveedor(
+async def obtener_ordenes_proveedor(
     proveedor_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=500),
     estado: Optional[str] = Query(None, description="Filtrar por estado de orden"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
     Obtener todas las órdenes de compra de un proveedor específico
     """
     # Verificar que el proveedor existe
-    proveedor = crud.obtener_registro(
-        db=db,
+    proveedor = await db.run_sync(
+        crud.obtener_registro,
         model=models.Proveedor,
         id_field="IdProveedor",
         id_val=proveedor_id,
@@ -175,8 +193,8 @@ def obtener_ordenes_proveedor(
         filtros["EstadoOrden"] = estado
     
     # Obtener órdenes
-    ordenes = crud.listar_registros(
-        db=db,
+    ordenes = await db.run_sync(
+        crud.listar_registros,
         model=models.OrdenCompra,
         skip=skip,
         limit=limit,
@@ -186,8 +204,8 @@ def obtener_ordenes_proveedor(
     )
     
     # Contar total
-    total = crud.contar_registros(
-        db=db,
+    total = await db.run_sync(
+        crud.contar_registros,
         model=models.OrdenCompra,
         filtros=filtros
     )
@@ -200,9 +218,9 @@ def obtener_ordenes_proveedor(
 
 
 @router.post("/", response_model=schemas.ProveedorOut, status_code=status.HTTP_201_CREATED)
-def crear_proveedor(
+async def crear_proveedor(
     proveedor: schemas.ProveedorCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -214,8 +232,8 @@ def crear_proveedor(
     """
     # Validar que el RUC no exista (si se proporciona)
     if proveedor.RUC:
-        if crud.existe_registro(
-            db=db,
+        if await db.run_sync(
+            crud.existe_registro,
             model=models.Proveedor,
             campo="RUC",
             valor=proveedor.RUC
@@ -227,8 +245,8 @@ def crear_proveedor(
     
     # Validar email único si se proporciona
     if proveedor.Email:
-        if crud.existe_registro(
-            db=db,
+        if await db.run_sync(
+            crud.existe_registro,
             model=models.Proveedor,
             campo="Email",
             valor=proveedor.Email
@@ -239,8 +257,8 @@ def crear_proveedor(
             )
     
     # Crear proveedor
-    nuevo_proveedor = crud.crear_registro(
-        db=db,
+    nuevo_proveedor = await db.run_sync(
+        crud.crear_registro,
         model=models.Proveedor,
         obj_data=proveedor.dict()
     )
@@ -249,10 +267,10 @@ def crear_proveedor(
 
 
 @router.put("/{proveedor_id}", response_model=schemas.ProveedorOut)
-def actualizar_proveedor(
+async def actualizar_proveedor(
     proveedor_id: int,
     proveedor_update: schemas.ProveedorUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -261,8 +279,8 @@ def actualizar_proveedor(
     Solo se actualizan los campos proporcionados (exclude_unset=True)
     """
     # Obtener proveedor existente
-    proveedor = crud.obtener_registro(
-        db=db,
+    proveedor = await db.run_sync(
+        crud.obtener_registro,
         model=models.Proveedor,
         id_field="IdProveedor",
         id_val=proveedor_id,
@@ -274,8 +292,8 @@ def actualizar_proveedor(
     
     # Validar RUC único si se está actualizando
     if "RUC" in update_data and update_data["RUC"]:
-        if crud.existe_registro(
-            db=db,
+        if await db.run_sync(
+            crud.existe_registro,
             model=models.Proveedor,
             campo="RUC",
             valor=update_data["RUC"],
@@ -289,8 +307,8 @@ def actualizar_proveedor(
     
     # Validar Email único si se está actualizando
     if "Email" in update_data and update_data["Email"]:
-        if crud.existe_registro(
-            db=db,
+        if await db.run_sync(
+            crud.existe_registro,
             model=models.Proveedor,
             campo="Email",
             valor=update_data["Email"],
@@ -303,8 +321,8 @@ def actualizar_proveedor(
             )
     
     # Actualizar proveedor
-    proveedor_actualizado = crud.actualizar_registro(
-        db=db,
+    proveedor_actualizado = await db.run_sync(
+        crud.actualizar_registro,
         instancia=proveedor,
         update_data=update_data
     )
@@ -313,10 +331,10 @@ def actualizar_proveedor(
 
 
 @router.delete("/{proveedor_id}")
-def eliminar_proveedor(
+async def eliminar_proveedor(
     proveedor_id: int,
     forzar: bool = Query(False, description="Forzar eliminación aunque tenga órdenes"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -333,8 +351,8 @@ def eliminar_proveedor(
         )
     
     # Obtener proveedor
-    proveedor = crud.obtener_registro(
-        db=db,
+    proveedor = await db.run_sync(
+        crud.obtener_registro,
         model=models.Proveedor,
         id_field="IdProveedor",
         id_val=proveedor_id,
@@ -342,8 +360,8 @@ def eliminar_proveedor(
     )
     
     # Verificar si tiene órdenes de compra asociadas
-    tiene_ordenes = crud.contar_registros(
-        db=db,
+    tiene_ordenes = await db.run_sync(
+        crud.contar_registros,
         model=models.OrdenCompra,
         filtros={"IdProveedor": proveedor_id}
     ) > 0
@@ -358,8 +376,8 @@ def eliminar_proveedor(
         )
     
     # Soft delete
-    crud.eliminar_registro(
-        db=db,
+    await db.run_sync(
+        crud.eliminar_registro,
         instancia=proveedor,
         soft_delete_field="Activo"
     )
@@ -372,9 +390,9 @@ def eliminar_proveedor(
 
 
 @router.post("/{proveedor_id}/activar")
-def activar_proveedor(
+async def activar_proveedor(
     proveedor_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -388,8 +406,8 @@ def activar_proveedor(
         )
     
     # Obtener proveedor
-    proveedor = crud.obtener_registro(
-        db=db,
+    proveedor = await db.run_sync(
+        crud.obtener_registro,
         model=models.Proveedor,
         id_field="IdProveedor",
         id_val=proveedor_id,
@@ -404,8 +422,8 @@ def activar_proveedor(
         )
     
     # Restaurar
-    proveedor_restaurado = crud.restaurar_registro(
-        db=db,
+    proveedor_restaurado = await db.run_sync(
+        crud.restaurar_registro,
         instancia=proveedor,
         soft_delete_field="Activo"
     )
@@ -417,11 +435,11 @@ def activar_proveedor(
 
 
 @router.get("/{proveedor_id}/resumen-compras")
-def resumen_compras_proveedor(
+async def resumen_compras_proveedor(
     proveedor_id: int,
     fecha_inicio: Optional[str] = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
     fecha_fin: Optional[str] = Query(None, description="Fecha fin (YYYY-MM-DD)"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -434,8 +452,8 @@ def resumen_compras_proveedor(
     - Productos más comprados
     """
     # Verificar que el proveedor existe
-    proveedor = crud.obtener_registro(
-        db=db,
+    proveedor = await db.run_sync(
+        crud.obtener_registro,
         model=models.Proveedor,
         id_field="IdProveedor",
         id_val=proveedor_id,
@@ -443,17 +461,18 @@ def resumen_compras_proveedor(
     )
     
     # Query base
-    query = db.query(models.OrdenCompra).filter(
+    query = select(models.OrdenCompra).where(
         models.OrdenCompra.IdProveedor == proveedor_id
     )
     
     # Filtrar por fechas si se proporcionan
     if fecha_inicio:
-        query = query.filter(models.OrdenCompra.FechaOrden >= fecha_inicio)
+        query = query.where(models.OrdenCompra.FechaOrden >= fecha_inicio)
     if fecha_fin:
-        query = query.filter(models.OrdenCompra.FechaOrden <= fecha_fin)
+        query = query.where(models.OrdenCompra.FechaOrden <= fecha_fin)
     
-    ordenes = query.all()
+    result = await db.execute(query)
+    ordenes = result.scalars().all()
     
     # Calcular estadísticas
     total_ordenes = len(ordenes)
@@ -465,22 +484,22 @@ def resumen_compras_proveedor(
         estados[orden.EstadoOrden] = estados.get(orden.EstadoOrden, 0) + 1
     
     # Productos más comprados
-    productos_query = db.query(
+    productos_query = await db.execute(select(
         models.Producto.NombreProducto,
-        db.func.sum(models.DetalleOrdenCompra.Cantidad).label("cantidad_total"),
-        db.func.sum(models.DetalleOrdenCompra.SubTotal).label("monto_total")
+        func.sum(models.DetalleOrdenCompra.Cantidad).label("cantidad_total"),
+        func.sum(models.DetalleOrdenCompra.SubTotal).label("monto_total")
     ).join(
         models.DetalleOrdenCompra
     ).join(
         models.OrdenCompra
-    ).filter(
+    ).where(
         models.OrdenCompra.IdProveedor == proveedor_id
     ).group_by(
         models.Producto.IdProducto,
         models.Producto.NombreProducto
     ).order_by(
-        db.func.sum(models.DetalleOrdenCompra.Cantidad).desc()
-    ).limit(10).all()
+        func.sum(models.DetalleOrdenCompra.Cantidad).desc()
+    ).limit(10))
     
     return {
         "proveedor": {
@@ -510,9 +529,9 @@ def resumen_compras_proveedor(
 
 
 @router.post("/crear-multiple", response_model=List[schemas.ProveedorOut])
-def crear_proveedores_multiples(
+async def crear_proveedores_multiples(
     proveedores: List[schemas.ProveedorCreate],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -535,20 +554,26 @@ def crear_proveedores_multiples(
             detail="Hay RUCs duplicados en los datos proporcionados"
         )
     
-    # Validar que los RUCs no existan en BD
-    for ruc in rucs:
-        if crud.existe_registro(db, models.Proveedor, "RUC", ruc):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"El RUC {ruc} ya existe en la base de datos"
-            )
+    # Validar que los RUCs no existan en BD (una consulta IN por lote)
+    existentes = await db.run_sync(crud.valores_existentes, models.Proveedor, "RUC", rucs)
+    if existentes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Los RUCs ya existen en la base de datos: {', '.join(sorted(existentes))}"
+        )
     
     # Crear proveedores
     registros = [p.dict() for p in proveedores]
-    nuevos_proveedores = crud.crear_multiples(
-        db=db,
+    nuevos_proveedores = await db.run_sync(
+        crud.crear_multiples,
         model=models.Proveedor,
-        registros=registros
+        registros=registros,
+        commit=False
     )
     
+    # La inserción masiva no pasa por el flush del ORM
+    await cache_http.registrar_cambio(db, models.Proveedor)
+    await db.commit()
+    indice_busqueda.registrar_cambios(nuevos_proveedores)
+    
     return nuevos_proveedores
\ No newline at end of file
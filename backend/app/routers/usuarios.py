@@ -2,9 +2,11 @@
 Router para operaciones CRUD de usuarios
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_async_db, get_read_db
 from app import models, schemas
 from app.utils import security
 from app.routers.auth import get_current_active_user
@@ -16,13 +18,13 @@ router = APIRouter()
 # =============================================
 
 @router.get("/", response_model=List[schemas.UsuarioOut])
-def listar_usuarios(
+async def listar_usuarios(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     activo: Optional[bool] = None,
     rol: Optional[int] = None,
     buscar: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -32,30 +34,30 @@ def listar_usuarios(
     if current_user.IdRol != 1:
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
-    query = db.query(models.Usuario)
+    query = select(models.Usuario)
     
     # Aplicar filtros
     if activo is not None:
-        query = query.filter(models.Usuario.Activo == activo)
+        query = query.where(models.Usuario.Activo == activo)
     
     if rol:
-        query = query.filter(models.Usuario.IdRol == rol)
+        query = query.where(models.Usuario.IdRol == rol)
     
     if buscar:
-        query = query.filter(
+        query = query.where(
             (models.Usuario.NombreUsuario.like(f"%{buscar}%")) |
             (models.Usuario.NombreCompleto.like(f"%{buscar}%")) |
             (models.Usuario.Email.like(f"%{buscar}%"))
         )
     
-    usuarios = query.offset(skip).limit(limit).all()
-    return usuarios
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
 
 
 @router.get("/{id_usuario}", response_model=schemas.UsuarioOut)
-def obtener_usuario(
+async def obtener_usuario(
     id_usuario: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -65,9 +67,7 @@ def obtener_usuario(
     if current_user.IdUsuario != id_usuario and current_user.IdRol != 1:
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.IdUsuario == id_usuario
-    ).first()
+    usuario = await db.get(models.Usuario, id_usuario)
     
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -76,9 +76,9 @@ def obtener_usuario(
 
 
 @router.post("/", response_model=schemas.UsuarioOut, status_code=201)
-def crear_usuario(
+async def crear_usuario(
     usuario: schemas.UsuarioCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -89,9 +89,12 @@ def crear_usuario(
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
     # Verificar si el nombre de usuario ya existe
-    existe = db.query(models.Usuario).filter(
-        models.Usuario.NombreUsuario == usuario.NombreUsuario
-    ).first()
+    result = await db.execute(
+        select(models.Usuario.IdUsuario).where(
+            models.Usuario.NombreUsuario == usuario.NombreUsuario
+        )
+    )
+    existe = result.first()
     
     if existe:
         raise HTTPException(
@@ -101,9 +104,12 @@ def crear_usuario(
     
     # Validar email si se proporciona
     if usuario.Email:
-        email_existe = db.query(models.Usuario).filter(
-            models.Usuario.Email == usuario.Email
-        ).first()
+        result = await db.execute(
+            select(models.Usuario.IdUsuario).where(
+                models.Usuario.Email == usuario.Email
+            )
+        )
+        email_existe = result.first()
         if email_existe:
             raise HTTPException(
                 status_code=400,
@@ -118,7 +124,7 @@ def crear_usuario(
     # Crear usuario
     nuevo_usuario = models.Usuario(
         NombreUsuario=usuario.NombreUsuario,
-        ContrasenaHash=security.hash_password(usuario.Contrasena),
+        ContrasenaHash=await run_in_threadpool(security.hash_password, usuario.Contrasena),
         NombreCompleto=usuario.NombreCompleto,
         Email=usuario.Email,
         IdRol=usuario.IdRol,
@@ -127,17 +133,17 @@ def crear_usuario(
     )
     
     db.add(nuevo_usuario)
-    db.commit()
-    db.refresh(nuevo_usuario)
+    await db.commit()
+    await db.refresh(nuevo_usuario)
     
     return nuevo_usuario
 
 
 @router.put("/{id_usuario}", response_model=schemas.UsuarioOut)
-def actualizar_usuario(
+async def actualizar_usuario(
     id_usuario: int,
     usuario_update: schemas.UsuarioUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -148,9 +154,7 @@ def actualizar_usuario(
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
     # Buscar usuario
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.IdUsuario == id_usuario
-    ).first()
+    usuario = await db.get(models.Usuario, id_usuario)
     
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -160,10 +164,13 @@ def actualizar_usuario(
     
     # Verificar email único si se actualiza
     if 'Email' in update_data and update_data['Email']:
-        email_existe = db.query(models.Usuario).filter(
-            models.Usuario.Email == update_data['Email'],
-            models.Usuario.IdUsuario != id_usuario
-        ).first()
+        result = await db.execute(
+            select(models.Usuario.IdUsuario).where(
+                models.Usuario.Email == update_data['Email'],
+                models.Usuario.IdUsuario != id_usuario
+            )
+        )
+        email_existe = result.first()
         if email_existe:
             raise HTTPException(status_code=400, detail="El email ya está en uso")
     
@@ -175,16 +182,16 @@ def actualizar_usuario(
     for field, value in update_data.items():
         setattr(usuario, field, value)
     
-    db.commit()
-    db.refresh(usuario)
+    await db.commit()
+    await db.refresh(usuario)
     
     return usuario
 
 
 @router.delete("/{id_usuario}")
-def eliminar_usuario(
+async def eliminar_usuario(
     id_usuario: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -201,24 +208,22 @@ def eliminar_usuario(
             detail="No puedes eliminar tu propio usuario"
         )
     
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.IdUsuario == id_usuario
-    ).first()
+    usuario = await db.get(models.Usuario, id_usuario)
     
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     # Soft delete
     usuario.Activo = False
-    db.commit()
+    await db.commit()
     
     return {"mensaje": "Usuario eliminado correctamente"}
 
 
 @router.post("/{id_usuario}/activar")
-def activar_usuario(
+async def activar_usuario(
     id_usuario: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -227,23 +232,21 @@ def activar_usuario(
     if current_user.IdRol != 1:
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.IdUsuario == id_usuario
-    ).first()
+    usuario = await db.get(models.Usuario, id_usuario)
     
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     usuario.Activo = True
-    db.commit()
+    await db.commit()
     
     return {"mensaje": "Usuario activado correctamente"}
 
 
 @router.post("/{id_usuario}/resetear-password")
-def resetear_password(
+async def resetear_password(
     id_usuario: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -252,9 +255,7 @@ def resetear_password(
     if current_user.IdRol != 1:
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.IdUsuario == id_usuario
-    ).first()
+    usuario = await db.get(models.Usuario, id_usuario)
     
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -263,11 +264,11 @@ def resetear_password(
     temp_password = security.generate_temp_password()
     
     # Actualizar contraseña
-    usuario.ContrasenaHash = security.hash_password(temp_password)
+    usuario.ContrasenaHash = await run_in_threadpool(security.hash_password, temp_password)
     usuario.Bloqueado = False
     usuario.IntentosLogin = 0
     
-    db.commit()
+    await db.commit()
     
     return {
         "mensaje": "Contraseña reseteada correctamente",
@@ -277,9 +278,9 @@ def resetear_password(
 
 
 @router.get("/rol/{id_rol}", response_model=List[schemas.UsuarioOut])
-def listar_usuarios_por_rol(
+async def listar_usuarios_por_rol(
     id_rol: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.Usuario = Depends(get_current_active_user)
 ):
     """
@@ -288,9 +289,11 @@ def listar_usuarios_por_rol(
     if current_user.IdRol != 1:
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
-    usuarios = db.query(models.Usuario).filter(
-        models.Usuario.IdRol == id_rol,
-        models.Usuario.Activo == True
-    ).all()
+    result = await db.execute(
+        select(models.Usuario).where(
+            models.Usuario.IdRol == id_rol,
+            models.Usuario.Activo == True
+        )
+    )
     
-    return usuarios
\ No newline at end of file
+    return result.scalars().all()
\ No newline at end of file
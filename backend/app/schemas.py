@@ -69,6 +69,13 @@ class ProductoOut(ProductoBase):
         from_attributes = True
 
 
+class CambiosProductos(BaseModel):
+    productos: List[ProductoOut]  # Creados o modificados (activos)
+    desactivados: List[int]  # IdProducto que el terminal debe quitar
+    siguiente: Optional[str] = None  # Token para la próxima llamada (desde=)
+    completo: bool  # False: hay más cambios, llamar de nuevo con siguiente
+
+
 class ProductoStockBajo(BaseModel):
     IdProducto: int
     CodigoBarras: Optional[str]
@@ -81,6 +88,16 @@ class ProductoStockBajo(BaseModel):
         from_attributes = True
 
 
+class CodigosBatch(BaseModel):
+    codigos: List[str] = Field(..., min_length=1, max_length=5000)
+
+
+class ResultadoCodigo(BaseModel):
+    codigo_barras: str
+    encontrado: bool
+    producto: Optional[ProductoOut] = None
+
+
 class AjusteStock(BaseModel):
     tipo_movimiento: str = Field(..., pattern="^(ENTRADA|SALIDA|AJUSTE)$")
     cantidad: int = Field(..., gt=0)
@@ -89,6 +106,235 @@ class AjusteStock(BaseModel):
     referencia: Optional[str] = Field(None, max_length=100)
 
 
+class AjusteStockLinea(AjusteStock):
+    id_producto: int = Field(..., gt=0)
+
+
+class AjustesStockBulk(BaseModel):
+    ajustes: List[AjusteStockLinea] = Field(..., min_length=1, max_length=5000)
+    todo_o_nada: bool = False  # Si alguna línea falla no se aplica ninguna
+
+
+class ResultadoAjusteStock(BaseModel):
+    linea: int
+    id_producto: int
+    aplicado: bool
+    stock_anterior: Optional[int] = None
+    stock_nuevo: Optional[int] = None
+    error: Optional[str] = None
+
+
+class ResultadoAjustesBulk(BaseModel):
+    aplicados: int
+    rechazados: int
+    duracion_ms: float
+    lineas_por_segundo: float
+    resultados: List[ResultadoAjusteStock]
+
+
+# =============================================
+# SCHEMAS DE INVENTARIO (LEDGER)
+# =============================================
+
+class MovimientoOut(BaseModel):
+    IdMovimiento: int
+    IdProducto: int
+    TipoMovimiento: str
+    Cantidad: int
+    StockAnterior: int
+    StockNuevo: int
+    Motivo: Optional[str]
+    IdUsuario: int
+    FechaMovimiento: datetime
+    Referencia: Optional[str]
+    
+    class Config:
+        from_attributes = True
+
+
+class PuntoTendencia(BaseModel):
+    FechaInicio: date  # Día o lunes de la semana
+    TipoMovimiento: str
+    Cantidad: int
+    Movimientos: int
+
+
+class TendenciaMovimientos(BaseModel):
+    periodo: str
+    id_producto: Optional[int] = None
+    movimientos_pendientes: int  # Movimientos aún no incluidos en los resúmenes
+    puntos: List[PuntoTendencia]
+
+
+class ItemVencimiento(BaseModel):
+    IdProducto: int
+    CodigoBarras: Optional[str]
+    NombreProducto: str
+    IdCategoria: int
+    NombreCategoria: str
+    Ubicacion: Optional[str]
+    Lote: Optional[str]
+    FechaVencimiento: date
+    StockActual: int
+    dias_para_vencer: int  # Negativo si ya venció
+    tramo: str
+    valor_costo: Decimal  # StockActual * PrecioCompra
+
+
+class TramoVencimiento(BaseModel):
+    tramo: str  # vencido, hoy, 1-3, 4-7, 8-15, 16-30, 31-60
+    productos: int
+    unidades: int
+
+
+class GrupoVencimiento(BaseModel):
+    clave: str  # IdCategoria o Ubicacion
+    nombre: str
+    productos: int
+    unidades: int
+    valor_costo: Decimal
+    items: List[ItemVencimiento]
+
+
+class ReporteVencimientos(BaseModel):
+    fecha: date
+    generado: datetime  # Momento en que se construyó el tablero
+    dias: int
+    productos: int
+    unidades: int
+    valor_costo: Decimal
+    tramos: List[TramoVencimiento]
+    grupos: List[GrupoVencimiento]
+    items: List[ItemVencimiento]  # Solo con agrupar=ninguno
+
+
+class StockEnFecha(BaseModel):
+    IdProducto: int
+    fecha: datetime
+    stock: int
+    fecha_snapshot: Optional[datetime] = None  # Snapshot desde el que se reprodujo
+    movimientos_reproducidos: int
+
+
+class ExistenciaProducto(BaseModel):
+    IdProducto: int
+    stock: int
+
+
+class ExistenciasAlCorte(BaseModel):
+    fecha: datetime
+    productos: int
+    unidades: int
+    movimientos_reproducidos: int
+    duracion_ms: float
+    items: List[ExistenciaProducto]
+
+
+class ResultadoSnapshot(BaseModel):
+    corte: datetime
+    IdUltimoMovimiento: int
+    productos: int  # Filas de snapshot escritas
+    duracion_ms: float
+
+
+class DiferenciaStock(BaseModel):
+    IdProducto: int
+    StockActual: int
+    stock_reproducido: int
+    diferencia: int
+
+
+class MovimientoIncoherente(BaseModel):
+    IdMovimiento: int
+    IdProducto: int
+    stock_reproducido: int
+    StockAnterior: int
+    StockNuevo: int
+
+
+class SnapshotIncoherente(BaseModel):
+    IdProducto: int
+    FechaCorte: datetime
+    IdUltimoMovimiento: int
+    Stock: int  # Guardado en el snapshot
+    stock_reproducido: int  # Desde el primer movimiento hasta IdUltimoMovimiento
+
+
+class ReporteConsistencia(BaseModel):
+    productos_revisados: int
+    movimientos_reproducidos: int
+    snapshots_revisados: int
+    total_diferencias: int
+    total_incoherencias: int
+    total_snapshots_incoherentes: int
+    diferencias: List[DiferenciaStock]
+    incoherencias: List[MovimientoIncoherente]
+    snapshots_incoherentes: List[SnapshotIncoherente]
+    duracion_ms: float
+
+
+class ValorizacionTotales(BaseModel):
+    productos: int
+    unidades: int
+    valor_costo: Decimal  # SUM(StockActual * PrecioCompra)
+    valor_venta: Decimal  # SUM(StockActual * PrecioVenta)
+    ganancia_potencial: Decimal
+    margen_ponderado: Decimal  # % sobre el costo
+    sin_costo: int  # Productos con PrecioCompra 0 (fuera de los tramos)
+    tramos_margen: dict  # perdida, 0-10, 10-20, 20-30, 30-50, 50+ -> productos
+
+
+class ValorizacionCategoria(ValorizacionTotales):
+    IdCategoria: int
+    NombreCategoria: str
+
+
+class ReporteValorizacion(BaseModel):
+    totales: ValorizacionTotales
+    categorias: List[ValorizacionCategoria]
+    duracion_ms: float
+
+
+class SimulacionPrecios(BaseModel):
+    ajuste_costo_porcentaje: Optional[Decimal] = Field(None, ge=-100, le=1000)
+    ajuste_precio_porcentaje: Optional[Decimal] = Field(None, ge=-100, le=1000)
+    margen_minimo: Optional[Decimal] = Field(None, ge=0, le=1000)  # % sobre el costo nuevo
+    categorias: Optional[List[int]] = None  # Por defecto todo el catálogo
+    redondeo: Decimal = Field(Decimal("0.01"), gt=0, le=100)  # Precio nuevo hacia arriba a este múltiplo
+
+    @validator('redondeo', always=True)
+    def validar_ajuste(cls, v, values):
+        if all(values.get(campo) is None for campo in ('ajuste_costo_porcentaje', 'ajuste_precio_porcentaje', 'margen_minimo')):
+            raise ValueError('Indique al menos un ajuste de costo, de precio o un margen mínimo')
+        return v
+
+
+class SimulacionTotales(BaseModel):
+    productos: int
+    unidades: int
+    valor_costo: Decimal
+    valor_venta: Decimal
+    margen_ponderado: Decimal
+    valor_costo_nuevo: Decimal
+    valor_venta_nuevo: Decimal
+    margen_ponderado_nuevo: Decimal
+    precios_cambiados: int
+    bajo_costo: int  # Productos cuyo precio nuevo queda bajo el costo nuevo
+
+
+class SimulacionCategoria(SimulacionTotales):
+    IdCategoria: int
+    NombreCategoria: str
+
+
+class ResultadoSimulacion(BaseModel):
+    motor: str  # numpy o python
+    totales: Optional[SimulacionTotales] = None
+    categorias: List[SimulacionCategoria]
+    lectura_ms: float
+    duracion_ms: float
+
+
 # =============================================
 # SCHEMAS DE USUARIOS
 # =============================================
@@ -0,0 +1,167 @@
+"""
+GET condicionales (ETag / If-None-Match) para lecturas de productos y proveedores
+El ETag se calcula con una consulta mínima (sin leer las filas del listado)
+y si coincide con el del cliente se responde 304 sin consultar ni serializar
+
+- Productos: MAX(FechaActualizacion) por el índice de esa columna
+- Proveedores: contador de versión en ConfiguracionSistema (VERSION_PROVEEDORES)
+  que se incrementa en la misma transacción de cada escritura
+
+Los ETag son débiles (W/"..."): representan la versión de los datos, no
+los bytes exactos de la respuesta
+"""
+import hashlib
+import os
+from typing import Any, Optional
+from fastapi import Request, Response
+from sqlalchemy import cast, event, func, insert, inspect, Integer, select, String, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import models
+
+# Cache-Control por endpoint
+# Productos: el stock cambia con cada venta, siempre se revalida (el 304
+# es barato). Sin autenticación: un proxy puede guardar y revalidar
+CACHE_CONTROL_PRODUCTOS = "public, no-cache"
+# Proveedores: requieren usuario, solo la caché del navegador
+CACHE_CONTROL_PROVEEDORES = "private, no-cache"
+
+# Mientras el último cambio tenga menos de estos segundos no se emite ETag:
+# una transacción en curso puede confirmar filas con FechaActualizacion
+# anterior a la máxima ya visible
+ETAG_MARGEN_SEG = float(os.getenv("ETAG_MARGEN_SEG", 2))
+
+# Modelos con contador de versión -> clave en ConfiguracionSistema
+CLAVES_VERSION = {
+    models.Proveedor: "VERSION_PROVEEDORES",
+}
+
+_configuracion = models.ConfiguracionSistema.__table__
+
+# =============================================
+# ETAG Y RESPUESTA 304
+# =============================================
+
+def etag_debil(*partes: Any) -> str:
+    resumen = hashlib.sha1("|".join(str(p) for p in partes).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{resumen}"'
+
+
+def coincide(request: Request, etag: str) -> bool:
+    """
+    Comparación débil contra If-None-Match (admite lista y *)
+    """
+    valor = request.headers.get("if-none-match")
+    if not valor:
+        return False
+    if valor.strip() == "*":
+        return True
+    propio = etag.removeprefix("W/")
+    return any(e.strip().removeprefix("W/") == propio for e in valor.split(","))
+
+
+def responder_condicional(
+    request: Request,
+    response: Response,
+    etag: Optional[str],
+    cache_control: str
+) -> Optional[Response]:
+    """
+    Retorna un 304 si el cliente ya tiene esta versión; si no, agrega
+    ETag y Cache-Control a la respuesta y retorna None
+    """
+    response.headers["Cache-Control"] = cache_control
+    if etag is None:
+        return None
+    if coincide(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    response.headers["ETag"] = etag
+    return None
+
+
+# =============================================
+# VERSIÓN DE PRODUCTOS
+# =============================================
+
+async def etag_productos(db: AsyncSession, *alcance: Any) -> Optional[str]:
+    """
+    ETag de los listados de productos (None si hubo cambios muy recientes)
+    """
+    ultima, ahora = (await db.execute(
+        select(func.max(models.Producto.FechaActualizacion), func.now())
+    )).one()
+    if ultima is not None and ahora is not None and (ahora - ultima).total_seconds() < ETAG_MARGEN_SEG:
+        return None
+    return etag_debil("productos", ultima, *alcance)
+
+
+# Columnas del detalle de un producto (todas las mapeadas)
+_COLUMNAS_PRODUCTO = tuple(columna.key for columna in inspect(models.Producto).column_attrs)
+
+
+def etag_producto(producto: models.Producto) -> str:
+    """
+    ETag del detalle de un producto a partir de todas sus columnas
+    FechaActualizacion no basta: dos cambios en el mismo segundo (SQLite)
+    o tick de ~3 ms (DATETIME en SQL Server) conservarían el ETag y el
+    cliente recibiría un 304 con precio o stock viejos
+    """
+    return etag_debil("producto", *(getattr(producto, columna) for columna in _COLUMNAS_PRODUCTO))
+
+
+# =============================================
+# CONTADORES DE VERSIÓN
+# =============================================
+
+def consulta_version(model):
+    """
+    SELECT del contador de versión del modelo
+    """
+    return select(_configuracion.c.ValorConfig).where(_configuracion.c.ClaveConfig == CLAVES_VERSION[model])
+
+
+async def etag_tabla(db: AsyncSession, model, *alcance: Any) -> str:
+    version = await db.scalar(consulta_version(model))
+    return etag_debil(model.__tablename__, version or 0, *alcance)
+
+
+def incrementar_version(connection, model) -> None:
+    """
+    Suma 1 al contador de versión del modelo (en la transacción de la conexión)
+    """
+    clave = CLAVES_VERSION[model]
+    resultado = connection.execute(
+        update(_configuracion)
+        .where(_configuracion.c.ClaveConfig == clave)
+        .values(ValorConfig=cast(cast(_configuracion.c.ValorConfig, Integer) + 1, String))
+    )
+    if resultado.rowcount == 0:
+        connection.execute(
+            insert(_configuracion).values(
+                ClaveConfig=clave,
+                ValorConfig="1",
+                Descripcion=f"Versión de {model.__tablename__} para ETag"
+            )
+        )
+
+
+async def registrar_cambio(db: AsyncSession, model) -> None:
+    """
+    Para escrituras que no pasan por el flush del ORM (inserción masiva)
+    """
+    await db.run_sync(lambda sesion: incrementar_version(sesion.connection(), model))
+
+
+def _al_hacer_flush(session: Session, flush_context) -> None:
+    """
+    Incrementa la versión de los modelos con contador que cambiaron en el flush
+    """
+    cambiados = {
+        type(obj) for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in CLAVES_VERSION
+    }
+    for model in cambiados:
+        incrementar_version(session.connection(), model)
+
+
+event.listen(Session, "after_flush", _al_hacer_flush)
@@ -0,0 +1,196 @@
+"""
+Caché en memoria de productos por código de barras
+Atiende los escaneos de caja sin ir a la base de datos
+
+- LRU acotada (CACHE_PRODUCTOS_MAX) con expiración (CACHE_PRODUCTOS_TTL_SEG)
+- Caché negativa para códigos desconocidos (CACHE_PRODUCTOS_TTL_NEGATIVO_SEG)
+- Invalidación explícita al crear, actualizar, eliminar o ajustar stock
+
+La caché es por proceso: los cambios hechos en otro worker se ven
+cuando vence el TTL
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.database import LECTURA_PROPIA_SEGUNDOS, replica_async_engine
+
+CACHE_PRODUCTOS_MAX = int(os.getenv("CACHE_PRODUCTOS_MAX", 20000))
+CACHE_PRODUCTOS_TTL_SEG = float(os.getenv("CACHE_PRODUCTOS_TTL_SEG", 300))
+CACHE_PRODUCTOS_TTL_NEGATIVO_SEG = float(os.getenv("CACHE_PRODUCTOS_TTL_NEGATIVO_SEG", 30))
+
+# Marca de "código sin producto" en la caché negativa
+AUSENTE = object()
+
+
+class CacheProductos:
+    """
+    LRU código de barras -> producto con TTL e índice inverso por IdProducto
+    """
+
+    def __init__(
+        self,
+        maximo: int = CACHE_PRODUCTOS_MAX,
+        ttl_seg: float = CACHE_PRODUCTOS_TTL_SEG,
+        ttl_negativo_seg: float = CACHE_PRODUCTOS_TTL_NEGATIVO_SEG,
+    ):
+        self.maximo = maximo
+        self.ttl_seg = ttl_seg
+        self.ttl_negativo_seg = ttl_negativo_seg
+        # Con réplica, una lectura justo después de invalidar puede traer datos
+        # atrasados: no se guardan resultados durante esa ventana
+        self.ventana_sin_cache_seg = LECTURA_PROPIA_SEGUNDOS if replica_async_engine is not None else 0
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, Tuple[float, Any, Optional[int]]]" = OrderedDict()
+        self._codigo_por_id: Dict[int, str] = {}
+        self._invalidados: Dict[Any, float] = {}
+        # Reloj de invalidaciones: una lectura anota self.generacion antes de
+        # consultar y no guarda su resultado si *su* código o IdProducto se
+        # invalidó después (generación por clave). Las marcas más antiguas se
+        # descartan y quedan cubiertas por _piso
+        self.generacion = 0
+        self._invalidado_en: Dict[Any, int] = {}
+        self._piso = 0
+        self.reiniciar_contadores()
+
+    def reiniciar_contadores(self) -> None:
+        self.aciertos = 0
+        self.aciertos_negativos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self.expulsiones = 0
+
+    def obtener(self, codigo: str) -> Tuple[bool, Optional[Any]]:
+        """
+        Retorna (encontrado_en_cache, producto)
+        producto es None cuando la caché sabe que el código no existe
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(codigo)
+            if entrada is None or entrada[0] <= ahora:
+                if entrada is not None:
+                    self._quitar(codigo)
+                self.fallos += 1
+                return False, None
+            self._entradas.move_to_end(codigo)
+            if entrada[1] is AUSENTE:
+                self.aciertos_negativos += 1
+                return True, None
+            self.aciertos += 1
+            return True, entrada[1]
+
+    def guardar(
+        self,
+        codigo: str,
+        producto: Any,
+        id_producto: Optional[int] = None,
+        generacion: Optional[int] = None
+    ) -> None:
+        """
+        Guarda un producto encontrado (o None para caché negativa)
+        generacion: valor de self.generacion leído antes de consultar la BD
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            if generacion is not None and self._invalidado_despues(generacion, codigo, id_producto):
+                return
+            if self._invalidado_recientemente(ahora, codigo, id_producto):
+                return
+            if producto is None:
+                self._entradas[codigo] = (ahora + self.ttl_negativo_seg, AUSENTE, None)
+            else:
+                self._entradas[codigo] = (ahora + self.ttl_seg, producto, id_producto)
+                if id_producto is not None:
+                    self._codigo_por_id[id_producto] = codigo
+            self._entradas.move_to_end(codigo)
+            while len(self._entradas) > self.maximo:
+                self._quitar(next(iter(self._entradas)))
+                self.expulsiones += 1
+
+    def invalidar(self, id_producto: Optional[int] = None, *codigos: Optional[str]) -> None:
+        """
+        Quita de la caché el producto (por su id) y los códigos indicados
+        Llamar después del commit de cualquier cambio al producto
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            self.generacion += 1
+            claves = [c for c in codigos if c]
+            if id_producto is not None:
+                codigo = self._codigo_por_id.get(id_producto)
+                if codigo:
+                    claves.append(codigo)
+                self._marcar_invalidado(("id", id_producto), ahora)
+                self._marcar_generacion(("id", id_producto))
+            for codigo in claves:
+                if codigo in self._entradas:
+                    self._quitar(codigo)
+                self._marcar_invalidado(codigo, ahora)
+                self._marcar_generacion(codigo)
+            self.invalidaciones += 1
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._codigo_por_id.clear()
+            self.generacion += 1
+            self._invalidado_en.clear()
+            self._piso = self.generacion
+
+    def _quitar(self, codigo: str) -> None:
+        entrada = self._entradas.pop(codigo, None)
+        if entrada is not None and entrada[2] is not None \
+                and self._codigo_por_id.get(entrada[2]) == codigo:
+            del self._codigo_por_id[entrada[2]]
+
+    def _marcar_generacion(self, clave: Any) -> None:
+        # Se reinserta para que el orden del dict sea el de invalidación
+        self._invalidado_en.pop(clave, None)
+        self._invalidado_en[clave] = self.generacion
+        if len(self._invalidado_en) > self.maximo:
+            for _ in range(len(self._invalidado_en) // 2):
+                vieja = next(iter(self._invalidado_en))
+                self._piso = max(self._piso, self._invalidado_en.pop(vieja))
+
+    def _invalidado_despues(self, generacion: int, codigo: str, id_producto: Optional[int]) -> bool:
+        if generacion < self._piso:
+            return True
+        return self._invalidado_en.get(codigo, 0) > generacion or (
+            id_producto is not None and self._invalidado_en.get(("id", id_producto), 0) > generacion
+        )
+
+    def _marcar_invalidado(self, clave: Any, ahora: float) -> None:
+        if not self.ventana_sin_cache_seg:
+            return
+        self._invalidados[clave] = ahora + self.ventana_sin_cache_seg
+        if len(self._invalidados) > 1000:
+            for vieja, limite in list(self._invalidados.items()):
+                if limite <= ahora:
+                    del self._invalidados[vieja]
+
+    def _invalidado_recientemente(self, ahora: float, codigo: str, id_producto: Optional[int]) -> bool:
+        if not self._invalidados:
+            return False
+        return self._invalidados.get(codigo, 0) > ahora or (
+            id_producto is not None and self._invalidados.get(("id", id_producto), 0) > ahora
+        )
+
+    def resumen(self) -> dict:
+        consultas = self.aciertos + self.aciertos_negativos + self.fallos
+        return {
+            "entradas": len(self._entradas),
+            "maximo": self.maximo,
+            "ttl_seg": self.ttl_seg,
+            "ttl_negativo_seg": self.ttl_negativo_seg,
+            "aciertos": self.aciertos,
+            "aciertos_negativos": self.aciertos_negativos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round((self.aciertos + self.aciertos_negativos) / consultas, 4) if consultas else None,
+            "invalidaciones": self.invalidaciones,
+            "expulsiones": self.expulsiones,
+        }
+
+
+cache = CacheProductos()
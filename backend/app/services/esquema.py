@@ -0,0 +1,264 @@
+"""
+Huella del esquema y verificación rápida al arrancar
+Guarda en ConfiguracionSistema un hash de los modelos (HUELLA_ESQUEMA)
+para que los workers omitan create_all cuando nada cambió
+
+Modos (ESQUEMA_MODO):
+- verificar (por defecto): compara la huella guardada con la de los modelos.
+  Si no hay huella (primer arranque o base anterior a la huella) crea
+  tablas, columnas agregables e índices faltantes y la guarda solo si el
+  esquema coincide con los modelos; si no, el arranque se detiene.
+  Si la huella difiere se hace la reflexión completa: con diferencias el
+  arranque se detiene, sin ellas solo avisa
+- crear: create_all (más columnas agregables e índices) en cada arranque
+- omitir: no toca el esquema
+"""
+import hashlib
+import os
+import time
+from typing import List, Optional
+from sqlalchemy import inspect, select, update, insert
+from sqlalchemy.schema import CreateColumn
+from app.database import Base
+from app import models
+
+CLAVE_HUELLA = "HUELLA_ESQUEMA"
+CLAVE_VERSION = "VERSION_ESQUEMA"
+
+ESQUEMA_MODO = os.getenv("ESQUEMA_MODO", "verificar").lower()
+
+_configuracion = models.ConfiguracionSistema.__table__
+
+
+class EsquemaInconsistente(RuntimeError):
+    """
+    El esquema real no coincide con los modelos: el worker no debe atender
+    """
+
+    def __init__(self, diferencias: List[str]):
+        self.diferencias = diferencias
+        super().__init__(
+            f"{len(diferencias)} diferencias entre los modelos y la base de datos: "
+            + "; ".join(diferencias[:10])
+            + ". Ejecute: python -m scripts.esquema migrar (y los ALTER manuales que reporte)"
+        )
+
+# =============================================
+# HUELLA
+# =============================================
+
+def huella_metadata(metadata=Base.metadata) -> str:
+    """
+    Hash estable de tablas, columnas, tipos, índices y llaves foráneas
+    """
+    partes = []
+    for tabla in sorted(metadata.tables.values(), key=lambda t: t.name):
+        partes.append(f"T:{tabla.name}")
+        for columna in tabla.columns:
+            foraneas = ",".join(sorted(fk.target_fullname for fk in columna.foreign_keys))
+            partes.append(
+                f"C:{columna.name}:{columna.type!r}:{columna.nullable}:"
+                f"{columna.primary_key}:{columna.computed is not None}:{foraneas}"
+            )
+        for indice in sorted(tabla.indexes, key=lambda i: i.name or ""):
+            columnas = ",".join(c.name for c in indice.columns)
+            partes.append(f"I:{indice.name}:{columnas}:{indice.unique}")
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+
+def _leer_valor(connection, clave: str) -> Optional[str]:
+    return connection.execute(
+        select(_configuracion.c.ValorConfig).where(_configuracion.c.ClaveConfig == clave)
+    ).scalar()
+
+
+def _guardar_valor(connection, clave: str, valor: str, descripcion: str) -> None:
+    resultado = connection.execute(
+        update(_configuracion)
+        .where(_configuracion.c.ClaveConfig == clave)
+        .values(ValorConfig=valor)
+    )
+    if resultado.rowcount == 0:
+        connection.execute(
+            insert(_configuracion).values(ClaveConfig=clave, ValorConfig=valor, Descripcion=descripcion)
+        )
+
+
+def leer_huella(engine) -> Optional[str]:
+    """
+    Huella guardada en la base de datos (None si no existe o falta la tabla)
+    """
+    try:
+        with engine.connect() as connection:
+            return _leer_valor(connection, CLAVE_HUELLA)
+    except Exception:
+        return None
+
+
+def guardar_huella(engine, incrementar_version: bool = False) -> dict:
+    """
+    Registra la huella actual de los modelos (y opcionalmente sube la versión)
+    """
+    huella = huella_metadata()
+    with engine.begin() as connection:
+        version = int(_leer_valor(connection, CLAVE_VERSION) or 0)
+        if incrementar_version or version == 0:
+            version += 1
+            _guardar_valor(connection, CLAVE_VERSION, str(version), "Versión del esquema verificada")
+        _guardar_valor(connection, CLAVE_HUELLA, huella, "Huella de los modelos verificada")
+    return {"huella": huella, "version": version}
+
+# =============================================
+# VERIFICACIÓN Y MIGRACIÓN
+# =============================================
+
+def diferencias_esquema(engine) -> List[str]:
+    """
+    Compara los modelos contra el esquema real por reflexión
+    Retorna la lista de tablas o columnas faltantes
+    """
+    inspector = inspect(engine)
+    existentes = set(inspector.get_table_names())
+    diferencias = []
+    for tabla in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        if tabla.name not in existentes:
+            diferencias.append(f"Falta la tabla {tabla.name}")
+            continue
+        columnas = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name not in columnas:
+                diferencias.append(f"Falta la columna {tabla.name}.{columna.name}")
+        indices = {i["name"] for i in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name and indice.name not in indices:
+                diferencias.append(f"Falta el índice {indice.name} en {tabla.name}")
+    return diferencias
+
+
+def columna_agregable(columna) -> bool:
+    """
+    Columnas que ALTER TABLE ADD puede agregar a una tabla con filas sin
+    valores de relleno: calculadas, con default del servidor o que admiten NULL
+    """
+    if columna.primary_key:
+        return False
+    return columna.computed is not None or columna.server_default is not None or columna.nullable
+
+
+def crear_columnas_faltantes(engine) -> List[str]:
+    """
+    Agrega a tablas ya creadas las columnas agregables de los modelos
+    (columna_agregable); las demás quedan en diferencias_esquema
+    Retorna los nombres (Tabla.Columna) de las columnas agregadas
+    """
+    inspector = inspect(engine)
+    existentes = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    creadas = []
+    for tabla in Base.metadata.sorted_tables:
+        if tabla.name not in existentes:
+            continue
+        columnas = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in columnas or not columna_agregable(columna):
+                continue
+            definicion = str(CreateColumn(columna).compile(dialect=engine.dialect))
+            if columna.computed is not None and engine.dialect.name == "sqlite":
+                # SQLite no admite agregar columnas STORED con ALTER TABLE:
+                # se agrega VIRTUAL (su índice guarda igualmente los valores)
+                definicion = definicion.removesuffix(" STORED")
+            with engine.begin() as connection:
+                connection.exec_driver_sql(f"ALTER TABLE {preparer.format_table(tabla)} ADD {definicion}")
+            creadas.append(f"{tabla.name}.{columna.name}")
+    return creadas
+
+
+def crear_indices_faltantes(engine) -> List[str]:
+    """
+    Crea los índices declarados en los modelos que no existen en tablas ya creadas
+    Retorna los nombres de los índices creados
+    """
+    inspector = inspect(engine)
+    existentes = set(inspector.get_table_names())
+    creados = []
+    for tabla in Base.metadata.sorted_tables:
+        if tabla.name not in existentes:
+            continue
+        indices = {i["name"] for i in inspector.get_indexes(tabla.name)}
+        columnas = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for indice in tabla.indexes:
+            if not indice.name or indice.name in indices:
+                continue
+            # Un índice sobre una columna que aún no existe queda en pendientes
+            if all(columna.name in columnas for columna in indice.columns):
+                indice.create(bind=engine)
+                creados.append(indice.name)
+    return creados
+
+
+def migrar(engine) -> dict:
+    """
+    Crea tablas e índices faltantes y registra la nueva huella
+    create_all no altera tablas existentes: las columnas agregables y los
+    índices nuevos de esas tablas se crean aparte y las demás columnas
+    faltantes se reportan
+    """
+    Base.metadata.create_all(bind=engine)
+    crear_columnas_faltantes(engine)
+    crear_indices_faltantes(engine)
+    pendientes = diferencias_esquema(engine)
+    resultado = guardar_huella(engine, incrementar_version=True)
+    return {**resultado, "pendientes": pendientes}
+
+
+def crear_y_comprobar(engine) -> None:
+    """
+    create_all más las columnas agregables e índices que create_all no
+    agrega a tablas existentes; registra la huella solo si la reflexión no
+    encuentra diferencias (si no, lanza EsquemaInconsistente)
+    """
+    Base.metadata.create_all(bind=engine)
+    crear_columnas_faltantes(engine)
+    crear_indices_faltantes(engine)
+    diferencias = diferencias_esquema(engine)
+    if diferencias:
+        raise EsquemaInconsistente(diferencias)
+    guardar_huella(engine)
+
+
+def preparar_esquema(engine, modo: str = ESQUEMA_MODO) -> dict:
+    """
+    Verificación de arranque según ESQUEMA_MODO
+    Retorna el estado del esquema y el tiempo que tomó
+    Lanza EsquemaInconsistente si el esquema no coincide con los modelos
+    """
+    inicio = time.perf_counter()
+    actual = huella_metadata()
+
+    if modo == "omitir":
+        estado = "omitido"
+    elif modo == "crear":
+        crear_y_comprobar(engine)
+        estado = "creado"
+    else:
+        guardada = leer_huella(engine)
+        if guardada == actual:
+            estado = "vigente"
+        elif guardada is None:
+            # Primer arranque (o base anterior a la huella): create_all no
+            # altera tablas existentes, se completan y se comprueban
+            crear_y_comprobar(engine)
+            estado = "creado"
+        else:
+            # Los modelos cambiaron: no se atiende si al esquema le falta algo
+            diferencias = diferencias_esquema(engine)
+            if diferencias:
+                raise EsquemaInconsistente(diferencias)
+            estado = "desactualizado"
+
+    return {
+        "modo": modo,
+        "estado": estado,
+        "huella": actual,
+        "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 2),
+    }
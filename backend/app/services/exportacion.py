@@ -0,0 +1,94 @@
+"""
+Exportación en streaming (CSV / NDJSON)
+Las filas se leen por lotes con un cursor del lado del servidor
+(stream + yield_per) y se serializan a medida que se envían: la memoria
+del worker no crece con el tamaño de la tabla
+
+Se leen columnas sueltas (tuplas), sin instanciar modelos ORM ni schemas
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, List
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# Filas por lote leído de la base de datos (y por bloque enviado)
+EXPORTACION_LOTE = int(os.getenv("EXPORTACION_LOTE", 2000))
+
+TIPOS_CONTENIDO = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def serializar_valor(valor: Any) -> Any:
+    """
+    Valores JSON con el mismo formato que las respuestas de la API
+    (Decimal como texto, fechas ISO 8601)
+    """
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+async def leer_por_lotes(fabrica: async_sessionmaker, query, lote: int = EXPORTACION_LOTE):
+    """
+    Genera listas de filas leídas con un cursor del lado del servidor
+    La sesión vive lo que dura el generador
+    """
+    async with fabrica() as db:
+        result = await db.stream(query.execution_options(yield_per=lote))
+        async for particion in result.partitions():
+            yield particion
+
+
+async def generar_csv(fabrica: async_sessionmaker, query, columnas: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM: Excel reconoce el archivo como UTF-8 (tildes y eñes)
+    buffer.write("﻿")
+    writer.writerow(columnas)
+    async for particion in leer_por_lotes(fabrica, query):
+        writer.writerows(
+            [serializar_valor(valor) for valor in fila] for fila in particion
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def generar_ndjson(fabrica: async_sessionmaker, query, columnas: List[str]) -> AsyncIterator[bytes]:
+    async for particion in leer_por_lotes(fabrica, query):
+        yield "".join(
+            json.dumps(dict(zip(columnas, fila)), default=serializar_valor, ensure_ascii=False) + "\n"
+            for fila in particion
+        ).encode("utf-8")
+
+
+async def comprimir_gzip(fuente: AsyncIterator[bytes], nivel: int = 6) -> AsyncIterator[bytes]:
+    """
+    Comprime al vuelo en formato gzip (wbits=31)
+    """
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    async for bloque in fuente:
+        datos = compresor.compress(bloque)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def exportar(fabrica: async_sessionmaker, query, columnas: List[str], formato: str, comprimir: bool = False):
+    """
+    Generador de bytes para StreamingResponse según formato (csv | ndjson)
+    """
+    generador = generar_csv if formato == "csv" else generar_ndjson
+    cuerpo = generador(fabrica, query, columnas)
+    return comprimir_gzip(cuerpo) if comprimir else cuerpo
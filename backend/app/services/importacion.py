@@ -0,0 +1,465 @@
+"""
+Importación masiva de productos desde CSV o XLSX
+El archivo se recorre fila a fila (csv.reader / openpyxl en modo read_only)
+y se escribe por lotes:
+- un SELECT ... IN por lote para saber qué códigos de barras ya existen
+- un INSERT executemany para los nuevos (fast_executemany en SQL Server)
+- un UPDATE executemany por llave primaria para los existentes
+- un commit por lote
+
+El avance se reporta como NDJSON (una línea por evento) mientras se importa
+
+XLSX requiere openpyxl (opcional)
+"""
+import csv
+import io
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import models, schemas
+from app.database import SessionLocal
+from app.services import indice_busqueda
+from app.services.cache_productos import cache as cache_productos
+from app.utils.helpers import (
+    dividir_lista,
+    eliminar_acentos_texto,
+    limpiar_texto,
+    parsear_fecha,
+    redondear_decimal,
+    string_to_decimal,
+)
+
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover - dependencia opcional
+    openpyxl = None
+
+# Filas por lote (un SELECT, un INSERT, un UPDATE y un commit)
+IMPORTACION_LOTE = int(os.getenv("IMPORTACION_LOTE", 2000))
+
+# Errores detallados a reportar; los siguientes solo se cuentan
+IMPORTACION_MAX_ERRORES = int(os.getenv("IMPORTACION_MAX_ERRORES", 1000))
+
+# Columnas de Producto que se pueden importar
+CAMPOS_IMPORTABLES = list(schemas.ProductoCreate.model_fields)
+
+# Encabezados alternativos (normalizados) -> campo
+ALIAS_ENCABEZADOS = {
+    "codigo": "CodigoBarras",
+    "codigodebarras": "CodigoBarras",
+    "barcode": "CodigoBarras",
+    "ean": "CodigoBarras",
+    "nombre": "NombreProducto",
+    "producto": "NombreProducto",
+    "descripcion": "Descripcion",
+    "categoria": "IdCategoria",
+    "unidad": "IdUnidad",
+    "costo": "PrecioCompra",
+    "precio": "PrecioVenta",
+    "stock": "StockActual",
+    "stockminimo": "StockMinimo",
+    "stockmaximo": "StockMaximo",
+    "vencimiento": "FechaVencimiento",
+}
+
+# El stock de un producto existente solo cambia con movimientos de inventario
+CAMPOS_SOLO_CREACION = {"StockActual"}
+
+
+class ErrorImportacion(Exception):
+    """Archivo que no se puede importar (formato, encabezados)"""
+
+
+# =============================================
+# LECTURA DEL ARCHIVO
+# =============================================
+
+def normalizar_encabezado(texto: Any) -> str:
+    texto = eliminar_acentos_texto(str(texto or "")).lower()
+    return re.sub(r"[^a-z0-9]", "", texto)
+
+
+def mapear_encabezados(encabezados: List[Any]) -> Dict[int, str]:
+    """
+    Posición de columna -> campo de Producto
+    Acepta el nombre del campo con cualquier formato (CodigoBarras,
+    codigo_barras, "Código de barras") y los alias conocidos
+    """
+    por_nombre = {normalizar_encabezado(campo): campo for campo in CAMPOS_IMPORTABLES}
+    por_nombre.update(ALIAS_ENCABEZADOS)
+    mapa = {}
+    for posicion, encabezado in enumerate(encabezados):
+        campo = por_nombre.get(normalizar_encabezado(encabezado))
+        if campo and campo not in mapa.values():
+            mapa[posicion] = campo
+    if "CodigoBarras" not in mapa.values():
+        raise ErrorImportacion("El archivo debe tener una columna CodigoBarras")
+    return mapa
+
+
+def leer_csv(archivo) -> Iterator[List[Any]]:
+    """
+    Filas de un CSV (UTF-8, con o sin BOM; separador , ; o tabulación)
+    """
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", errors="replace", newline="")
+    muestra = texto.read(8192)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    yield from csv.reader(texto, dialecto)
+
+
+def leer_xlsx(archivo) -> Iterator[List[Any]]:
+    """
+    Filas de la primera hoja de un XLSX, sin cargar el libro en memoria
+    """
+    if openpyxl is None:
+        raise ErrorImportacion("Para importar XLSX instale openpyxl (pip install openpyxl)")
+    libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        for fila in libro.worksheets[0].iter_rows(values_only=True):
+            yield list(fila)
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, formato: str) -> Iterator[List[Any]]:
+    if formato == "xlsx":
+        return leer_xlsx(archivo)
+    return leer_csv(archivo)
+
+
+# =============================================
+# NORMALIZACIÓN DE CAMPOS
+# =============================================
+
+def normalizar_codigo(valor: Any) -> Optional[str]:
+    """
+    Código de barras como texto sin espacios
+    Excel guarda los códigos numéricos como número (7450000000001.0)
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    codigo = re.sub(r"\s", "", str(valor))
+    return codigo or None
+
+
+def normalizar_texto(valor: Any) -> Optional[str]:
+    return limpiar_texto(str(valor), capitalizar=False)
+
+
+def normalizar_decimal(valor: Any) -> Decimal:
+    if isinstance(valor, (int, float)):
+        return redondear_decimal(Decimal(str(valor)))
+    texto = str(valor).strip().replace("$", "").replace(" ", "")
+    # Coma decimal (1,50) cuando no hay punto
+    if "," in texto and "." not in texto:
+        texto = texto.replace(",", ".")
+    numero = string_to_decimal(texto.replace(",", ""))
+    if numero is None or not numero.is_finite():
+        raise ValueError(f"no es un número: '{valor}'")
+    return redondear_decimal(numero)
+
+
+def normalizar_entero(valor: Any) -> int:
+    if isinstance(valor, int):
+        return valor
+    try:
+        numero = Decimal(str(valor).strip())
+    except Exception:
+        raise ValueError(f"no es un número entero: '{valor}'")
+    if not numero.is_finite() or numero != numero.to_integral_value():
+        raise ValueError(f"no es un número entero: '{valor}'")
+    return int(numero)
+
+
+@lru_cache(maxsize=4096)
+def _fecha_desde_texto(texto: str) -> date:
+    # Las listas de precios repiten pocas fechas: se parsean una vez
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return parsear_fecha(texto, formato)
+        except ValueError:
+            continue
+    raise ValueError(f"fecha inválida: '{texto}' (use AAAA-MM-DD o DD/MM/AAAA)")
+
+
+def normalizar_fecha(valor: Any) -> date:
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return _fecha_desde_texto(str(valor).strip())
+
+
+CONVERSORES = {
+    "CodigoBarras": normalizar_codigo,
+    "NombreProducto": normalizar_texto,
+    "Descripcion": normalizar_texto,
+    "Lote": normalizar_texto,
+    "Ubicacion": normalizar_texto,
+    "PrecioCompra": normalizar_decimal,
+    "PrecioVenta": normalizar_decimal,
+    "IdCategoria": normalizar_entero,
+    "IdUnidad": normalizar_entero,
+    "StockActual": normalizar_entero,
+    "StockMinimo": normalizar_entero,
+    "StockMaximo": normalizar_entero,
+    "FechaVencimiento": normalizar_fecha,
+}
+
+
+def normalizar_fila(columnas: List[Tuple[int, str, Any]], fila: List[Any]) -> Dict[str, Any]:
+    """
+    Convierte las celdas de una fila al tipo de cada campo
+    Las celdas vacías se omiten: al crear aplican los valores por defecto
+    y al actualizar se conserva el valor actual
+    Lanza ValueError si alguna no se puede convertir
+    """
+    datos = {}
+    for posicion, campo, conversor in columnas:
+        valor = fila[posicion] if posicion < len(fila) else None
+        if valor is None or (valor.__class__ is str and not valor.strip()):
+            continue
+        valor = conversor(valor)
+        if valor is not None:
+            datos[campo] = valor
+    return datos
+
+
+def mensaje_validacion(error: ValidationError) -> str:
+    detalle = error.errors()[0]
+    campo = ".".join(str(parte) for parte in detalle.get("loc", ()))
+    return f"{campo}: {detalle.get('msg')}" if campo else str(detalle.get("msg"))
+
+
+# =============================================
+# IMPORTACIÓN POR LOTES
+# =============================================
+
+class ImportadorProductos:
+    """
+    Importa productos por lotes con upsert por CodigoBarras
+    Uso: for linea in ImportadorProductos(...).ejecutar(archivo, "csv"): ...
+    """
+
+    def __init__(
+        self,
+        tamano_lote: int = IMPORTACION_LOTE,
+        actualizar_existentes: bool = True,
+        id_categoria: Optional[int] = None,
+        id_unidad: Optional[int] = None,
+    ):
+        self.tamano_lote = tamano_lote
+        self.actualizar_existentes = actualizar_existentes
+        # Valores por defecto para filas sin categoría o unidad
+        self.defectos = {"IdCategoria": id_categoria, "IdUnidad": id_unidad}
+        self.procesadas = 0
+        self.insertadas = 0
+        self.actualizadas = 0
+        self.omitidas = 0
+        self.errores = 0
+
+    def _evento(self, tipo: str, **datos) -> bytes:
+        return (json.dumps({"tipo": tipo, **datos}, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+    def _error(self, linea: int, codigo: Optional[str], detalle: str) -> Optional[bytes]:
+        self.errores += 1
+        if self.errores > IMPORTACION_MAX_ERRORES:
+            return None
+        return self._evento("error", linea=linea, CodigoBarras=codigo, detalle=detalle)
+
+    def _progreso(self, inicio: float, tipo: str = "progreso") -> bytes:
+        duracion = time.perf_counter() - inicio
+        return self._evento(
+            tipo,
+            procesadas=self.procesadas,
+            insertadas=self.insertadas,
+            actualizadas=self.actualizadas,
+            omitidas=self.omitidas,
+            errores=self.errores,
+            duracion_ms=round(duracion * 1000, 1),
+            lineas_por_segundo=round(self.procesadas / duracion, 1) if duracion else 0.0,
+        )
+
+    def ejecutar(self, archivo, formato: str) -> Iterator[bytes]:
+        """
+        Genera eventos NDJSON: error (por línea), progreso (por lote) y resumen
+        """
+        inicio = time.perf_counter()
+        try:
+            filas = leer_filas(archivo, formato)
+            encabezados = next(filas, None)
+            if encabezados is None:
+                raise ErrorImportacion("El archivo está vacío")
+            mapa = mapear_encabezados(encabezados)
+        except ErrorImportacion as e:
+            yield self._evento("fallo", detalle=str(e))
+            return
+
+        yield self._evento("inicio", columnas=list(mapa.values()), tamano_lote=self.tamano_lote)
+        columnas = [(posicion, campo, CONVERSORES[campo]) for posicion, campo in mapa.items()]
+        posicion_codigo = next(posicion for posicion, campo in mapa.items() if campo == "CodigoBarras")
+
+        db = SessionLocal()
+        try:
+            self._ids_validos = {
+                "IdCategoria": set(db.scalars(select(models.Categoria.IdCategoria))),
+                "IdUnidad": set(db.scalars(select(models.UnidadMedida.IdUnidad))),
+            }
+            lote: List[Tuple[int, Dict[str, Any]]] = []
+            # La línea 1 es el encabezado
+            for linea, fila in enumerate(filas, start=2):
+                if not any(valor not in (None, "") for valor in fila):
+                    continue
+                self.procesadas += 1
+                try:
+                    datos = normalizar_fila(columnas, fila)
+                except ValueError as e:
+                    codigo = normalizar_codigo(fila[posicion_codigo]) if posicion_codigo < len(fila) else None
+                    evento = self._error(linea, codigo, str(e))
+                    if evento:
+                        yield evento
+                    continue
+                lote.append((linea, datos))
+
+                if len(lote) >= self.tamano_lote:
+                    yield from self._procesar_lote(db, lote)
+                    yield self._progreso(inicio)
+                    lote = []
+
+            if lote:
+                yield from self._procesar_lote(db, lote)
+        except Exception as e:
+            db.rollback()
+            yield self._evento("fallo", detalle=f"Error al importar: {e}")
+            return
+        finally:
+            db.close()
+
+        yield self._progreso(inicio, "resumen")
+
+    def _validar(self, datos: Dict[str, Any], existente: bool) -> Dict[str, Any]:
+        """
+        Valida con los schemas de la API y retorna los campos a escribir
+        Lanza ValueError / ValidationError
+        """
+        if existente:
+            datos = {campo: valor for campo, valor in datos.items() if campo not in CAMPOS_SOLO_CREACION}
+            valores = schemas.ProductoUpdate(**datos).model_dump(exclude_unset=True)
+        else:
+            for campo, defecto in self.defectos.items():
+                if datos.get(campo) is None and defecto is not None:
+                    datos[campo] = defecto
+            valores = schemas.ProductoCreate(**datos).model_dump()
+
+        for campo, validos in self._ids_validos.items():
+            if valores.get(campo) is not None and valores[campo] not in validos:
+                raise ValueError(f"{campo} {valores[campo]} no existe")
+        return valores
+
+    def _procesar_lote(self, db, lote: List[Tuple[int, Dict[str, Any]]]) -> Iterator[bytes]:
+        """
+        Upsert de un lote por CodigoBarras en una transacción
+        Si otro proceso inserta el mismo código entre la consulta y el
+        INSERT, el lote se reintenta una vez
+        """
+        for intento in range(2):
+            try:
+                eventos, cambios = self._escribir_lote(db, lote)
+                db.commit()
+                break
+            except IntegrityError:
+                db.rollback()
+                if intento:
+                    raise
+        self.insertadas += cambios["insertadas"]
+        self.actualizadas += cambios["actualizadas"]
+        self.omitidas += cambios["omitidas"]
+        for linea, codigo, detalle in eventos:
+            evento = self._error(linea, codigo, detalle)
+            if evento:
+                yield evento
+        self._refrescar_caches(db, cambios["codigos"])
+
+    def _escribir_lote(self, db, lote):
+        Producto = models.Producto
+        # Código repetido dentro del lote: gana la última fila
+        por_codigo: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        eventos = []
+        for linea, datos in lote:
+            codigo = datos.get("CodigoBarras")
+            if not codigo:
+                eventos.append((linea, None, "CodigoBarras es obligatorio"))
+                continue
+            por_codigo[codigo] = (linea, datos)
+
+        existentes: Dict[str, int] = dict(db.execute(
+            select(Producto.CodigoBarras, Producto.IdProducto)
+            .where(Producto.CodigoBarras.in_(list(por_codigo)))
+        ).all()) if por_codigo else {}
+
+        nuevos, cambios_existentes, codigos_actualizados = [], [], []
+        omitidas = 0
+        for codigo, (linea, datos) in por_codigo.items():
+            id_producto = existentes.get(codigo)
+            if id_producto is not None and not self.actualizar_existentes:
+                omitidas += 1
+                continue
+            try:
+                valores = self._validar(dict(datos), id_producto is not None)
+            except ValidationError as e:
+                eventos.append((linea, codigo, mensaje_validacion(e)))
+                continue
+            except ValueError as e:
+                eventos.append((linea, codigo, str(e)))
+                continue
+            if id_producto is None:
+                nuevos.append(valores)
+            elif valores:
+                valores["IdProducto"] = id_producto
+                cambios_existentes.append(valores)
+                codigos_actualizados.append(valores.get("CodigoBarras", codigo))
+
+        if nuevos:
+            # INSERT de Core: un solo executemany aunque algunas filas tengan
+            # columnas en None (el bulk insert del ORM las separa en grupos)
+            db.execute(insert(Producto.__table__), nuevos)
+        if cambios_existentes:
+            db.execute(update(Producto), cambios_existentes)
+
+        return eventos, {
+            "insertadas": len(nuevos),
+            "actualizadas": len(cambios_existentes),
+            "omitidas": omitidas,
+            "codigos": [valores["CodigoBarras"] for valores in nuevos] + codigos_actualizados,
+        }
+
+    def _refrescar_caches(self, db, codigos: List[str]) -> None:
+        """
+        Invalida la caché por código de barras y reindexa la búsqueda
+        (las escrituras por executemany no pasan por los eventos del ORM)
+        """
+        if not codigos:
+            return
+        indice = indice_busqueda.INDICES.get(models.Producto)
+        columnas = [models.Producto.IdProducto] + [
+            getattr(models.Producto, campo) for campo in (indice.campos + indice.filtros if indice else ["CodigoBarras"])
+        ]
+        for grupo in dividir_lista(codigos, 2000):
+            for fila in db.execute(select(*columnas).where(models.Producto.CodigoBarras.in_(grupo))):
+                cache_productos.invalidar(fila.IdProducto, fila.CodigoBarras)
+                if indice is not None and indice.listo:
+                    indice.actualizar(fila.IdProducto, indice.valores(fila))
@@ -0,0 +1,589 @@
+"""
+Índice de trigramas en memoria para la búsqueda de productos y proveedores
+Reemplaza los LIKE '%texto%' (que recorren toda la tabla) en la búsqueda
+mientras se escribe
+
+- Texto normalizado sin acentos ni mayúsculas (helpers.eliminar_acentos_texto)
+- Trigramas al estilo pg_trgm: cada palabra se rellena con dos espacios al
+  inicio y uno al final, así los trigramas iniciales sirven para prefijos
+- Ranking: inicio del campo > inicio de palabra > subcadena > parecido
+  (tolerante a errores de tipeo)
+- Se actualiza en cada commit de este proceso que toca los modelos indexados
+- Cambios de otros workers: cada INDICE_BUSQUEDA_REFRESCO_SEG se reindexan
+  los productos con FechaActualizacion posterior a la última lectura y el
+  índice de proveedores se reconstruye si cambió VERSION_PROVEEDORES
+  (cache_http). Las bajas físicas no se leen (la fila ya no vuelve al
+  traer los ids) y las transacciones que tardan más de
+  INDICE_BUSQUEDA_MARGEN_SEG en confirmar quedan sin reindexar; los
+  filtros (Activo, IdCategoria) se vuelven a aplicar en SQL al traer las filas
+- La construcción completa (~7 s de CPU por 100k filas, con el GIL tomado)
+  se hace al arrancar; repetirla es opcional (INDICE_BUSQUEDA_RECONSTRUIR_SEG)
+
+Mientras el índice no está listo, las búsquedas usan LIKE
+"""
+import os
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.services import cache_http
+from app.utils.helpers import eliminar_acentos_texto
+from app import models
+
+# Intervalo de reconstrucción completa del índice (segundos, 0 = solo al
+# arrancar). Cada worker reconstruye el suyo y mientras tanto sus peticiones
+# esperan el GIL: si se activa, que sea en horas (ej: 86400)
+INDICE_BUSQUEDA_RECONSTRUIR_SEG = float(os.getenv("INDICE_BUSQUEDA_RECONSTRUIR_SEG", 0))
+
+# Intervalo de lectura de cambios de otros workers (segundos, 0 = solo reconstrucción)
+INDICE_BUSQUEDA_REFRESCO_SEG = float(os.getenv("INDICE_BUSQUEDA_REFRESCO_SEG", 15))
+
+# Solapamiento de cada lectura con la anterior: una transacción puede
+# confirmar filas con FechaActualizacion anterior a la última lectura
+INDICE_BUSQUEDA_MARGEN_SEG = float(os.getenv("INDICE_BUSQUEDA_MARGEN_SEG", 5))
+
+# Fracción mínima de trigramas de la búsqueda presentes para aceptar un parecido
+INDICE_SIMILITUD_MIN = float(os.getenv("INDICE_SIMILITUD_MIN", 0.5))
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+# =============================================
+# NORMALIZACIÓN Y TRIGRAMAS
+# =============================================
+
+def normalizar(texto: Optional[str]) -> str:
+    """
+    Minúsculas, sin acentos y solo letras/números separados por un espacio
+    Ejemplo: "Café Molido (Dúrán)" -> "cafe molido duran"
+    """
+    if not texto:
+        return ""
+    if not texto.isascii():
+        texto = eliminar_acentos_texto(texto)
+    return _NO_ALFANUMERICO.sub(" ", texto.lower()).strip()
+
+
+def trigramas(texto: str, prefijo_final: bool = False) -> Set[str]:
+    """
+    Trigramas de un texto normalizado
+    Con prefijo_final=True la última palabra no se cierra: "arr" coincide
+    con "arroz" (búsqueda mientras se escribe)
+    """
+    resultado = set()
+    palabras = texto.split()
+    for i, palabra in enumerate(palabras):
+        abierta = prefijo_final and i == len(palabras) - 1
+        relleno = "  " + palabra + ("" if abierta else " ")
+        for j in range(len(relleno) - 2):
+            resultado.add(relleno[j:j + 3])
+    return resultado
+
+# =============================================
+# ÍNDICE
+# =============================================
+
+class IndiceTrigramas:
+    """
+    Índice invertido trigrama -> documentos para un modelo
+
+    Los documentos se identifican por un ordinal asignado en orden de
+    relevancia base (texto principal más corto primero): así el ranking
+    dentro de cada nivel es ordenar enteros, sin recorrer los textos.
+    Las columnas de filtro (ej: Activo, IdCategoria) también se indexan
+    como conjuntos para filtrar con intersecciones
+    """
+
+    def __init__(self, model, id_field: str, campos: Sequence[str], filtros: Sequence[str] = ()):
+        self.model = model
+        self.id_field = id_field
+        self.campos = tuple(campos)
+        self.filtros = tuple(filtros)
+        self.listo = False
+        self.construido_en: Optional[float] = None
+        self.tiempo_construccion_ms: Optional[float] = None
+        self.busquedas = 0
+        self.refrescados = 0
+        # Hora de la BD (FechaActualizacion) o versión de la tabla en la última lectura
+        self._marca: Any = None
+        self._lock = threading.RLock()
+        self._vaciar()
+        # Cambios recibidos durante una reconstrucción (se aplican al terminar)
+        self._construyendo = False
+        self._cambios_pendientes: List[Tuple[int, Optional[Dict[str, Any]]]] = []
+
+    def _vaciar(self) -> None:
+        self._postings: Dict[str, Set[int]] = {}
+        self._inicios: Dict[str, Set[int]] = {}
+        self._por_filtro: Dict[Tuple[str, Any], Set[int]] = {}
+        self._textos: Dict[int, Tuple[str, ...]] = {}
+        self._filtros_doc: Dict[int, Tuple[Any, ...]] = {}
+        self._num_trigramas: Dict[int, int] = {}
+        self._id_por_ordinal: Dict[int, Any] = {}
+        self._ordinal_por_id: Dict[Any, int] = {}
+        self._siguiente_ordinal = 0
+
+    @property
+    def nombre(self) -> str:
+        return self.model.__tablename__
+
+    def valores(self, obj) -> Dict[str, Any]:
+        """
+        Foto de los campos indexados de una instancia (o fila)
+        """
+        return {campo: getattr(obj, campo) for campo in self.campos + self.filtros}
+
+    def _agregar(self, id_doc: Any, textos: Tuple[str, ...], valores_filtro: Tuple[Any, ...]) -> None:
+        ordinal = self._siguiente_ordinal
+        self._siguiente_ordinal += 1
+        self._id_por_ordinal[ordinal] = id_doc
+        self._ordinal_por_id[id_doc] = ordinal
+        self._textos[ordinal] = textos
+        self._filtros_doc[ordinal] = valores_filtro
+
+        tris = set()
+        for texto in textos:
+            if texto:
+                tris |= trigramas(texto)
+                for n in (1, 2, 3):
+                    self._inicios.setdefault(texto[:n], set()).add(ordinal)
+        self._num_trigramas[ordinal] = len(tris)
+        for tri in tris:
+            self._postings.setdefault(tri, set()).add(ordinal)
+        for campo, valor in zip(self.filtros, valores_filtro):
+            self._por_filtro.setdefault((campo, valor), set()).add(ordinal)
+
+    def _quitar(self, id_doc: Any) -> None:
+        ordinal = self._ordinal_por_id.pop(id_doc, None)
+        if ordinal is None:
+            return
+        del self._id_por_ordinal[ordinal]
+        del self._num_trigramas[ordinal]
+        textos = self._textos.pop(ordinal)
+        valores_filtro = self._filtros_doc.pop(ordinal)
+
+        def descartar(mapa, clave):
+            conjunto = mapa.get(clave)
+            if conjunto is not None:
+                conjunto.discard(ordinal)
+                if not conjunto:
+                    del mapa[clave]
+
+        for texto in textos:
+            if texto:
+                for tri in trigramas(texto):
+                    descartar(self._postings, tri)
+                for n in (1, 2, 3):
+                    descartar(self._inicios, texto[:n])
+        for campo, valor in zip(self.filtros, valores_filtro):
+            descartar(self._por_filtro, (campo, valor))
+
+    def _preparar(self, valores: Dict[str, Any]) -> Tuple[Tuple[str, ...], Tuple[Any, ...]]:
+        return (
+            tuple(normalizar(valores.get(campo)) for campo in self.campos),
+            tuple(valores.get(campo) for campo in self.filtros),
+        )
+
+    def actualizar(self, id_doc: Any, valores: Optional[Dict[str, Any]]) -> None:
+        """
+        Reindexa un documento (valores=None lo elimina)
+        Los documentos nuevos quedan al final de su nivel hasta la próxima reconstrucción
+        """
+        with self._lock:
+            if self._construyendo:
+                self._cambios_pendientes.append((id_doc, valores))
+            self._quitar(id_doc)
+            if valores is not None:
+                self._agregar(id_doc, *self._preparar(valores))
+
+    def construir(self, filas: Iterable) -> None:
+        """
+        Reconstruye el índice completo a partir de filas con los campos indexados
+        Se arma aparte y se reemplaza al final: las búsquedas siguen funcionando
+        """
+        inicio = time.perf_counter()
+        with self._lock:
+            self._construyendo = True
+            self._cambios_pendientes = []
+        try:
+            documentos = [
+                (getattr(fila, self.id_field),) + self._preparar(self.valores(fila))
+                for fila in filas
+            ]
+            # Ordinales en orden de relevancia base: texto principal corto primero
+            documentos.sort(key=lambda d: (len(d[1][0]), d[0]))
+            nuevo = IndiceTrigramas(self.model, self.id_field, self.campos, self.filtros)
+            for id_doc, textos, valores_filtro in documentos:
+                nuevo._agregar(id_doc, textos, valores_filtro)
+        except Exception:
+            with self._lock:
+                self._construyendo = False
+            raise
+
+        with self._lock:
+            # Cambios confirmados mientras se leía la tabla
+            for id_doc, valores in self._cambios_pendientes:
+                nuevo._quitar(id_doc)
+                if valores is not None:
+                    nuevo._agregar(id_doc, *nuevo._preparar(valores))
+            for atributo in ("_postings", "_inicios", "_por_filtro", "_textos", "_filtros_doc",
+                             "_num_trigramas", "_id_por_ordinal", "_ordinal_por_id", "_siguiente_ordinal"):
+                setattr(self, atributo, getattr(nuevo, atributo))
+            self._construyendo = False
+            self._cambios_pendientes = []
+            self.listo = True
+            self.construido_en = time.time()
+            self.tiempo_construccion_ms = round((time.perf_counter() - inicio) * 1000, 1)
+
+    def _columnas(self) -> list:
+        return [getattr(self.model, c) for c in (self.id_field,) + self.campos + self.filtros]
+
+    def _leer_marca(self, db: Session) -> Any:
+        if hasattr(self.model, "FechaActualizacion"):
+            return db.scalar(select(func.now()))
+        if self.model in cache_http.CLAVES_VERSION:
+            return db.scalar(cache_http.consulta_version(self.model))
+        return None
+
+    def construir_desde_bd(self) -> None:
+        with SessionLocal() as db:
+            # La marca se lee antes que las filas: lo posterior lo trae el refresco
+            marca = self._leer_marca(db)
+            filas = db.execute(select(*self._columnas()).execution_options(yield_per=5000))
+            self.construir(filas)
+        self._marca = marca
+
+    def refrescar_desde_bd(self) -> int:
+        """
+        Incorpora los cambios confirmados por otros workers desde la última
+        lectura: reindexa las filas con FechaActualizacion posterior (menos
+        INDICE_BUSQUEDA_MARGEN_SEG) o reconstruye si cambió la versión de la tabla
+        Retorna cuántos documentos cambiaron
+        """
+        if not self.listo or self._marca is None:
+            return 0
+        with SessionLocal() as db:
+            marca = self._leer_marca(db)
+            if not hasattr(self.model, "FechaActualizacion"):
+                if marca == self._marca:
+                    return 0
+                cambiados = None
+            else:
+                desde = self._marca - timedelta(seconds=INDICE_BUSQUEDA_MARGEN_SEG)
+                cambiados = db.execute(
+                    select(*self._columnas()).where(self.model.FechaActualizacion >= desde)
+                ).all()
+
+        if cambiados is None:
+            self.construir_desde_bd()
+            self.refrescados += 1
+            return 1
+
+        actualizados = 0
+        for fila in cambiados:
+            id_doc = getattr(fila, self.id_field)
+            valores = self.valores(fila)
+            with self._lock:
+                ordinal = self._ordinal_por_id.get(id_doc)
+                # Sin cambios en lo indexado (ej: solo stock): conserva su posición
+                if ordinal is not None and (self._textos[ordinal], self._filtros_doc[ordinal]) == self._preparar(valores):
+                    continue
+                self.actualizar(id_doc, valores)
+            actualizados += 1
+        self._marca = marca
+        self.refrescados += actualizados
+        return actualizados
+
+    def cubre(self, campos: Iterable[str], filtros: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        True si el índice está listo y puede atender esa búsqueda
+        """
+        return self.listo and set(campos) == set(self.campos) \
+            and set(filtros or {}) <= set(self.filtros)
+
+    def buscar(
+        self,
+        termino: str,
+        filtros: Optional[Dict[str, Any]] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Any]:
+        """
+        Ids que coinciden con el término, ordenados por relevancia:
+        1. algún campo empieza con la búsqueda
+        2. todas las palabras son inicio de palabra
+        3. todas las palabras aparecen como subcadena
+        4. parecidos (errores de tipeo), por trigramas compartidos
+
+        filtros: igualdad exacta sobre las columnas de filtro (None = sin filtro)
+        """
+        consulta = normalizar(termino)
+        if not consulta:
+            return []
+        palabras = consulta.split()
+        tris_consulta = trigramas(consulta, prefijo_final=True)
+        necesarios = skip + limit
+        self.busquedas += 1
+
+        with self._lock:
+            textos = self._textos
+            vacio: Set[int] = set()
+
+            # Documentos que cumplen los filtros (None = todos)
+            permitidos = None
+            for campo, valor in (filtros or {}).items():
+                if valor is None:
+                    continue
+                conjunto = self._por_filtro.get((campo, valor), vacio)
+                permitidos = conjunto if permitidos is None else permitidos & conjunto
+
+            resultado: List[int] = []
+            vistos: Set[int] = set()
+
+            def tomar(candidatos: Set[int], verificar) -> bool:
+                """Agrega candidatos en orden de ordinal; True al completar"""
+                if permitidos is not None:
+                    candidatos = candidatos & permitidos
+                if vistos:
+                    candidatos = candidatos - vistos
+                # Con muchos candidatos basta ordenar los primeros
+                faltan = necesarios - len(resultado)
+                primeros = heapq.nsmallest(faltan * 2, candidatos) \
+                    if len(candidatos) > faltan * 8 else sorted(candidatos)
+                for grupo in (primeros, None):
+                    if grupo is None:
+                        if len(primeros) == len(candidatos):
+                            break
+                        grupo = sorted(candidatos - set(primeros))
+                    for ordinal in grupo:
+                        if verificar(textos[ordinal]):
+                            resultado.append(ordinal)
+                            vistos.add(ordinal)
+                            if len(resultado) >= necesarios:
+                                return True
+                return False
+
+            def interseccion(tris: Iterable[str]) -> Set[int]:
+                listas = sorted((self._postings.get(tri, vacio) for tri in tris), key=len)
+                if not listas or not listas[0]:
+                    return vacio
+                if len(listas) == 1:
+                    return listas[0]
+                return listas[0].intersection(*listas[1:])
+
+            unidos = lambda t: " " + " ".join(t)
+            completo = False
+            con_prefijos = interseccion(tris_consulta)
+
+            # 1) Inicio de campo
+            if con_prefijos:
+                inicios = self._inicios.get(consulta[:3], vacio)
+                completo = tomar(
+                    con_prefijos & inicios,
+                    lambda t: any(texto.startswith(consulta) for texto in t)
+                )
+
+            # 2) Inicio de palabra
+            if not completo and con_prefijos:
+                completo = tomar(
+                    con_prefijos,
+                    lambda t: all(" " + palabra in unidos(t) for palabra in palabras)
+                )
+
+            # 3) Subcadena: solo trigramas interiores (sin relleno inicial)
+            interiores = [tri for tri in tris_consulta if not tri.startswith(" ")]
+            if not completo and interiores:
+                completo = tomar(
+                    interseccion(interiores),
+                    lambda t: all(palabra in unidos(t) for palabra in palabras)
+                )
+
+            # 4) Parecidos (solo si no hubo coincidencias): fracción de
+            # trigramas de la búsqueda presentes en el documento
+            if not resultado:
+                listas = sorted((self._postings.get(tri, vacio) for tri in tris_consulta), key=len)
+                total = len(listas)
+                minimo = max(1, int(total * INDICE_SIMILITUD_MIN + 0.999))
+                # Quien comparta `minimo` trigramas tiene al menos uno de los
+                # (total - minimo + 1) más raros: solo esos son candidatos
+                candidatos = set().union(*listas[:total - minimo + 1])
+                conteo = Counter()
+                for ids in listas:
+                    conteo.update(ids & candidatos if len(ids) > len(candidatos) else ids)
+                # Clave entera: menos trigramas faltantes primero, luego ordinal
+                claves = sorted(
+                    ((total - compartidos) << 32) | ordinal
+                    for ordinal, compartidos in conteo.items()
+                    if compartidos >= minimo and ordinal not in vistos
+                    and (permitidos is None or ordinal in permitidos)
+                )
+                resultado.extend(clave & 0xFFFFFFFF for clave in claves[:necesarios - len(resultado)])
+
+            return [self._id_por_ordinal[ordinal] for ordinal in resultado[skip:necesarios]]
+
+    def resumen(self) -> dict:
+        with self._lock:
+            return {
+                "listo": self.listo,
+                "documentos": len(self._textos),
+                "trigramas": len(self._postings),
+                "entradas": sum(len(ids) for ids in self._postings.values()),
+                "construido_en": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.construido_en))
+                if self.construido_en else None,
+                "tiempo_construccion_ms": self.tiempo_construccion_ms,
+                "busquedas": self.busquedas,
+                "refrescados": self.refrescados,
+            }
+
+
+# =============================================
+# ÍNDICES REGISTRADOS
+# =============================================
+
+productos = IndiceTrigramas(
+    models.Producto, "IdProducto",
+    campos=["NombreProducto", "CodigoBarras"],
+    filtros=["Activo", "IdCategoria"],
+)
+
+proveedores = IndiceTrigramas(
+    models.Proveedor, "IdProveedor",
+    campos=["NombreProveedor", "RUC", "ContactoPrincipal", "Email"],
+    filtros=["Activo"],
+)
+
+INDICES: Dict[Any, IndiceTrigramas] = {
+    indice.model: indice for indice in (productos, proveedores)
+}
+
+
+def indice_para(model, campos: Iterable[str], filtros: Optional[Dict[str, Any]] = None) -> Optional[IndiceTrigramas]:
+    """
+    Índice listo que cubre esos campos y filtros, o None (usar LIKE)
+    """
+    indice = INDICES.get(model)
+    if indice is not None and indice.cubre(campos, filtros):
+        return indice
+    return None
+
+
+def ordenar_por_ids(registros: Iterable, ids: List[int], id_field: str) -> list:
+    """
+    Reordena las filas traídas con IN (...) según el ranking del índice
+    """
+    por_id = {getattr(r, id_field): r for r in registros}
+    return [por_id[i] for i in ids if i in por_id]
+
+# =============================================
+# ACTUALIZACIÓN INCREMENTAL
+# =============================================
+
+def _al_hacer_flush(session, flush_context) -> None:
+    """
+    Toma una foto de los documentos indexados que cambiaron en el flush
+    Se aplica al índice solo si la transacción se confirma
+    """
+    pendientes = None
+    for obj in session.new | session.dirty:
+        indice = INDICES.get(type(obj))
+        if indice is not None:
+            pendientes = pendientes if pendientes is not None else session.info.setdefault("indice_busqueda", [])
+            pendientes.append((indice, getattr(obj, indice.id_field), indice.valores(obj)))
+    for obj in session.deleted:
+        indice = INDICES.get(type(obj))
+        if indice is not None:
+            pendientes = pendientes if pendientes is not None else session.info.setdefault("indice_busqueda", [])
+            pendientes.append((indice, getattr(obj, indice.id_field), None))
+
+
+def _al_confirmar(session) -> None:
+    for indice, id_doc, valores in session.info.pop("indice_busqueda", ()):
+        indice.actualizar(id_doc, valores)
+
+
+def _al_revertir(session) -> None:
+    session.info.pop("indice_busqueda", None)
+
+
+def registrar_cambios(instancias: Iterable) -> None:
+    """
+    Indexa instancias creadas fuera del flush del ORM (ej: crud.insertar_en_bloque)
+    Llamar después del commit
+    """
+    for obj in instancias:
+        indice = INDICES.get(type(obj))
+        if indice is not None:
+            indice.actualizar(getattr(obj, indice.id_field), indice.valores(obj))
+
+
+event.listen(Session, "after_flush", _al_hacer_flush)
+event.listen(Session, "after_commit", _al_confirmar)
+event.listen(Session, "after_rollback", _al_revertir)
+
+# =============================================
+# CONSTRUCCIÓN EN SEGUNDO PLANO
+# =============================================
+
+class ConstructorIndices:
+    """
+    Construye los índices al arrancar, lee los cambios de otros workers cada
+    refresco_seg y, si intervalo_seg > 0, los reconstruye completos
+    """
+
+    def __init__(
+        self,
+        intervalo_seg: float = INDICE_BUSQUEDA_RECONSTRUIR_SEG,
+        refresco_seg: float = INDICE_BUSQUEDA_REFRESCO_SEG
+    ):
+        self.intervalo_seg = intervalo_seg
+        self.refresco_seg = refresco_seg
+        self.errores: List[str] = []
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def construir_todos(self) -> None:
+        for indice in INDICES.values():
+            try:
+                indice.construir_desde_bd()
+            except Exception as e:
+                self.errores.append(f"{indice.nombre}: {e}")
+                del self.errores[:-20]
+
+    def refrescar_todos(self) -> None:
+        for indice in INDICES.values():
+            try:
+                indice.refrescar_desde_bd()
+            except Exception as e:
+                self.errores.append(f"{indice.nombre} (refresco): {e}")
+                del self.errores[:-20]
+
+    def _ejecutar(self) -> None:
+        self.construir_todos()
+        construido = time.monotonic()
+        espera = self.refresco_seg if self.refresco_seg > 0 else self.intervalo_seg
+        if espera <= 0:
+            return
+        while not self._detener.wait(espera):
+            if self.intervalo_seg > 0 and time.monotonic() - construido >= self.intervalo_seg:
+                self.construir_todos()
+                construido = time.monotonic()
+            elif self.refresco_seg > 0:
+                self.refrescar_todos()
+
+    def iniciar(self) -> None:
+        if self._hilo is None:
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._ejecutar, name="indice-busqueda", daemon=True)
+            self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+        self._hilo = None
+
+
+constructor = ConstructorIndices()
@@ -0,0 +1,294 @@
+"""
+Movimientos de stock atómicos
+El stock se modifica con un UPDATE condicional en la base de datos en lugar
+de leerlo, cambiarlo en Python y guardarlo: dos cajas vendiendo el mismo
+producto a la vez ya no pierden actualizaciones, y no se toman bloqueos
+pesimistas (SELECT ... FOR UPDATE / UPDLOCK) que serializarían los
+productos más vendidos
+
+- ENTRADA: StockActual = StockActual + n
+- SALIDA:  StockActual = StockActual - n  solo si StockActual >= n
+- AJUSTE:  compare-and-set contra el valor leído (reintenta si cambió)
+
+El movimiento se inserta en la misma transacción que el UPDATE; los
+resúmenes de tendencias lo incorporan después, fuera de la venta
+(resumen_movimientos.actualizador)
+
+Los ajustes masivos (mover_stock_bulk) leen el stock de todos los productos,
+simulan las líneas en orden y aplican el resultado con un UPDATE ... CASE
+por lote, condicionado a que el stock no haya cambiado desde la lectura
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.utils.helpers import dividir_lista
+
+# Reintentos de un AJUSTE cuando otro movimiento cambia el stock entre
+# la lectura y el compare-and-set
+AJUSTE_REINTENTOS = 10
+
+# Productos por UPDATE ... CASE: cada uno usa 5 parámetros y SQL Server
+# admite hasta 2100 por sentencia
+TAMANO_LOTE_BULK = 400
+
+Producto = models.Producto
+
+
+def sentencia_incremento(id_producto: int, delta: int):
+    """
+    UPDATE ... SET StockActual = StockActual + delta RETURNING StockActual
+    Si delta es negativo solo afecta la fila cuando alcanza el stock
+    """
+    condiciones = [Producto.IdProducto == id_producto]
+    if delta < 0:
+        condiciones.append(Producto.StockActual >= -delta)
+    return (
+        update(Producto)
+        .where(*condiciones)
+        .values(StockActual=Producto.StockActual + delta)
+        .returning(Producto.StockActual, Producto.CodigoBarras)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def sentencia_compare_and_set(id_producto: int, esperado: int, nuevo: int):
+    """
+    UPDATE ... SET StockActual = nuevo WHERE StockActual = esperado
+    """
+    return (
+        update(Producto)
+        .where(Producto.IdProducto == id_producto, Producto.StockActual == esperado)
+        .values(StockActual=nuevo)
+        .returning(Producto.StockActual, Producto.CodigoBarras)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _stock_actual(db: AsyncSession, id_producto: int) -> Optional[int]:
+    return await db.scalar(select(Producto.StockActual).where(Producto.IdProducto == id_producto))
+
+
+async def mover_stock(
+    db: AsyncSession,
+    id_producto: int,
+    tipo_movimiento: str,
+    cantidad: int,
+    id_usuario: int,
+    motivo: Optional[str] = None,
+    referencia: Optional[str] = None,
+    commit: bool = True
+) -> dict:
+    """
+    Aplica un movimiento de stock y lo registra en MovimientosInventario
+    Retorna stock_anterior, stock_nuevo y CodigoBarras (para invalidar cachés)
+
+    Errores: 404 si el producto no existe, 400 si el stock no alcanza,
+    409 si un AJUSTE no logra aplicarse por contención
+    """
+    if tipo_movimiento in ("ENTRADA", "SALIDA"):
+        delta = cantidad if tipo_movimiento == "ENTRADA" else -cantidad
+        fila = (await db.execute(sentencia_incremento(id_producto, delta))).first()
+        if fila is None:
+            await db.rollback()
+            if await _stock_actual(db, id_producto) is None:
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            raise HTTPException(status_code=400, detail="Stock insuficiente")
+        stock_nuevo, codigo = fila
+        stock_anterior = stock_nuevo - delta
+
+    elif tipo_movimiento == "AJUSTE":
+        for _ in range(AJUSTE_REINTENTOS):
+            stock_anterior = await _stock_actual(db, id_producto)
+            if stock_anterior is None:
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            fila = (await db.execute(
+                sentencia_compare_and_set(id_producto, stock_anterior, cantidad)
+            )).first()
+            if fila is not None:
+                stock_nuevo, codigo = fila
+                break
+        else:
+            await db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="El stock cambió durante el ajuste, intente nuevamente"
+            )
+
+    else:
+        raise HTTPException(status_code=400, detail=f"Tipo de movimiento inválido: {tipo_movimiento}")
+
+    db.add(models.MovimientoInventario(
+        IdProducto=id_producto,
+        TipoMovimiento=tipo_movimiento,
+        Cantidad=cantidad,
+        StockAnterior=stock_anterior,
+        StockNuevo=stock_nuevo,
+        Motivo=motivo,
+        IdUsuario=id_usuario,
+        Referencia=referencia
+    ))
+    if commit:
+        await db.commit()
+
+    return {
+        "stock_anterior": stock_anterior,
+        "stock_nuevo": stock_nuevo,
+        "CodigoBarras": codigo,
+    }
+
+
+# =============================================
+# AJUSTES MASIVOS
+# =============================================
+
+def sentencia_compare_and_set_lote(planes: Dict[int, Tuple[int, int]]):
+    """
+    Un solo UPDATE para varios productos: planes = {IdProducto: (esperado, nuevo)}
+    Solo se modifican (y retornan) los productos cuyo stock sigue siendo el esperado
+    """
+    ids = list(planes)
+    return (
+        update(Producto)
+        .where(
+            Producto.IdProducto.in_(ids),
+            Producto.StockActual == case(
+                {id_producto: esperado for id_producto, (esperado, _) in planes.items()},
+                value=Producto.IdProducto
+            )
+        )
+        .values(StockActual=case(
+            {id_producto: nuevo for id_producto, (_, nuevo) in planes.items()},
+            value=Producto.IdProducto
+        ))
+        .returning(Producto.IdProducto, Producto.CodigoBarras)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def simular_linea(stock: int, tipo_movimiento: str, cantidad: int) -> Optional[int]:
+    """
+    Stock resultante de aplicar una línea, o None si el stock no alcanza
+    """
+    if tipo_movimiento == "ENTRADA":
+        return stock + cantidad
+    if tipo_movimiento == "SALIDA":
+        return stock - cantidad if stock >= cantidad else None
+    return cantidad
+
+
+async def mover_stock_bulk(
+    db: AsyncSession,
+    ajustes: Sequence,
+    todo_o_nada: bool = False
+) -> Tuple[List[dict], Dict[int, str]]:
+    """
+    Aplica muchas líneas de ajuste (con id_producto y los campos de
+    AjusteStock) en una sola transacción
+
+    Las líneas de un mismo producto se aplican en el orden recibido; una
+    línea rechazada (producto inexistente, stock insuficiente) no afecta
+    a las demás, salvo con todo_o_nada
+    Retorna (resultado por línea, {IdProducto: CodigoBarras} de los productos modificados)
+    """
+    resultados: List[dict] = [
+        {"linea": i, "id_producto": ajuste.id_producto, "aplicado": False}
+        for i, ajuste in enumerate(ajustes)
+    ]
+    lineas_por_producto: Dict[int, List[int]] = defaultdict(list)
+    for i, ajuste in enumerate(ajustes):
+        lineas_por_producto[ajuste.id_producto].append(i)
+
+    pendientes = set(lineas_por_producto)
+    codigos: Dict[int, str] = {}
+
+    for _ in range(AJUSTE_REINTENTOS):
+        if not pendientes:
+            break
+
+        leidos: Dict[int, int] = {}
+        for lote in dividir_lista(sorted(pendientes), 2000):
+            leidos.update((await db.execute(
+                select(Producto.IdProducto, Producto.StockActual).where(Producto.IdProducto.in_(lote))
+            )).all())
+
+        planes: Dict[int, Tuple[int, int]] = {}
+        for id_producto in sorted(pendientes):
+            if id_producto not in leidos:
+                for i in lineas_por_producto[id_producto]:
+                    resultados[i].update(aplicado=False, error="Producto no encontrado")
+                pendientes.discard(id_producto)
+                continue
+
+            stock = leidos[id_producto]
+            hay_aplicadas = False
+            for i in lineas_por_producto[id_producto]:
+                ajuste = ajustes[i]
+                nuevo = simular_linea(stock, ajuste.tipo_movimiento, ajuste.cantidad)
+                if nuevo is None:
+                    resultados[i].update(
+                        aplicado=False, stock_anterior=None, stock_nuevo=None, error="Stock insuficiente"
+                    )
+                    continue
+                resultados[i].update(aplicado=True, stock_anterior=stock, stock_nuevo=nuevo, error=None)
+                stock = nuevo
+                hay_aplicadas = True
+
+            if hay_aplicadas:
+                planes[id_producto] = (leidos[id_producto], stock)
+            else:
+                pendientes.discard(id_producto)
+
+        if todo_o_nada and any(resultado.get("error") for resultado in resultados):
+            await db.rollback()
+            return _anular(resultados, "No aplicado: otras líneas fallaron"), {}
+
+        # Compare-and-set por lote: los productos que cambiaron desde la
+        # lectura quedan pendientes y se reintentan
+        for lote in dividir_lista(list(planes), TAMANO_LOTE_BULK):
+            filas = (await db.execute(
+                sentencia_compare_and_set_lote({id_producto: planes[id_producto] for id_producto in lote})
+            )).all()
+            for id_producto, codigo in filas:
+                codigos[id_producto] = codigo
+                pendientes.discard(id_producto)
+
+    if pendientes:
+        if todo_o_nada:
+            await db.rollback()
+            return _anular(resultados, "No aplicado: el stock cambió durante el ajuste"), {}
+        for id_producto in pendientes:
+            for i in lineas_por_producto[id_producto]:
+                resultados[i].update(
+                    aplicado=False, stock_anterior=None, stock_nuevo=None,
+                    error="El stock cambió durante el ajuste, intente nuevamente"
+                )
+
+    movimientos = [
+        {
+            "IdProducto": ajuste.id_producto,
+            "TipoMovimiento": ajuste.tipo_movimiento,
+            "Cantidad": ajuste.cantidad,
+            "StockAnterior": resultado["stock_anterior"],
+            "StockNuevo": resultado["stock_nuevo"],
+            "Motivo": ajuste.motivo,
+            "IdUsuario": ajuste.id_usuario,
+            "Referencia": ajuste.referencia,
+        }
+        for ajuste, resultado in zip(ajustes, resultados)
+        if resultado["aplicado"]
+    ]
+    if movimientos:
+        await db.execute(insert(models.MovimientoInventario), movimientos)
+    await db.commit()
+
+    return resultados, codigos
+
+
+def _anular(resultados: List[dict], motivo: str) -> List[dict]:
+    for resultado in resultados:
+        if resultado.get("aplicado"):
+            resultado.update(aplicado=False, stock_anterior=None, stock_nuevo=None, error=motivo)
+    return resultados
@@ -0,0 +1,333 @@
+"""
+Telemetría del pool de conexiones y ajuste automático de su capacidad
+Registra espera de checkout, tiempo de retención, uso de overflow y
+fallos de pre-ping en histogramas consultables desde /api/interno/pool
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Límites superiores de los buckets (milisegundos)
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Límites para conteos de conexiones (en uso / overflow)
+BUCKETS_CONEXIONES = [0, 1, 2, 3, 5, 8, 10, 15, 20, 30, 40, 60, 80, 100]
+
+# =============================================
+# HISTOGRAMA
+# =============================================
+
+class Histograma:
+    """
+    Histograma de buckets fijos, seguro entre hilos
+    Los percentiles se aproximan con el límite superior del bucket
+    """
+
+    def __init__(self, limites: List[float] = BUCKETS_MS):
+        self.limites = list(limites)
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self.conteos = [0] * (len(self.limites) + 1)
+            self.total = 0
+            self.suma = 0.0
+            self.minimo: Optional[float] = None
+            self.maximo: Optional[float] = None
+
+    def registrar(self, valor: float) -> None:
+        indice = bisect_left(self.limites, valor)
+        with self._lock:
+            self.conteos[indice] += 1
+            self.total += 1
+            self.suma += valor
+            if self.minimo is None or valor < self.minimo:
+                self.minimo = valor
+            if self.maximo is None or valor > self.maximo:
+                self.maximo = valor
+
+    def percentil(self, p: float) -> Optional[float]:
+        """
+        Percentil aproximado (p entre 0 y 100)
+        """
+        with self._lock:
+            if not self.total:
+                return None
+            objetivo = self.total * p / 100
+            acumulado = 0
+            for i, conteo in enumerate(self.conteos):
+                acumulado += conteo
+                if acumulado >= objetivo:
+                    return self.limites[i] if i < len(self.limites) else self.maximo
+            return self.maximo
+
+    def resumen(self) -> dict:
+        return {
+            "total": self.total,
+            "promedio": round(self.suma / self.total, 3) if self.total else None,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "p50": self.percentil(50),
+            "p95": self.percentil(95),
+            "p99": self.percentil(99),
+            "buckets": {
+                (f"<={limite}" if i < len(self.limites) else "+Inf"): conteo
+                for i, (limite, conteo) in enumerate(
+                    zip(self.limites + [None], self.conteos)
+                )
+            },
+        }
+
+
+# =============================================
+# MÉTRICAS POR ENGINE
+# =============================================
+
+class MetricasPool:
+    """
+    Métricas acumuladas de un pool de conexiones
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.pool = None
+        self.espera_checkout = Histograma()
+        self.retencion = Histograma()
+        self.en_uso = Histograma(BUCKETS_CONEXIONES)
+        self.overflow = Histograma(BUCKETS_CONEXIONES)
+
+        # Ventanas que el controlador reinicia en cada ciclo
+        self.ventana_espera = Histograma()
+        self.ventana_en_uso = Histograma(BUCKETS_CONEXIONES)
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.conexiones_creadas = 0
+        self.invalidaciones = 0
+        self.fallos_pre_ping = 0
+
+    def registrar_espera(self, ms: float) -> None:
+        self.espera_checkout.registrar(ms)
+        self.ventana_espera.registrar(ms)
+
+    def registrar_uso(self, en_uso: int, overflow: int) -> None:
+        self.checkouts += 1
+        self.en_uso.registrar(en_uso)
+        self.ventana_en_uso.registrar(en_uso)
+        self.overflow.registrar(max(overflow, 0))
+
+    def estado_pool(self) -> dict:
+        if self.pool is None or not isinstance(self.pool, QueuePool):
+            return {}
+        return {
+            "pool_size": self.pool.size(),
+            "max_overflow": self.pool._max_overflow,
+            "en_reposo": self.pool.checkedin(),
+            "en_uso": self.pool.checkedout(),
+            "overflow": max(self.pool.overflow(), 0),
+        }
+
+    def resumen(self) -> dict:
+        p95_en_uso = self.en_uso.percentil(95)
+        return {
+            "pool": self.estado_pool(),
+            "espera_checkout_ms": self.espera_checkout.resumen(),
+            "retencion_ms": self.retencion.resumen(),
+            "conexiones_en_uso": self.en_uso.resumen(),
+            "overflow": self.overflow.resumen(),
+            "contadores": {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "conexiones_creadas": self.conexiones_creadas,
+                "invalidaciones": self.invalidaciones,
+                "fallos_pre_ping": self.fallos_pre_ping,
+            },
+            # pool_size sugerido: concurrencia p95 observada
+            "pool_size_recomendado": int(p95_en_uso) if p95_en_uso is not None else None,
+        }
+
+
+# Métricas registradas por nombre de engine
+REGISTRO: Dict[str, MetricasPool] = {}
+
+# =============================================
+# POOLS INSTRUMENTADOS
+# =============================================
+
+class _MedicionEspera:
+    """
+    Mixin para QueuePool: mide la espera de checkout y permite
+    ajustar max_overflow en caliente
+    """
+    metricas: Optional[MetricasPool] = None
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.metricas is not None:
+                self.metricas.timeouts += 1
+            raise
+        finally:
+            if self.metricas is not None:
+                self.metricas.registrar_espera((time.perf_counter() - inicio) * 1000)
+
+    def recreate(self):
+        nuevo = super().recreate()
+        nuevo.metricas = self.metricas
+        if self.metricas is not None:
+            self.metricas.pool = nuevo
+        return nuevo
+
+    def ajustar_overflow(self, max_overflow: int) -> None:
+        """
+        Cambia la capacidad adicional del pool sin recrearlo
+        Las conexiones de overflow sobrantes se cierran al devolverse
+        """
+        with self._overflow_lock:
+            self._max_overflow = max_overflow
+
+
+class QueuePoolMedido(_MedicionEspera, QueuePool):
+    pass
+
+
+class AsyncQueuePoolMedido(_MedicionEspera, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrumentar(engine, nombre: str) -> MetricasPool:
+    """
+    Registra los listeners de pool y de errores sobre un engine síncrono
+    (para un AsyncEngine usar async_engine.sync_engine)
+    """
+    metricas = MetricasPool(nombre)
+    metricas.pool = engine.pool
+    if isinstance(engine.pool, _MedicionEspera):
+        engine.pool.metricas = metricas
+
+    @event.listens_for(engine, "connect")
+    def al_conectar(dbapi_conn, connection_record):
+        metricas.conexiones_creadas += 1
+
+    @event.listens_for(engine, "checkout")
+    def al_checkout(dbapi_conn, connection_record, connection_proxy):
+        connection_record.info["checkout_en"] = time.perf_counter()
+        pool = metricas.pool
+        if isinstance(pool, QueuePool):
+            metricas.registrar_uso(pool.checkedout(), pool.overflow())
+
+    @event.listens_for(engine, "checkin")
+    def al_checkin(dbapi_conn, connection_record):
+        inicio = connection_record.info.pop("checkout_en", None)
+        if inicio is not None:
+            metricas.retencion.registrar((time.perf_counter() - inicio) * 1000)
+
+    @event.listens_for(engine, "invalidate")
+    def al_invalidar(dbapi_conn, connection_record, exception):
+        metricas.invalidaciones += 1
+
+    @event.listens_for(engine, "handle_error")
+    def al_error(context):
+        if getattr(context, "is_pre_ping", False):
+            metricas.fallos_pre_ping += 1
+
+    REGISTRO[nombre] = metricas
+    return metricas
+
+
+# =============================================
+# CONTROLADOR DE CAPACIDAD
+# =============================================
+
+class ControladorPool:
+    """
+    Ajusta max_overflow de los pools según el p95 de espera de checkout
+    observado en cada intervalo
+
+    - Si el p95 supera el objetivo, amplía la capacidad
+    - Si no hubo espera y el uso p95 quedó holgado, la reduce
+    """
+
+    def __init__(
+        self,
+        objetivo_ms: float = float(os.getenv("POOL_ESPERA_OBJETIVO_MS", 5)),
+        intervalo_seg: float = float(os.getenv("POOL_AJUSTE_INTERVALO_SEG", 30)),
+        overflow_minimo: int = int(os.getenv("POOL_OVERFLOW_MIN", 5)),
+        overflow_maximo: int = int(os.getenv("POOL_OVERFLOW_MAX", 60)),
+        paso: int = int(os.getenv("POOL_AJUSTE_PASO", 5)),
+    ):
+        self.objetivo_ms = objetivo_ms
+        self.intervalo_seg = intervalo_seg
+        self.overflow_minimo = overflow_minimo
+        self.overflow_maximo = overflow_maximo
+        self.paso = paso
+        self.ajustes: List[dict] = []
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def evaluar(self, metricas: MetricasPool) -> Optional[int]:
+        """
+        Evalúa la ventana actual de un pool y aplica el ajuste
+        Retorna el nuevo max_overflow o None si no hubo cambios
+        """
+        pool = metricas.pool
+        if not isinstance(pool, _MedicionEspera):
+            return None
+
+        p95_espera = metricas.ventana_espera.percentil(95)
+        p95_uso = metricas.ventana_en_uso.percentil(95)
+        metricas.ventana_espera.reiniciar()
+        metricas.ventana_en_uso.reiniciar()
+
+        if p95_espera is None:
+            return None
+
+        actual = pool._max_overflow
+        nuevo = actual
+        if p95_espera > self.objetivo_ms:
+            nuevo = min(actual + self.paso, self.overflow_maximo)
+        elif p95_espera <= self.objetivo_ms / 10 and p95_uso is not None \
+                and p95_uso < (pool.size() + actual) / 2:
+            nuevo = max(actual - self.paso, self.overflow_minimo)
+
+        if nuevo == actual:
+            return None
+
+        pool.ajustar_overflow(nuevo)
+        self.ajustes.append({
+            "engine": metricas.nombre,
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "p95_espera_ms": p95_espera,
+            "max_overflow_anterior": actual,
+            "max_overflow_nuevo": nuevo,
+        })
+        del self.ajustes[:-50]
+        return nuevo
+
+    def _ejecutar(self) -> None:
+        while not self._detener.wait(self.intervalo_seg):
+            for metricas in list(REGISTRO.values()):
+                self.evaluar(metricas)
+
+    def iniciar(self) -> None:
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ejecutar, name="controlador-pool", daemon=True)
+            self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+        self._hilo = None
+
+
+controlador = ControladorPool()
+
+
+def autoajuste_habilitado() -> bool:
+    return os.getenv("POOL_AUTOAJUSTE", "false").lower() in ("1", "true", "si", "sí")
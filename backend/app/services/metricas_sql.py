@@ -0,0 +1,346 @@
+"""
+Contabilidad de sentencias SQL por petición y log de consultas lentas
+Atribuye número de sentencias y tiempo en base de datos (y, con
+CONTAR_FILAS_SQL, filas leídas por el ORM) a la ruta que atiende la
+petición y lo devuelve en el header Server-Timing
+
+Incluye un detector de N+1 (DETECTAR_N_MAS_1=log|error) que marca la
+misma sentencia o carga lazy de una relación repetida dentro de una petición
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("jey2.sql")
+
+# Umbral para registrar una sentencia como lenta (milisegundos)
+SQL_LENTO_MS = float(os.getenv("SQL_LENTO_MS", 250))
+
+# Detector de N+1: "off" (por defecto), "log" o "error"
+DETECTAR_N_MAS_1 = os.getenv("DETECTAR_N_MAS_1", "off").lower()
+
+# Repeticiones de una misma sentencia a partir de las cuales se considera N+1
+N_MAS_1_UMBRAL = int(os.getenv("N_MAS_1_UMBRAL", 5))
+
+# Contar las filas de los SELECT del ORM (diagnóstico): obliga a materializar
+# una copia de cada resultado, por eso está desactivado por defecto. El
+# rowcount del cursor no sirve: los drivers reportan -1 en los SELECT
+CONTAR_FILAS_SQL = os.getenv("CONTAR_FILAS_SQL", "false").lower() in ("1", "true", "si", "sí")
+
+
+class ConsultasNMas1Error(Exception):
+    """
+    Se lanza en modo "error" cuando una petición ejecuta N+1 consultas
+    """
+
+    def __init__(self, ruta: str, hallazgos: List[dict]):
+        self.ruta = ruta
+        self.hallazgos = hallazgos
+        detalle = "; ".join(
+            f"{h['relacion'] or h['sentencia'][:120]} x{h['repeticiones']}" for h in hallazgos
+        )
+        super().__init__(f"N+1 detectado en '{ruta}': {detalle}")
+
+
+# =============================================
+# CONTEXTO POR PETICIÓN
+# =============================================
+
+class ConsultasRequest:
+    """
+    Acumulador de la actividad SQL de una petición
+    """
+
+    def __init__(self, scope: Optional[dict] = None, modo_n_mas_1: Optional[str] = None):
+        self.scope = scope
+        self.sentencias = 0
+        self.tiempo_db_ms = 0.0
+        self.filas = 0
+        self.modo_n_mas_1 = modo_n_mas_1 or DETECTAR_N_MAS_1
+        # Solo se llenan con el detector activo
+        self.formas: Counter = Counter()
+        self.relaciones: Counter = Counter()
+        self.relacion_por_forma: Dict[str, str] = {}
+        self._relacion_pendiente: Optional[str] = None
+
+    @property
+    def ruta(self) -> str:
+        """
+        Nombre del endpoint (el router lo agrega al scope al resolver la ruta)
+        """
+        if not self.scope:
+            return "-"
+        endpoint = self.scope.get("endpoint")
+        if endpoint is not None:
+            return endpoint.__name__
+        return self.scope.get("path", "-")
+
+    @property
+    def detector_activo(self) -> bool:
+        return self.modo_n_mas_1 in ("log", "error")
+
+
+_consultas_actuales: ContextVar[Optional[ConsultasRequest]] = ContextVar(
+    "consultas_actuales", default=None
+)
+
+
+def iniciar_request(scope: Optional[dict] = None):
+    """
+    Abre el acumulador de la petición actual
+    Retorna (acumulador, token) para cerrarlo con finalizar_request
+    """
+    consultas = ConsultasRequest(scope)
+    return consultas, _consultas_actuales.set(consultas)
+
+
+def finalizar_request(token) -> None:
+    _consultas_actuales.reset(token)
+
+
+def consultas_actuales() -> Optional[ConsultasRequest]:
+    return _consultas_actuales.get()
+
+
+# =============================================
+# ESTADÍSTICAS POR RUTA
+# =============================================
+
+_lock = threading.Lock()
+_por_ruta: Dict[str, Dict[str, float]] = {}
+_lentas = deque(maxlen=50)
+_n_mas_1 = deque(maxlen=50)
+
+
+def acumular(consultas: ConsultasRequest, tiempo_total_ms: float) -> None:
+    """
+    Suma la actividad de una petición a las estadísticas de su ruta
+    """
+    with _lock:
+        stats = _por_ruta.setdefault(consultas.ruta, {
+            "peticiones": 0,
+            "sentencias": 0,
+            "filas": 0,
+            "tiempo_db_ms": 0.0,
+            "tiempo_total_ms": 0.0,
+        })
+        stats["peticiones"] += 1
+        stats["sentencias"] += consultas.sentencias
+        stats["filas"] += consultas.filas
+        stats["tiempo_db_ms"] += consultas.tiempo_db_ms
+        stats["tiempo_total_ms"] += tiempo_total_ms
+
+
+def resumen() -> dict:
+    """
+    Estadísticas por ruta con promedios por petición
+    """
+    with _lock:
+        rutas = {}
+        for ruta, stats in sorted(_por_ruta.items(), key=lambda x: -x[1]["tiempo_db_ms"]):
+            n = stats["peticiones"]
+            rutas[ruta] = {
+                **stats,
+                "sentencias_promedio": round(stats["sentencias"] / n, 2),
+                "filas_promedio": round(stats["filas"] / n, 1),
+                "tiempo_db_promedio_ms": round(stats["tiempo_db_ms"] / n, 3),
+                "tiempo_total_promedio_ms": round(stats["tiempo_total_ms"] / n, 3),
+                # Fracción del tiempo de la petición gastado esperando a la BD
+                "fraccion_db": round(stats["tiempo_db_ms"] / stats["tiempo_total_ms"], 3)
+                if stats["tiempo_total_ms"] else None,
+            }
+        return {
+            "umbral_lento_ms": SQL_LENTO_MS,
+            "contar_filas": CONTAR_FILAS_SQL,
+            "rutas": rutas,
+            "sentencias_lentas": list(_lentas),
+            "detector_n_mas_1": {
+                "modo": DETECTAR_N_MAS_1,
+                "umbral": N_MAS_1_UMBRAL,
+                "hallazgos_recientes": list(_n_mas_1),
+            },
+        }
+
+
+def server_timing(consultas: ConsultasRequest, tiempo_total_ms: float) -> str:
+    """
+    Valor del header Server-Timing de la petición
+    """
+    descripcion = f"{consultas.sentencias} sentencias"
+    if CONTAR_FILAS_SQL:
+        descripcion += f", {consultas.filas} filas"
+    return f'db;dur={consultas.tiempo_db_ms:.2f};desc="{descripcion}", app;dur={tiempo_total_ms:.2f}'
+
+
+# =============================================
+# DETECTOR DE N+1
+# =============================================
+
+def hallazgos_n_mas_1(consultas: ConsultasRequest) -> List[dict]:
+    """
+    Sentencias repetidas al menos N_MAS_1_UMBRAL veces en la petición,
+    con la relación lazy que las originó cuando se conoce
+    """
+    hallazgos = [
+        {
+            "sentencia": forma,
+            "repeticiones": veces,
+            "relacion": consultas.relacion_por_forma.get(forma),
+        }
+        for forma, veces in consultas.formas.items()
+        if veces >= N_MAS_1_UMBRAL
+    ]
+    return sorted(hallazgos, key=lambda h: -h["repeticiones"])
+
+
+def verificar_n_mas_1(consultas: ConsultasRequest) -> List[dict]:
+    """
+    Revisa la petición al finalizar: registra los hallazgos en el log
+    y, en modo "error", lanza ConsultasNMas1Error
+    """
+    if not consultas.detector_activo:
+        return []
+
+    hallazgos = hallazgos_n_mas_1(consultas)
+    if not hallazgos:
+        return []
+
+    for h in hallazgos:
+        logger.error(
+            "N+1 DETECTADO en [%s]: %s ejecutada %d veces | %s",
+            consultas.ruta, h["relacion"] or "sentencia", h["repeticiones"], h["sentencia"][:300]
+        )
+        _n_mas_1.append({"ruta": consultas.ruta, **h, "sentencia": h["sentencia"][:1000]})
+
+    if consultas.modo_n_mas_1 == "error":
+        raise ConsultasNMas1Error(consultas.ruta, hallazgos)
+    return hallazgos
+
+
+@contextmanager
+def vigilar_consultas(nombre: str = "bloque", modo: str = "error"):
+    """
+    Aplica el detector de N+1 a un bloque de código (útil en pruebas y CI)
+    
+    Example:
+        with vigilar_consultas("listar_ventas") as consultas:
+            for venta in db.scalars(select(Venta)):
+                venta.detalles
+        # -> ConsultasNMas1Error: N+1 detectado en 'listar_ventas': Venta.detalles x100
+    """
+    consultas = ConsultasRequest({"path": nombre}, modo_n_mas_1=modo)
+    token = _consultas_actuales.set(consultas)
+    try:
+        yield consultas
+    finally:
+        _consultas_actuales.reset(token)
+    verificar_n_mas_1(consultas)
+
+
+# =============================================
+# INSTRUMENTACIÓN
+# =============================================
+
+def forma_parametros(parametros: Any) -> Any:
+    """
+    Describe la forma de los parámetros sin exponer sus valores
+    Ejemplo: {'CodigoBarras': 'str(13)', 'Activo': 'int'}
+    """
+    def forma(valor):
+        if isinstance(valor, (str, bytes)):
+            return f"{type(valor).__name__}({len(valor)})"
+        return type(valor).__name__
+
+    if isinstance(parametros, dict):
+        return {clave: forma(valor) for clave, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        if parametros and isinstance(parametros[0], (dict, list, tuple)):
+            # executemany: cantidad de filas y forma de la primera
+            return {"filas": len(parametros), "primera": forma_parametros(parametros[0])}
+        return [forma(valor) for valor in parametros]
+    return forma(parametros)
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    context._inicio_sql = time.perf_counter()
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, "_inicio_sql", None)
+    if inicio is None:
+        return
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+
+    consultas = _consultas_actuales.get()
+    if consultas is not None:
+        consultas.sentencias += 1
+        consultas.tiempo_db_ms += duracion_ms
+        
+        if consultas.detector_activo:
+            consultas.formas[statement] += 1
+            if consultas._relacion_pendiente:
+                consultas.relacion_por_forma[statement] = consultas._relacion_pendiente
+                consultas._relacion_pendiente = None
+
+    if duracion_ms >= SQL_LENTO_MS:
+        ruta = consultas.ruta if consultas is not None else "-"
+        forma = forma_parametros(parameters)
+        logger.warning(
+            "SQL lento %.1f ms [%s] %s | parámetros: %s",
+            duracion_ms, ruta, " ".join(statement.split()), forma
+        )
+        _lentas.append({
+            "ruta": ruta,
+            "duracion_ms": round(duracion_ms, 2),
+            "sentencia": " ".join(statement.split())[:1000],
+            "parametros": forma,
+        })
+
+
+def _al_ejecutar_orm(orm_execute_state):
+    """
+    Con el detector activo anota la relación de las cargas lazy
+    Con CONTAR_FILAS_SQL materializa el resultado de los SELECT del ORM
+    para contar las filas enviadas a Python (no aplica a streaming)
+    """
+    consultas = _consultas_actuales.get()
+    if consultas is None or not orm_execute_state.is_select:
+        return None
+    
+    if consultas.detector_activo and orm_execute_state.is_relationship_load:
+        ruta_carga = orm_execute_state.loader_strategy_path
+        if ruta_carga is not None and len(ruta_carga):
+            relacion = str(ruta_carga[-1])
+            consultas.relaciones[relacion] += 1
+            consultas._relacion_pendiente = relacion
+
+    if not CONTAR_FILAS_SQL:
+        return None
+
+    opciones = orm_execute_state.execution_options
+    if opciones.get("yield_per") or opciones.get("stream_results"):
+        return None
+
+    congelado = orm_execute_state.invoke_statement().freeze()
+    consultas.filas += len(congelado.data)
+    return congelado()
+
+
+def instrumentar(engine) -> None:
+    """
+    Registra los listeners de sentencias sobre un engine síncrono
+    (para un AsyncEngine usar async_engine.sync_engine)
+    """
+    event.listen(engine, "before_cursor_execute", _antes_de_ejecutar)
+    event.listen(engine, "after_cursor_execute", _despues_de_ejecutar)
+
+
+# Conteo de filas del ORM: aplica a todas las sesiones (también AsyncSession)
+event.listen(Session, "do_orm_execute", _al_ejecutar_orm)
@@ -0,0 +1,163 @@
+"""
+Monitor de salud en segundo plano
+Sondea la base de datos cada cierto intervalo con una conexión del pool,
+mide la latencia de ida y vuelta y la saturación de los pools que atienden
+las peticiones (async principal y réplica), y guarda el
+resultado para que /health responda sin tocar la base de datos
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+from sqlalchemy import text
+from app.database import engine
+from app.services.metricas_pool import Histograma, REGISTRO
+
+# Intervalo entre sondeos (segundos)
+SALUD_INTERVALO_SEG = float(os.getenv("SALUD_INTERVALO_SEG", 5))
+
+# Latencia de sondeo a partir de la cual el estado pasa a "degraded" (milisegundos)
+SALUD_LATENCIA_MAX_MS = float(os.getenv("SALUD_LATENCIA_MAX_MS", 200))
+
+# Fracción de conexiones ocupadas (pool_size + max_overflow) considerada saturación
+SALUD_SATURACION_MAX = float(os.getenv("SALUD_SATURACION_MAX", 0.9))
+
+# Pools que atienden las peticiones (la réplica solo si está configurada)
+POOLS_PETICIONES = ("principal_async", "replica_async")
+
+# =============================================
+# SONDEO
+# =============================================
+
+def saturacion_pool(nombre: str = "principal_async") -> Optional[dict]:
+    """
+    Conexiones en uso respecto a la capacidad total del pool
+    """
+    metricas = REGISTRO.get(nombre)
+    if metricas is None:
+        return None
+    estado = metricas.estado_pool()
+    if not estado:
+        return None
+    capacidad = estado["pool_size"] + estado["max_overflow"]
+    return {
+        **estado,
+        "saturacion": round(estado["en_uso"] / capacidad, 3) if capacidad else None,
+    }
+
+
+def saturacion_pools() -> Dict[str, dict]:
+    """
+    Saturación de cada pool de peticiones registrado
+    """
+    pools = {}
+    for nombre in POOLS_PETICIONES:
+        pool = saturacion_pool(nombre)
+        if pool is not None:
+            pools[nombre] = pool
+    return pools
+
+
+class MonitorSalud:
+    """
+    Guarda el último estado de salud medido por el hilo de sondeo
+    """
+
+    def __init__(self, engine, intervalo_seg: float = SALUD_INTERVALO_SEG):
+        self.engine = engine
+        self.intervalo_seg = intervalo_seg
+        self.latencia = Histograma()
+        self.sondeos = 0
+        self.fallos = 0
+        self.fallos_consecutivos = 0
+        self.ultimo: Optional[dict] = None
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def sondear(self) -> dict:
+        """
+        Ejecuta SELECT 1 sobre una conexión del pool y actualiza el estado
+        """
+        inicio = time.perf_counter()
+        error = None
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            error = str(e)
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+
+        self.sondeos += 1
+        if error is None:
+            self.latencia.registrar(latencia_ms)
+            self.fallos_consecutivos = 0
+        else:
+            self.fallos += 1
+            self.fallos_consecutivos += 1
+
+        pools = saturacion_pools()
+        # "pool" es el más saturado de los pools de peticiones
+        pool = max(pools.values(), key=lambda p: p["saturacion"] or 0, default=None)
+        self.ultimo = {
+            "status": self._clasificar(error, latencia_ms, pool),
+            "database": "connected" if error is None else "disconnected",
+            "latencia_ms": round(latencia_ms, 3),
+            "pool": pool,
+            "pools": pools,
+            "error": error,
+            "medido_en": time.time(),
+        }
+        return self.ultimo
+
+    @staticmethod
+    def _clasificar(error: Optional[str], latencia_ms: float, pool: Optional[dict]) -> str:
+        if error is not None:
+            return "unhealthy"
+        saturacion = (pool or {}).get("saturacion")
+        if latencia_ms > SALUD_LATENCIA_MAX_MS or (
+            saturacion is not None and saturacion >= SALUD_SATURACION_MAX
+        ):
+            return "degraded"
+        return "healthy"
+
+    def estado(self) -> dict:
+        """
+        Último estado medido, sin tocar la base de datos
+        Si el hilo dejó de sondear el estado se reporta como "unhealthy"
+        """
+        if self.ultimo is None:
+            return {"status": "starting", "database": "unknown", "antiguedad_seg": None}
+
+        antiguedad = time.time() - self.ultimo["medido_en"]
+        estado = {**self.ultimo, "antiguedad_seg": round(antiguedad, 3)}
+        if antiguedad > self.intervalo_seg * 3:
+            estado["status"] = "unhealthy"
+            estado["error"] = "Sin sondeos recientes del monitor de salud"
+        return estado
+
+    def resumen(self) -> dict:
+        return {
+            "intervalo_seg": self.intervalo_seg,
+            "sondeos": self.sondeos,
+            "fallos": self.fallos,
+            "fallos_consecutivos": self.fallos_consecutivos,
+            "latencia_ms": self.latencia.resumen(),
+        }
+
+    def _ejecutar(self) -> None:
+        self.sondear()
+        while not self._detener.wait(self.intervalo_seg):
+            self.sondear()
+
+    def iniciar(self) -> None:
+        if self._hilo is None:
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._ejecutar, name="monitor-salud", daemon=True)
+            self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+        self._hilo = None
+
+
+monitor = MonitorSalud(engine)
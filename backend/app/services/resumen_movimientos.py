@@ -0,0 +1,271 @@
+"""
+Resúmenes diarios y semanales de movimientos de inventario
+Los gráficos de tendencia leen ResumenMovimientos (una fila por producto,
+tipo y día o semana) en lugar de agregar MovimientosInventario
+
+Mantenimiento:
+- todo movimiento se inserta con Resumido = 0: la venta no toca los
+  resúmenes (sin sentencias ni bloqueos extra en la transacción del stock)
+- actualizar reclama los pendientes por lotes con UPDATE ... RETURNING y
+  los suma. No depende del orden en que se confirman los IdMovimiento y
+  dos actualizaciones simultáneas (varios workers) no cuentan dos veces
+  el mismo movimiento
+- cada worker lo ejecuta en segundo plano cada RESUMEN_INTERVALO_SEG
+  (actualizador); scripts.snapshot_stock --resumenes lo ejecuta a demanda
+"""
+import asyncio
+import os
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.database import AsyncSessionLocal
+from app.utils.helpers import dividir_lista
+
+# Periodo del query string -> valor de la columna Periodo
+PERIODOS = {"dia": "D", "semana": "S"}
+
+RESUMEN_LOTE = int(os.getenv("RESUMEN_LOTE", 5000))
+
+# Intervalo de incorporación de movimientos pendientes (segundos, 0 = solo
+# con scripts.snapshot_stock --resumenes): las tendencias se atrasan hasta esto
+RESUMEN_INTERVALO_SEG = float(os.getenv("RESUMEN_INTERVALO_SEG", 30))
+
+Movimiento = models.MovimientoInventario
+Resumen = models.ResumenMovimientos.__table__
+
+# (Periodo, FechaInicio, IdProducto, TipoMovimiento) -> [Cantidad, Movimientos]
+Totales = Dict[Tuple[str, date, int, str], List[int]]
+
+
+def inicio_periodo(dia: date, periodo: str) -> date:
+    """
+    El mismo día (D) o el lunes de su semana (S)
+    """
+    return dia if periodo == "D" else dia - timedelta(days=dia.weekday())
+
+
+def totalizar(movimientos: Iterable[Tuple[int, str, datetime, int]], totales: Optional[Totales] = None) -> Totales:
+    """
+    Agrupa (IdProducto, TipoMovimiento, FechaMovimiento, Cantidad) por fila de resumen
+    """
+    totales = totales if totales is not None else defaultdict(lambda: [0, 0])
+    for id_producto, tipo, fecha, cantidad in movimientos:
+        dia = fecha.date()
+        for periodo in PERIODOS.values():
+            total = totales[(periodo, inicio_periodo(dia, periodo), id_producto, tipo)]
+            total[0] += cantidad
+            total[1] += 1
+    return totales
+
+
+def _sentencia_suma_por_clave():
+    return (
+        update(Resumen)
+        .where(
+            Resumen.c.Periodo == bindparam("b_periodo"),
+            Resumen.c.FechaInicio == bindparam("b_fecha"),
+            Resumen.c.IdProducto == bindparam("b_producto"),
+            Resumen.c.TipoMovimiento == bindparam("b_tipo")
+        )
+        .values(
+            Cantidad=Resumen.c.Cantidad + bindparam("b_cantidad"),
+            Movimientos=Resumen.c.Movimientos + bindparam("b_movimientos")
+        )
+    )
+
+
+async def _sumar_o_insertar(db: AsyncSession, clave: Tuple[str, date, int, str], total: List[int]) -> None:
+    """
+    Una fila: UPDATE y, si no existe, INSERT. Si otra transacción la creó
+    entre ambos (llave única), se vuelve a sumar
+    """
+    periodo, fecha_inicio, id_producto, tipo = clave
+    parametros = {
+        "b_periodo": periodo, "b_fecha": fecha_inicio, "b_producto": id_producto,
+        "b_tipo": tipo, "b_cantidad": total[0], "b_movimientos": total[1],
+    }
+    if (await db.execute(_sentencia_suma_por_clave(), parametros)).rowcount == 1:
+        return
+    try:
+        async with db.begin_nested():
+            await db.execute(insert(Resumen).values(
+                Periodo=periodo, FechaInicio=fecha_inicio, IdProducto=id_producto,
+                TipoMovimiento=tipo, Cantidad=total[0], Movimientos=total[1]
+            ))
+    except IntegrityError:
+        await db.execute(_sentencia_suma_por_clave(), parametros)
+
+
+async def sumar_totales(db: AsyncSession, totales: Totales) -> None:
+    """
+    Suma los totales a las filas de resumen existentes y crea las que faltan
+    No confirma: corre en la transacción de quien llama
+    """
+    if not totales:
+        return
+    pendientes = dict(totales)
+
+    # Filas ya existentes de los periodos tocados: se les suman los totales
+    fechas = [clave[1] for clave in pendientes]
+    sumas = []
+    for lote in dividir_lista(sorted({clave[2] for clave in pendientes}), 2000):
+        existentes = await db.execute(
+            select(
+                Resumen.c.IdResumen, Resumen.c.Periodo, Resumen.c.FechaInicio,
+                Resumen.c.IdProducto, Resumen.c.TipoMovimiento
+            )
+            .where(
+                Resumen.c.IdProducto.in_(lote),
+                Resumen.c.FechaInicio.between(min(fechas), max(fechas))
+            )
+        )
+        for id_resumen, *clave in existentes.all():
+            total = pendientes.pop(tuple(clave), None)
+            if total is not None:
+                sumas.append({"b_id": id_resumen, "b_cantidad": total[0], "b_movimientos": total[1]})
+
+    if sumas:
+        await db.execute(
+            update(Resumen)
+            .where(Resumen.c.IdResumen == bindparam("b_id"))
+            .values(
+                Cantidad=Resumen.c.Cantidad + bindparam("b_cantidad"),
+                Movimientos=Resumen.c.Movimientos + bindparam("b_movimientos")
+            ),
+            sumas
+        )
+    if not pendientes:
+        return
+
+    nuevas = [
+        {
+            "Periodo": periodo,
+            "FechaInicio": fecha_inicio,
+            "IdProducto": id_producto,
+            "TipoMovimiento": tipo,
+            "Cantidad": cantidad,
+            "Movimientos": movimientos,
+        }
+        for (periodo, fecha_inicio, id_producto, tipo), (cantidad, movimientos) in pendientes.items()
+    ]
+    try:
+        async with db.begin_nested():
+            for lote in dividir_lista(nuevas, RESUMEN_LOTE):
+                await db.execute(insert(Resumen), lote)
+    except IntegrityError:
+        # Otra transacción creó alguna de las filas después de la lectura
+        for clave, total in pendientes.items():
+            await _sumar_o_insertar(db, clave, total)
+
+
+async def actualizar(db: AsyncSession) -> dict:
+    """
+    Incorpora a los resúmenes los movimientos con Resumido = 0, por lotes:
+    cada lote se marca y se suma en una transacción
+    Retorna cuántos movimientos se agregaron
+    """
+    inicio = time.perf_counter()
+    agregados = 0
+    while True:
+        ids = (await db.scalars(
+            select(Movimiento.IdMovimiento)
+            .where(Movimiento.Resumido == False)
+            .order_by(Movimiento.IdMovimiento)
+            .limit(RESUMEN_LOTE)
+        )).all()
+        if not ids:
+            break
+        # Se reclama el rango del lote; solo se suman los que este UPDATE
+        # marcó (otra actualización simultánea pudo reclamar parte)
+        reclamados = (await db.execute(
+            update(Movimiento)
+            .where(Movimiento.IdMovimiento.between(ids[0], ids[-1]), Movimiento.Resumido == False)
+            .values(Resumido=True)
+            .returning(Movimiento.IdProducto, Movimiento.TipoMovimiento, Movimiento.FechaMovimiento, Movimiento.Cantidad)
+            .execution_options(synchronize_session=False)
+        )).all()
+        await sumar_totales(db, totalizar(reclamados))
+        await db.commit()
+        agregados += len(reclamados)
+
+    return {"movimientos": agregados, "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2)}
+
+
+async def pendientes(db: AsyncSession) -> int:
+    """
+    Movimientos aún no incluidos en los resúmenes (índice filtrado)
+    """
+    return await db.scalar(select(func.count()).select_from(Movimiento).where(Movimiento.Resumido == False))
+
+
+class ActualizadorResumenes:
+    """
+    Ejecuta actualizar cada intervalo_seg como tarea del event loop (usa la
+    sesión asíncrona, cuyas conexiones pertenecen a ese loop)
+    """
+
+    def __init__(self, intervalo_seg: float = RESUMEN_INTERVALO_SEG):
+        self.intervalo_seg = intervalo_seg
+        self.ultimo: Optional[dict] = None
+        self.errores: List[str] = []
+        self._tarea: Optional[asyncio.Task] = None
+
+    async def _ejecutar(self) -> None:
+        while True:
+            await asyncio.sleep(self.intervalo_seg)
+            try:
+                async with AsyncSessionLocal() as db:
+                    self.ultimo = await actualizar(db)
+            except Exception as e:
+                self.errores.append(str(e))
+                del self.errores[:-20]
+
+    def iniciar(self) -> None:
+        if self._tarea is None and self.intervalo_seg > 0:
+            self._tarea = asyncio.get_running_loop().create_task(self._ejecutar())
+
+    def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+
+actualizador = ActualizadorResumenes()
+
+
+async def tendencia(
+    db: AsyncSession,
+    periodo: str,
+    id_producto: Optional[int] = None,
+    tipo_movimiento: Optional[str] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None
+) -> List[dict]:
+    """
+    Totales por periodo y tipo de movimiento (de un producto o de toda la tienda)
+    """
+    query = (
+        select(
+            Resumen.c.FechaInicio,
+            Resumen.c.TipoMovimiento,
+            func.sum(Resumen.c.Cantidad).label("Cantidad"),
+            func.sum(Resumen.c.Movimientos).label("Movimientos")
+        )
+        .where(Resumen.c.Periodo == periodo)
+        .group_by(Resumen.c.FechaInicio, Resumen.c.TipoMovimiento)
+        .order_by(Resumen.c.FechaInicio, Resumen.c.TipoMovimiento)
+    )
+    if id_producto is not None:
+        query = query.where(Resumen.c.IdProducto == id_producto)
+    if tipo_movimiento:
+        query = query.where(Resumen.c.TipoMovimiento == tipo_movimiento)
+    if desde:
+        query = query.where(Resumen.c.FechaInicio >= inicio_periodo(desde, periodo))
+    if hasta:
+        query = query.where(Resumen.c.FechaInicio <= hasta)
+    return [dict(fila._mapping) for fila in (await db.execute(query)).all()]
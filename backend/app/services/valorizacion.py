@@ -0,0 +1,286 @@
+"""
+Valorización del inventario y simulación de precios
+- valorizar: valor al costo y a precio de venta, margen ponderado y
+  distribución de márgenes por categoría en una sola consulta agregada
+  (GROUP BY con SUM / CASE). Los tramos de margen se comparan sin dividir
+  y en centavos enteros: margen < 10 % equivale a
+  venta_centavos * 100 < compra_centavos * 110 (exacto también en SQLite,
+  donde Numeric se guarda como REAL)
+- simular: reprecio hipotético sobre todo el catálogo. Se leen cuatro
+  columnas como float y se calcula con arreglos de NumPy (opcional); sin
+  NumPy se hace el mismo cálculo en Python puro
+
+El margen es sobre el costo, como helpers.calcular_margen_ganancia
+"""
+import math
+import time
+from collections import defaultdict
+from decimal import Decimal
+from itertools import chain
+from typing import Dict, List, Optional
+from sqlalchemy import and_, case, cast, Float, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.utils.helpers import calcular_margen_ganancia, redondear_decimal
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+# Tramos de margen (nombre, margen máximo excluido en %); el último no tiene tope
+TRAMOS_MARGEN = [
+    ("perdida", 0),
+    ("0-10", 10),
+    ("10-20", 20),
+    ("20-30", 30),
+    ("30-50", 50),
+    ("50+", None),
+]
+
+Producto = models.Producto
+
+
+def margen_ponderado(valor_venta: Decimal, valor_costo: Decimal) -> Decimal:
+    return redondear_decimal(Decimal(calcular_margen_ganancia(Decimal(valor_venta), Decimal(valor_costo))))
+
+
+def _a_decimal(valor) -> Decimal:
+    return redondear_decimal(Decimal(str(valor or 0)))
+
+
+# =============================================
+# VALORIZACIÓN
+# =============================================
+
+def consulta_valorizacion(activo: Optional[bool] = True, solo_con_stock: bool = False):
+    """
+    SELECT ... GROUP BY categoría con totales y conteo por tramo de margen
+    """
+    stock = Producto.StockActual
+    venta = func.round(Producto.PrecioVenta * 100, 0) * 100
+    compra = func.round(Producto.PrecioCompra * 100, 0)
+    columnas = [
+        Producto.IdCategoria,
+        models.Categoria.NombreCategoria,
+        func.count().label("productos"),
+        func.sum(stock).label("unidades"),
+        func.sum(stock * Producto.PrecioCompra).label("valor_costo"),
+        func.sum(stock * Producto.PrecioVenta).label("valor_venta"),
+        func.sum(case((Producto.PrecioCompra == 0, 1), else_=0)).label("sin_costo"),
+    ]
+    minimo = None
+    for nombre, maximo in TRAMOS_MARGEN:
+        condiciones = [Producto.PrecioCompra > 0]
+        if minimo is not None:
+            condiciones.append(venta >= compra * (100 + minimo))
+        if maximo is not None:
+            condiciones.append(venta < compra * (100 + maximo))
+        columnas.append(func.sum(case((and_(*condiciones), 1), else_=0)).label(f"tramo_{nombre}"))
+        minimo = maximo
+
+    query = (
+        select(*columnas)
+        .join(models.Categoria, models.Categoria.IdCategoria == Producto.IdCategoria)
+        .group_by(Producto.IdCategoria, models.Categoria.NombreCategoria)
+        .order_by(Producto.IdCategoria)
+    )
+    if activo is not None:
+        query = query.where(Producto.Activo == activo)
+    if solo_con_stock:
+        query = query.where(Producto.StockActual > 0)
+    return query
+
+
+async def valorizar(db: AsyncSession, activo: Optional[bool] = True, solo_con_stock: bool = False) -> dict:
+    """
+    Valor del inventario y distribución de márgenes por categoría y total
+    """
+    inicio = time.perf_counter()
+    filas = (await db.execute(consulta_valorizacion(activo, solo_con_stock))).all()
+
+    categorias = []
+    totales = {"productos": 0, "unidades": 0, "valor_costo": Decimal(0), "valor_venta": Decimal(0), "sin_costo": 0}
+    tramos_totales: Dict[str, int] = defaultdict(int)
+    for fila in filas:
+        datos = fila._mapping
+        valor_costo = _a_decimal(datos["valor_costo"])
+        valor_venta = _a_decimal(datos["valor_venta"])
+        tramos = {nombre: int(datos[f"tramo_{nombre}"] or 0) for nombre, _ in TRAMOS_MARGEN}
+        categorias.append({
+            "IdCategoria": datos["IdCategoria"],
+            "NombreCategoria": datos["NombreCategoria"],
+            "productos": datos["productos"],
+            "unidades": int(datos["unidades"] or 0),
+            "valor_costo": valor_costo,
+            "valor_venta": valor_venta,
+            "ganancia_potencial": valor_venta - valor_costo,
+            "margen_ponderado": margen_ponderado(valor_venta, valor_costo),
+            "sin_costo": int(datos["sin_costo"] or 0),
+            "tramos_margen": tramos,
+        })
+        totales["productos"] += datos["productos"]
+        totales["unidades"] += int(datos["unidades"] or 0)
+        totales["valor_costo"] += valor_costo
+        totales["valor_venta"] += valor_venta
+        totales["sin_costo"] += int(datos["sin_costo"] or 0)
+        for nombre, cantidad in tramos.items():
+            tramos_totales[nombre] += cantidad
+
+    totales["ganancia_potencial"] = totales["valor_venta"] - totales["valor_costo"]
+    totales["margen_ponderado"] = margen_ponderado(totales["valor_venta"], totales["valor_costo"])
+    totales["tramos_margen"] = {nombre: tramos_totales[nombre] for nombre, _ in TRAMOS_MARGEN}
+
+    return {
+        "totales": totales,
+        "categorias": categorias,
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2),
+    }
+
+
+# =============================================
+# SIMULACIÓN DE PRECIOS
+# =============================================
+
+async def _leer_catalogo(db: AsyncSession, activo: Optional[bool] = True) -> List[tuple]:
+    """
+    (IdCategoria, StockActual, PrecioCompra, PrecioVenta) como float: el
+    motor convierte y se evita crear un Decimal por valor
+    """
+    query = select(
+        Producto.IdCategoria,
+        Producto.StockActual,
+        cast(Producto.PrecioCompra, Float),
+        cast(Producto.PrecioVenta, Float),
+    )
+    if activo is not None:
+        query = query.where(Producto.Activo == activo)
+    return (await db.execute(query)).all()
+
+
+def _factor(porcentaje: Optional[Decimal]) -> float:
+    return 1 + float(porcentaje or 0) / 100
+
+
+def _simular_numpy(filas: List[tuple], escenario) -> dict:
+    # Una matriz (n, 4) de float64 armada de una pasada sobre las filas
+    matriz = np.fromiter(chain.from_iterable(filas), dtype=np.float64, count=len(filas) * 4).reshape(-1, 4)
+    categoria = matriz[:, 0].astype(np.int64)
+    stock, costo, venta = matriz[:, 1], matriz[:, 2], matriz[:, 3]
+
+    alcance = np.isin(categoria, escenario.categorias) if escenario.categorias else np.ones(len(categoria), dtype=bool)
+    costo_nuevo = np.where(alcance, costo * _factor(escenario.ajuste_costo_porcentaje), costo)
+    venta_nueva = np.where(alcance, venta * _factor(escenario.ajuste_precio_porcentaje), venta)
+    if escenario.margen_minimo is not None:
+        piso = costo_nuevo * _factor(escenario.margen_minimo)
+        venta_nueva = np.where(alcance, np.maximum(venta_nueva, piso), venta_nueva)
+    # Redondeo hacia arriba al múltiplo indicado (el round evita arrastrar
+    # el error de float: 2.05 / 0.05 = 40.99999...)
+    paso = float(escenario.redondeo)
+    venta_nueva = np.where(alcance, np.ceil(np.round(venta_nueva / paso, 6)) * paso, venta_nueva)
+
+    claves, indices = np.unique(categoria, return_inverse=True)
+
+    def por_categoria(valores) -> list:
+        return np.bincount(indices, weights=valores, minlength=len(claves)).tolist()
+
+    columnas = {
+        "productos": np.bincount(indices, minlength=len(claves)).tolist(),
+        "unidades": por_categoria(stock),
+        "valor_costo": por_categoria(stock * costo),
+        "valor_venta": por_categoria(stock * venta),
+        "valor_costo_nuevo": por_categoria(stock * costo_nuevo),
+        "valor_venta_nuevo": por_categoria(stock * venta_nueva),
+        "precios_cambiados": por_categoria((np.abs(venta_nueva - venta) >= 0.005).astype(np.float64)),
+        "bajo_costo": por_categoria((venta_nueva < costo_nuevo).astype(np.float64)),
+    }
+    return {
+        int(clave): {nombre: valores[i] for nombre, valores in columnas.items()}
+        for i, clave in enumerate(claves.tolist())
+    }
+
+
+def _simular_python(filas: List[tuple], escenario) -> dict:
+    alcance = set(escenario.categorias or [])
+    factor_costo = _factor(escenario.ajuste_costo_porcentaje)
+    factor_venta = _factor(escenario.ajuste_precio_porcentaje)
+    factor_minimo = _factor(escenario.margen_minimo) if escenario.margen_minimo is not None else None
+    paso = float(escenario.redondeo)
+
+    resultado: Dict[int, Dict[str, float]] = {}
+    for categoria, stock, costo, venta in filas:
+        fila = resultado.get(categoria)
+        if fila is None:
+            fila = resultado[categoria] = dict.fromkeys(
+                ("productos", "unidades", "valor_costo", "valor_venta", "valor_costo_nuevo",
+                 "valor_venta_nuevo", "precios_cambiados", "bajo_costo"), 0
+            )
+        costo_nuevo, venta_nueva = costo, venta
+        if not alcance or categoria in alcance:
+            costo_nuevo = costo * factor_costo
+            venta_nueva = venta * factor_venta
+            if factor_minimo is not None:
+                venta_nueva = max(venta_nueva, costo_nuevo * factor_minimo)
+            venta_nueva = math.ceil(round(venta_nueva / paso, 6)) * paso
+        fila["productos"] += 1
+        fila["unidades"] += stock
+        fila["valor_costo"] += stock * costo
+        fila["valor_venta"] += stock * venta
+        fila["valor_costo_nuevo"] += stock * costo_nuevo
+        fila["valor_venta_nuevo"] += stock * venta_nueva
+        fila["precios_cambiados"] += abs(venta_nueva - venta) >= 0.005
+        fila["bajo_costo"] += venta_nueva < costo_nuevo
+    return resultado
+
+
+async def simular(db: AsyncSession, escenario, activo: Optional[bool] = True) -> dict:
+    """
+    Aplica el escenario (SimulacionPrecios) en memoria sobre todo el catálogo
+    y compara valores y margen ponderado antes y después, por categoría
+    """
+    inicio = time.perf_counter()
+    filas = await _leer_catalogo(db, activo)
+    lectura_ms = (time.perf_counter() - inicio) * 1000
+
+    if not filas:
+        por_categoria = {}
+    elif np is not None:
+        por_categoria = _simular_numpy(filas, escenario)
+    else:
+        por_categoria = _simular_python(filas, escenario)
+
+    nombres = dict((await db.execute(select(models.Categoria.IdCategoria, models.Categoria.NombreCategoria))).all())
+
+    def resumir(valores: Dict[str, float]) -> dict:
+        valor_costo = _a_decimal(valores["valor_costo"])
+        valor_venta = _a_decimal(valores["valor_venta"])
+        valor_costo_nuevo = _a_decimal(valores["valor_costo_nuevo"])
+        valor_venta_nuevo = _a_decimal(valores["valor_venta_nuevo"])
+        return {
+            "productos": int(valores["productos"]),
+            "unidades": int(valores["unidades"]),
+            "valor_costo": valor_costo,
+            "valor_venta": valor_venta,
+            "margen_ponderado": margen_ponderado(valor_venta, valor_costo),
+            "valor_costo_nuevo": valor_costo_nuevo,
+            "valor_venta_nuevo": valor_venta_nuevo,
+            "margen_ponderado_nuevo": margen_ponderado(valor_venta_nuevo, valor_costo_nuevo),
+            "precios_cambiados": int(valores["precios_cambiados"]),
+            "bajo_costo": int(valores["bajo_costo"]),
+        }
+
+    totales = defaultdict(float)
+    for valores in por_categoria.values():
+        for nombre, valor in valores.items():
+            totales[nombre] += valor
+
+    return {
+        "motor": "numpy" if np is not None else "python",
+        "totales": resumir(totales) if por_categoria else None,
+        "categorias": [
+            {"IdCategoria": id_categoria, "NombreCategoria": nombres.get(id_categoria, ""), **resumir(valores)}
+            for id_categoria, valores in sorted(por_categoria.items())
+        ],
+        "lectura_ms": round(lectura_ms, 2),
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2),
+    }
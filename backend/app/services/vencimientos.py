@@ -0,0 +1,174 @@
+"""
+Tablero de vencimientos (productos perecederos)
+Una consulta por el índice (Activo, FechaVencimiento) trae los productos
+con stock que vencen dentro del horizonte (o ya vencidos); se guardan
+ordenados por fecha y repartidos en tramos de días. El reporte "vence en
+N días" es un bisect sobre esa lista, sin recorrer el catálogo
+
+El tablero se reconstruye al cambiar el día (los días para vencer dependen
+de la fecha), cuando vence su TTL o a pedido. Es por proceso, como la
+caché de productos
+"""
+import asyncio
+import os
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.utils.helpers import dias_para_vencer
+
+# Días hacia adelante que cubre el tablero (máximo N del reporte)
+VENCIMIENTOS_HORIZONTE_DIAS = int(os.getenv("VENCIMIENTOS_HORIZONTE_DIAS", 60))
+
+# Segundos que el tablero se reutiliza antes de volver a consultar
+# (recoge cambios de stock y de fecha de vencimiento)
+VENCIMIENTOS_TTL_SEG = float(os.getenv("VENCIMIENTOS_TTL_SEG", 300))
+
+# Tramos (nombre, días para vencer máximo incluido)
+TRAMOS = [
+    ("vencido", -1),
+    ("hoy", 0),
+    ("1-3", 3),
+    ("4-7", 7),
+    ("8-15", 15),
+    ("16-30", 30),
+    ("31-60", 60),
+    ("61+", None),
+]
+
+Producto = models.Producto
+
+
+def tramo_de(dias: int) -> str:
+    for nombre, maximo in TRAMOS:
+        if maximo is None or dias <= maximo:
+            return nombre
+    return TRAMOS[-1][0]
+
+
+class TableroVencimientos:
+    """
+    Productos próximos a vencer ordenados por FechaVencimiento
+    """
+
+    def __init__(self, horizonte_dias: int = VENCIMIENTOS_HORIZONTE_DIAS, ttl_seg: float = VENCIMIENTOS_TTL_SEG):
+        self.horizonte_dias = horizonte_dias
+        self.ttl_seg = ttl_seg
+        self.fecha: Optional[date] = None
+        self.generado: Optional[datetime] = None
+        self.items: List[dict] = []
+        self._dias: List[int] = []
+        self._expira = 0.0
+        self._lock = asyncio.Lock()
+        self.reconstrucciones = 0
+
+    def vigente(self) -> bool:
+        return self.fecha == date.today() and time.monotonic() < self._expira
+
+    def invalidar(self) -> None:
+        self._expira = 0.0
+
+    async def obtener(self, db: AsyncSession, forzar: bool = False) -> "TableroVencimientos":
+        if forzar:
+            self.invalidar()
+        if self.vigente():
+            return self
+        async with self._lock:
+            # Otra petición pudo reconstruirlo mientras se esperaba el lock
+            if not self.vigente():
+                await self.reconstruir(db)
+        return self
+
+    async def reconstruir(self, db: AsyncSession) -> None:
+        hoy = date.today()
+        limite = hoy + timedelta(days=self.horizonte_dias)
+        filas = await db.execute(
+            select(
+                Producto.IdProducto, Producto.CodigoBarras, Producto.NombreProducto,
+                Producto.IdCategoria, models.Categoria.NombreCategoria, Producto.Ubicacion,
+                Producto.Lote, Producto.FechaVencimiento, Producto.StockActual, Producto.PrecioCompra
+            )
+            .join(models.Categoria, models.Categoria.IdCategoria == Producto.IdCategoria)
+            .where(
+                Producto.Activo == True,
+                Producto.FechaVencimiento <= limite,
+                Producto.StockActual > 0
+            )
+            .order_by(Producto.FechaVencimiento, Producto.IdProducto)
+        )
+        items = []
+        for fila in filas.all():
+            item = dict(fila._mapping)
+            dias = dias_para_vencer(item["FechaVencimiento"])
+            item["dias_para_vencer"] = dias
+            item["tramo"] = tramo_de(dias)
+            item["valor_costo"] = (item["PrecioCompra"] or Decimal(0)) * item["StockActual"]
+            items.append(item)
+
+        self.items = items
+        self._dias = [item["dias_para_vencer"] for item in items]
+        self.fecha = hoy
+        self.generado = datetime.now()
+        self._expira = time.monotonic() + self.ttl_seg
+        self.reconstrucciones += 1
+
+    def hasta(self, dias: int, incluir_vencidos: bool = True) -> List[dict]:
+        """
+        Productos que vencen en N días o menos (bisect sobre la lista ordenada)
+        """
+        fin = bisect_right(self._dias, dias)
+        inicio = 0 if incluir_vencidos else bisect_right(self._dias, -1)
+        return self.items[inicio:fin]
+
+    def reporte(
+        self,
+        dias: int,
+        agrupar: str = "categoria",
+        incluir_vencidos: bool = True,
+        categoria: Optional[int] = None
+    ) -> dict:
+        items = self.hasta(dias, incluir_vencidos)
+        if categoria:
+            items = [item for item in items if item["IdCategoria"] == categoria]
+
+        tramos: Dict[str, dict] = {}
+        for item in items:
+            tramo = tramos.setdefault(item["tramo"], {"tramo": item["tramo"], "productos": 0, "unidades": 0})
+            tramo["productos"] += 1
+            tramo["unidades"] += item["StockActual"]
+
+        grupos: Dict[object, dict] = {}
+        if agrupar != "ninguno":
+            por_grupo = defaultdict(list)
+            for item in items:
+                clave = item["IdCategoria"] if agrupar == "categoria" else (item["Ubicacion"] or "")
+                por_grupo[clave].append(item)
+            for clave, contenido in por_grupo.items():
+                grupos[clave] = {
+                    "clave": str(clave),
+                    "nombre": contenido[0]["NombreCategoria"] if agrupar == "categoria" else (clave or "Sin ubicación"),
+                    "productos": len(contenido),
+                    "unidades": sum(item["StockActual"] for item in contenido),
+                    "valor_costo": sum((item["valor_costo"] for item in contenido), Decimal(0)),
+                    "items": contenido,
+                }
+
+        return {
+            "fecha": self.fecha,
+            "generado": self.generado,
+            "dias": dias,
+            "productos": len(items),
+            "unidades": sum(item["StockActual"] for item in items),
+            "valor_costo": sum((item["valor_costo"] for item in items), Decimal(0)),
+            "tramos": [tramos[nombre] for nombre, _ in TRAMOS if nombre in tramos],
+            "grupos": sorted(grupos.values(), key=lambda grupo: grupo["valor_costo"], reverse=True),
+            "items": items if agrupar == "ninguno" else [],
+        }
+
+
+tablero = TableroVencimientos()
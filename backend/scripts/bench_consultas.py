@@ -0,0 +1,102 @@
+"""
+Microbenchmark de búsquedas puntuales (por código de barras)
+Compara el costo por búsqueda de:
+- query:      db.query(Producto).filter(...).first()  (forma anterior de crud)
+- select:     select(Producto).where(...) armado en cada búsqueda
+- precompilada: crud.consulta_por_campos (sentencia en caché + parámetros)
+
+También mide solo la construcción de la sentencia, que es el overhead de
+Python que la versión precompilada elimina
+
+Uso (desde la carpeta backend, con una base generada por generar_datos_sinteticos):
+    python -m scripts.bench_consultas --url sqlite:///./jey2_bench.db --busquedas 20000
+"""
+import argparse
+import os
+import random
+import time
+
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Microbenchmark de búsquedas por campo")
+    parser.add_argument("--url", default=None, help="URL de SQLAlchemy (por defecto DATABASE_URL)")
+    parser.add_argument("--busquedas", type=int, default=20_000)
+    parser.add_argument("--semilla", type=int, default=42)
+    return parser.parse_args()
+
+
+def medir(nombre: str, funcion, valores) -> float:
+    inicio = time.perf_counter()
+    for valor in valores:
+        funcion(valor)
+    total = time.perf_counter() - inicio
+    us = total / len(valores) * 1_000_000
+    print(f"  {nombre:<28} {us:9.1f} µs/búsqueda   ({total:.2f} s)")
+    return us
+
+
+def main():
+    args = parsear_argumentos()
+
+    # La URL debe fijarse antes de importar app.database
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    from sqlalchemy import select
+    from app.database import SessionLocal, engine
+    from app import models, crud
+
+    print(f"Destino: {engine.url.render_as_string(hide_password=True)}")
+    db = SessionLocal()
+    codigos = list(db.scalars(select(models.Producto.CodigoBarras).where(models.Producto.Activo == True)))
+    if not codigos:
+        print("❌ No hay productos. Genere datos con scripts.generar_datos_sinteticos")
+        return
+
+    rng = random.Random(args.semilla)
+    valores = [rng.choice(codigos) for _ in range(args.busquedas)]
+    Producto = models.Producto
+
+    def por_query(codigo):
+        db.query(Producto).filter(Producto.CodigoBarras == codigo, Producto.Activo == True).first()
+        db.expunge_all()
+
+    def por_select(codigo):
+        db.execute(
+            select(Producto).where(Producto.CodigoBarras == codigo, Producto.Activo == True).limit(1)
+        ).scalars().first()
+        db.expunge_all()
+
+    def precompilada(codigo):
+        db.execute(
+            crud.consulta_por_campos(Producto, "CodigoBarras", "Activo"),
+            {"CodigoBarras": codigo, "Activo": True}
+        ).scalars().first()
+        db.expunge_all()
+
+    def construir_select(codigo):
+        select(Producto).where(Producto.CodigoBarras == codigo, Producto.Activo == True).limit(1)
+
+    def construir_precompilada(codigo):
+        crud.consulta_por_campos(Producto, "CodigoBarras", "Activo")
+
+    # Calentamiento: llena la caché de compilación de SQLAlchemy
+    for funcion in (por_query, por_select, precompilada):
+        for codigo in valores[:200]:
+            funcion(codigo)
+
+    print(f"\nBúsqueda completa ({args.busquedas:,} búsquedas)")
+    base = medir("query (anterior)", por_query, valores)
+    medir("select por búsqueda", por_select, valores)
+    nuevo = medir("precompilada", precompilada, valores)
+    print(f"  Mejora: {(1 - nuevo / base) * 100:.1f}%")
+
+    print("\nSolo construcción de la sentencia")
+    medir("select por búsqueda", construir_select, valores)
+    medir("precompilada", construir_precompilada, valores)
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
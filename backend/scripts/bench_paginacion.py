@@ -0,0 +1,100 @@
+"""
+Benchmark de paginación: OFFSET/LIMIT vs. cursor (keyset)
+Mide el tiempo de obtener las páginas 1, 100 y 1000 del catálogo de
+productos con ambos métodos
+
+Uso (desde la carpeta backend, con una base generada por generar_datos_sinteticos):
+    python -m scripts.bench_paginacion --url sqlite:///./jey2_bench.db --tamano 50 --paginas 1 100 1000
+"""
+import argparse
+import os
+import statistics
+import time
+
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Compara paginación por offset y por cursor")
+    parser.add_argument("--url", default=None, help="URL de SQLAlchemy (por defecto DATABASE_URL)")
+    parser.add_argument("--tamano", type=int, default=50, help="Registros por página")
+    parser.add_argument("--paginas", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--ordenar-por", default="NombreProducto")
+    return parser.parse_args()
+
+
+def cronometrar(funcion, repeticiones: int) -> float:
+    """
+    Mediana en milisegundos
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    args = parsear_argumentos()
+
+    # La URL debe fijarse antes de importar app.database
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    from sqlalchemy import select, func
+    from app.database import SessionLocal, engine
+    from app import models, crud
+
+    print(f"Destino: {engine.url.render_as_string(hide_password=True)}")
+    db = SessionLocal()
+    Producto = models.Producto
+    orden = getattr(Producto, args.ordenar_por)
+    total = db.scalar(select(func.count()).select_from(Producto))
+    print(f"Productos: {total:,} | página de {args.tamano} | orden: {args.ordenar_por}, IdProducto\n")
+
+    print(f"{'Página':>8} {'Offset (ms)':>12} {'Cursor (ms)':>12} {'Mejora':>8}")
+    for pagina in args.paginas:
+        salto = (pagina - 1) * args.tamano
+        if salto >= total:
+            print(f"{pagina:>8}  (el catálogo no tiene tantas páginas)")
+            continue
+
+        def por_offset():
+            filas = list(db.scalars(
+                select(Producto).order_by(orden, Producto.IdProducto).offset(salto).limit(args.tamano)
+            ))
+            db.expunge_all()
+            return [p.IdProducto for p in filas]
+
+        # Cursor que entregaría la página anterior (última fila antes del salto)
+        cursor = None
+        if salto:
+            anterior = db.execute(
+                select(orden, Producto.IdProducto)
+                .order_by(orden, Producto.IdProducto)
+                .offset(salto - 1).limit(1)
+            ).first()
+            claves = list(anterior) if args.ordenar_por != "IdProducto" else [anterior[1]]
+            cursor = crud.codificar_cursor(claves)
+
+        def por_cursor():
+            query = crud.paginar_por_cursor(
+                select(Producto), Producto, "IdProducto", args.tamano, cursor, args.ordenar_por
+            )
+            filas = list(db.scalars(query))[:args.tamano]
+            db.expunge_all()
+            return [p.IdProducto for p in filas]
+
+        # Ambos métodos deben devolver la misma página
+        if por_offset() != por_cursor():
+            print(f"{pagina:>8}  ❌ las páginas no coinciden")
+            continue
+        ms_offset = cronometrar(por_offset, args.repeticiones)
+        ms_cursor = cronometrar(por_cursor, args.repeticiones)
+        print(f"{pagina:>8} {ms_offset:>12.2f} {ms_cursor:>12.2f} {ms_offset / ms_cursor:>7.1f}x")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Verificación y migración del esquema de la base de datos
+Complementa ESQUEMA_MODO=verificar: los workers solo comparan la huella
+de los modelos, y este comando hace la reflexión completa cuando cambió
+
+Uso (desde la carpeta backend):
+    python -m scripts.esquema huella       # huella actual vs. guardada
+    python -m scripts.esquema verificar    # reflexión completa; registra la huella si coincide
+    python -m scripts.esquema migrar       # create_all + nueva versión de huella
+
+Si no se indica --url se usa DATABASE_URL o la conexión a SQL Server del .env
+"""
+import argparse
+import os
+import sys
+import time
+
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Verifica o migra el esquema de la base de datos")
+    parser.add_argument("accion", choices=["huella", "verificar", "migrar"])
+    parser.add_argument("--url", default=None, help="URL de SQLAlchemy (por defecto DATABASE_URL)")
+    return parser.parse_args()
+
+
+def main():
+    args = parsear_argumentos()
+
+    # La URL debe fijarse antes de importar app.database
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    from app.database import engine
+    from app.services import esquema
+
+    print(f"Destino: {engine.url.render_as_string(hide_password=True)}")
+    inicio = time.perf_counter()
+
+    actual = esquema.huella_metadata()
+    guardada = esquema.leer_huella(engine)
+    print(f"Huella de los modelos: {actual}")
+    print(f"Huella registrada:     {guardada or '(ninguna)'}")
+
+    if args.accion == "huella":
+        sys.exit(0 if actual == guardada else 1)
+
+    if args.accion == "verificar":
+        diferencias = esquema.diferencias_esquema(engine)
+        for diferencia in diferencias:
+            print(f"  - {diferencia}")
+        if diferencias:
+            print(f"❌ {len(diferencias)} diferencias. Ejecute: python -m scripts.esquema migrar")
+            sys.exit(1)
+        resultado = esquema.guardar_huella(engine)
+        print(f"✅ Esquema consistente. Huella registrada (versión {resultado['version']})")
+
+    if args.accion == "migrar":
+        resultado = esquema.migrar(engine)
+        for pendiente in resultado["pendientes"]:
+            print(f"  - Requiere ALTER manual: {pendiente}")
+        print(f"✅ Migración aplicada. Versión del esquema: {resultado['version']}")
+
+    print(f"Tiempo: {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Prueba de estrés de movimientos de stock concurrentes
+Lanza muchas ENTRADAS y SALIDAS simultáneas sobre un mismo producto y
+verifica que no se pierdan actualizaciones:
+- stock final = stock inicial + entradas aplicadas - salidas aplicadas
+- el stock nunca queda negativo
+- cada movimiento registrado es coherente (StockNuevo - StockAnterior)
+- hay un movimiento por cada operación aplicada
+
+--modo ingenuo reproduce la forma anterior (leer, modificar en Python y
+guardar) para comparar
+
+Uso (desde la carpeta backend, con una base generada por generar_datos_sinteticos):
+    python -m scripts.estres_stock --url sqlite:///./jey2_bench.db --operaciones 2000 --concurrencia 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Estrés de movimientos de stock concurrentes")
+    parser.add_argument("--url", default=None, help="URL de SQLAlchemy (por defecto DATABASE_URL)")
+    parser.add_argument("--producto", type=int, default=None, help="IdProducto (por defecto el primero activo)")
+    parser.add_argument("--operaciones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--stock-inicial", type=int, default=100)
+    parser.add_argument("--modo", choices=["atomico", "ingenuo"], default="atomico")
+    parser.add_argument("--semilla", type=int, default=42)
+    return parser.parse_args()
+
+
+async def main():
+    args = parsear_argumentos()
+
+    # La URL debe fijarse antes de importar app.database
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    from fastapi import HTTPException
+    from sqlalchemy import select, update, func
+    from app.database import AsyncSessionLocal, async_engine
+    from app import models
+    from app.services import inventario
+
+    Producto = models.Producto
+    referencia = f"estres-{uuid.uuid4().hex[:12]}"
+
+    async with AsyncSessionLocal() as db:
+        id_producto = args.producto or await db.scalar(
+            select(Producto.IdProducto).where(Producto.Activo == True).order_by(Producto.IdProducto).limit(1)
+        )
+        id_usuario = await db.scalar(select(models.Usuario.IdUsuario).order_by(models.Usuario.IdUsuario).limit(1))
+        if id_producto is None or id_usuario is None:
+            print("❌ Se necesitan al menos un producto y un usuario. Genere datos con scripts.generar_datos_sinteticos")
+            return 1
+        await db.execute(
+            update(Producto).where(Producto.IdProducto == id_producto).values(StockActual=args.stock_inicial)
+        )
+        await db.commit()
+
+    print(f"Destino: {async_engine.url.render_as_string(hide_password=True)}")
+    print(f"Producto {id_producto} | stock inicial {args.stock_inicial} | "
+          f"{args.operaciones:,} operaciones | concurrencia {args.concurrencia} | modo {args.modo}\n")
+
+    rng = random.Random(args.semilla)
+    # Más salidas que entradas: fuerza la condición de stock insuficiente
+    operaciones = [
+        ("SALIDA" if rng.random() < 0.6 else "ENTRADA", rng.randint(1, 3))
+        for _ in range(args.operaciones)
+    ]
+    cola: asyncio.Queue = asyncio.Queue()
+    for operacion in operaciones:
+        cola.put_nowait(operacion)
+
+    aplicadas = {"ENTRADA": 0, "SALIDA": 0}
+    rechazos = 0
+    errores = 0
+
+    async def ingenuo(db, tipo, cantidad):
+        # Forma anterior: la lectura y la escritura no son atómicas
+        producto = await db.get(Producto, id_producto)
+        anterior = producto.StockActual
+        await asyncio.sleep(0)
+        if tipo == "SALIDA" and anterior < cantidad:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Stock insuficiente")
+        producto.StockActual = anterior + (cantidad if tipo == "ENTRADA" else -cantidad)
+        db.add(models.MovimientoInventario(
+            IdProducto=id_producto, TipoMovimiento=tipo, Cantidad=cantidad,
+            StockAnterior=anterior, StockNuevo=producto.StockActual,
+            IdUsuario=id_usuario, Referencia=referencia
+        ))
+        await db.commit()
+
+    async def trabajador():
+        nonlocal rechazos, errores
+        while not cola.empty():
+            tipo, cantidad = cola.get_nowait()
+            async with AsyncSessionLocal() as db:
+                try:
+                    if args.modo == "atomico":
+                        await inventario.mover_stock(
+                            db, id_producto, tipo, cantidad, id_usuario, referencia=referencia
+                        )
+                    else:
+                        await ingenuo(db, tipo, cantidad)
+                    aplicadas[tipo] += cantidad
+                except HTTPException:
+                    rechazos += 1
+                except Exception:
+                    errores += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(args.concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    async with AsyncSessionLocal() as db:
+        stock_final = await db.scalar(select(Producto.StockActual).where(Producto.IdProducto == id_producto))
+        movimientos = (await db.execute(
+            select(
+                models.MovimientoInventario.TipoMovimiento,
+                models.MovimientoInventario.Cantidad,
+                models.MovimientoInventario.StockAnterior,
+                models.MovimientoInventario.StockNuevo,
+            ).where(models.MovimientoInventario.Referencia == referencia)
+        )).all()
+        minimo = await db.scalar(
+            select(func.min(models.MovimientoInventario.StockNuevo))
+            .where(models.MovimientoInventario.Referencia == referencia)
+        )
+
+    esperado = args.stock_inicial + aplicadas["ENTRADA"] - aplicadas["SALIDA"]
+    incoherentes = sum(
+        1 for tipo, cantidad, anterior, nuevo in movimientos
+        if nuevo - anterior != (cantidad if tipo == "ENTRADA" else -cantidad)
+    )
+
+    print(f"Duración: {duracion:.2f} s ({len(operaciones) / duracion:,.0f} ops/s)")
+    print(f"Aplicadas: {len(movimientos):,} | rechazadas por stock: {rechazos:,} | errores: {errores:,}")
+    print(f"Stock final: {stock_final} | esperado: {esperado} | mínimo registrado: {minimo}")
+
+    fallas = []
+    if stock_final != esperado:
+        fallas.append(f"actualizaciones perdidas: diferencia de {esperado - stock_final}")
+    if stock_final < 0 or (minimo is not None and minimo < 0):
+        fallas.append("el stock quedó negativo")
+    if incoherentes:
+        fallas.append(f"{incoherentes} movimientos con StockNuevo - StockAnterior incorrecto")
+    if len(movimientos) != len(operaciones) - rechazos - errores:
+        fallas.append("la cantidad de movimientos no coincide con las operaciones aplicadas")
+    if fallas:
+        for falla in fallas:
+            print(f"❌ {falla}")
+        return 1
+    print("✅ Sin actualizaciones perdidas")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
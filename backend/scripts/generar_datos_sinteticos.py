@@ -0,0 +1,446 @@
+"""
+Generador de una tienda sintética para pruebas de rendimiento
+Llena una base vacía (SQLite o SQL Server) con catálogos, productos,
+ventas y movimientos de inventario con volúmenes realistas
+
+Uso (desde la carpeta backend):
+    python -m scripts.generar_datos_sinteticos --url sqlite:///./jey2_bench.db
+    python -m scripts.generar_datos_sinteticos --productos 1000 --ventas 5000 --movimientos 20000
+
+Si no se indica --url se usa DATABASE_URL o la conexión a SQL Server del .env
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+# =============================================
+# CATÁLOGOS BASE
+# =============================================
+
+ROLES = ["Administrador", "Cajero", "Bodeguero"]
+
+CATEGORIAS = [
+    "Abarrotes", "Bebidas", "Lácteos", "Carnes Rojas", "Pollo", "Embutidos",
+    "Mariscos", "Panadería", "Frutas", "Verduras", "Limpieza", "Higiene Personal",
+    "Snacks", "Dulces", "Enlatados", "Granos", "Condimentos", "Congelados",
+    "Licores", "Mascotas", "Bebés", "Farmacia", "Ferretería", "Papelería",
+    "Desechables", "Café y Té", "Cereales", "Aceites", "Pastas", "Salsas",
+]
+
+# Categorías con fecha de vencimiento
+PERECEDEROS = {"Lácteos", "Carnes Rojas", "Pollo", "Embutidos", "Mariscos", "Panadería", "Frutas", "Verduras"}
+
+UNIDADES = [("Unidad", "UND"), ("Kilogramo", "KG"), ("Libra", "LB"), ("Litro", "LT"), ("Paquete", "PAQ"), ("Caja", "CJA")]
+
+METODOS_PAGO = ["Efectivo", "Tarjeta", "Yappy", "Transferencia"]
+
+PALABRAS = [
+    "Arroz", "Frijol", "Azúcar", "Café", "Leche", "Queso", "Jamón", "Pollo", "Res", "Cerdo",
+    "Atún", "Sardina", "Aceite", "Harina", "Maíz", "Avena", "Galleta", "Jugo", "Agua", "Soda",
+    "Jabón", "Detergente", "Cloro", "Papel", "Pasta", "Salsa", "Tomate", "Cebolla", "Papa", "Plátano",
+    "Mantequilla", "Yogur", "Huevo", "Pan", "Chorizo", "Salchicha", "Camarón", "Corvina", "Limón", "Piña",
+]
+
+ADJETIVOS = [
+    "Premium", "Clásico", "Integral", "Light", "Orgánico", "Económico", "Familiar", "Tradicional",
+    "Selecto", "Especial", "Natural", "Picante", "Dulce", "Ahumado", "Fresco", "Nacional",
+]
+
+PRESENTACIONES = ["250g", "500g", "1kg", "2kg", "5lb", "1L", "2L", "12oz", "6 pack", "24 und"]
+
+MARCAS = ["Elda", "Del Istmo", "La Chorrera", "Coclé", "Azuero", "Chiriquí", "Bocas", "Darién", "Veraguas", "Colón"]
+
+# =============================================
+# UTILIDADES
+# =============================================
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Genera una tienda sintética para pruebas de rendimiento")
+    parser.add_argument("--url", default=None, help="URL de SQLAlchemy (por defecto DATABASE_URL)")
+    parser.add_argument("--productos", type=int, default=100_000)
+    parser.add_argument("--ventas", type=int, default=1_000_000)
+    parser.add_argument("--max-detalles", type=int, default=3, help="Máximo de líneas por venta")
+    parser.add_argument("--movimientos", type=int, default=5_000_000)
+    parser.add_argument("--clientes", type=int, default=5_000)
+    parser.add_argument("--proveedores", type=int, default=500)
+    parser.add_argument("--ordenes", type=int, default=20_000, help="Órdenes de compra")
+    parser.add_argument("--lote", type=int, default=10_000, help="Filas por INSERT masivo")
+    parser.add_argument("--semilla", type=int, default=42)
+    return parser.parse_args()
+
+
+@contextmanager
+def identity_insert(conn, tabla: str):
+    """
+    Permite insertar IDs explícitos en columnas IDENTITY de SQL Server
+    """
+    if conn.dialect.name == "mssql":
+        conn.exec_driver_sql(f"SET IDENTITY_INSERT {tabla} ON")
+    try:
+        yield
+    finally:
+        if conn.dialect.name == "mssql":
+            conn.exec_driver_sql(f"SET IDENTITY_INSERT {tabla} OFF")
+
+
+def insertar_por_lotes(engine, model, filas, lote: int, ids_explicitos: bool = False) -> int:
+    """
+    Inserta un iterable de diccionarios en lotes (executemany)
+    Cada lote se confirma en su propia transacción
+    """
+    total = 0
+    buffer = []
+
+    def vaciar():
+        with engine.begin() as conn:
+            if ids_explicitos:
+                with identity_insert(conn, model.__tablename__):
+                    conn.execute(model.__table__.insert(), buffer)
+            else:
+                conn.execute(model.__table__.insert(), buffer)
+
+    for fila in filas:
+        buffer.append(fila)
+        if len(buffer) >= lote:
+            vaciar()
+            total += len(buffer)
+            buffer = []
+            print(f"   {model.__tablename__}: {total:,} filas", end="\r")
+
+    if buffer:
+        vaciar()
+        total += len(buffer)
+
+    print(f"   {model.__tablename__}: {total:,} filas")
+    return total
+
+
+def dinero(valor: float) -> Decimal:
+    return Decimal(f"{valor:.2f}")
+
+
+# =============================================
+# GENERADORES DE FILAS
+# =============================================
+
+def generar_productos(rng, cantidad, ids_categoria, ids_unidad, stock):
+    hoy = date.today()
+    for i in range(1, cantidad + 1):
+        id_categoria = rng.choice(ids_categoria)
+        categoria = CATEGORIAS[id_categoria - 1]
+        compra = rng.uniform(0.25, 60)
+        venta = compra * rng.uniform(1.05, 1.6)
+
+        yield {
+            "IdProducto": i,
+            "CodigoBarras": str(7450000000000 + i),
+            "NombreProducto": (
+                f"{rng.choice(PALABRAS)} {rng.choice(ADJETIVOS)} "
+                f"{rng.choice(MARCAS)} {rng.choice(PRESENTACIONES)} #{i}"
+            ),
+            "Descripcion": None,
+            "IdCategoria": id_categoria,
+            "IdUnidad": rng.choice(ids_unidad),
+            "PrecioCompra": dinero(compra),
+            "PrecioVenta": dinero(venta),
+            "StockActual": stock[i],
+            "StockMinimo": rng.randint(2, 20),
+            "StockMaximo": rng.randint(50, 500),
+            "FechaVencimiento": (
+                hoy + timedelta(days=rng.randint(-10, 120)) if categoria in PERECEDEROS else None
+            ),
+            "Lote": f"L{rng.randint(1000, 9999)}" if categoria in PERECEDEROS else None,
+            "Ubicacion": f"Pasillo {rng.randint(1, 20)}",
+            "Activo": rng.random() > 0.03,
+        }
+
+
+def generar_ventas(rng, cantidad, max_detalles, num_productos, precios, ids_usuario, num_clientes, detalles):
+    """
+    Genera ventas y acumula sus detalles en la lista 'detalles'
+    (se vacía por lotes desde el llamador)
+    """
+    inicio = datetime.now() - timedelta(days=365)
+    paso = 365 * 24 * 3600 / max(cantidad, 1)
+
+    for i in range(1, cantidad + 1):
+        subtotal = Decimal("0")
+        for _ in range(rng.randint(1, max_detalles)):
+            id_producto = rng.randint(1, num_productos)
+            cantidad_linea = rng.randint(1, 5)
+            precio = precios[id_producto]
+            linea = precio * cantidad_linea
+            subtotal += linea
+            detalles.append({
+                "IdVenta": i,
+                "IdProducto": id_producto,
+                "Cantidad": cantidad_linea,
+                "PrecioUnitario": precio,
+                "Descuento": Decimal("0"),
+                "SubTotal": linea,
+            })
+
+        impuesto = (subtotal * Decimal("0.07")).quantize(Decimal("0.01"))
+        yield {
+            "IdVenta": i,
+            "NumeroVenta": f"V-{i:08d}",
+            "FechaVenta": inicio + timedelta(seconds=i * paso),
+            "IdCliente": rng.randint(1, num_clientes) if rng.random() < 0.3 else None,
+            "IdUsuario": rng.choice(ids_usuario),
+            "SubTotal": subtotal,
+            "Descuento": Decimal("0"),
+            "Impuesto": impuesto,
+            "Total": subtotal + impuesto,
+            "IdMetodoPago": rng.randint(1, len(METODOS_PAGO)),
+            "EstadoVenta": "COMPLETADA",
+        }
+
+
+def generar_ordenes_compra(rng, cantidad, num_proveedores, num_productos, costos, ids_usuario, detalles):
+    """
+    Genera órdenes de compra y acumula sus detalles en 'detalles'
+    """
+    inicio = datetime.now() - timedelta(days=365)
+    estados = ["PENDIENTE", "RECIBIDA", "RECIBIDA", "RECIBIDA", "CANCELADA"]
+
+    for i in range(1, cantidad + 1):
+        subtotal = Decimal("0")
+        for _ in range(rng.randint(1, 8)):
+            id_producto = rng.randint(1, num_productos)
+            cantidad_linea = rng.randint(6, 120)
+            linea = costos[id_producto] * cantidad_linea
+            subtotal += linea
+            detalles.append({
+                "IdOrdenCompra": i,
+                "IdProducto": id_producto,
+                "Cantidad": cantidad_linea,
+                "PrecioUnitario": costos[id_producto],
+                "SubTotal": linea,
+                "CantidadRecibida": cantidad_linea,
+            })
+
+        yield {
+            "IdOrdenCompra": i,
+            "NumeroOrden": f"OC-{i:07d}",
+            "IdProveedor": rng.randint(1, num_proveedores),
+            "FechaOrden": inicio + timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+            "EstadoOrden": rng.choice(estados),
+            "SubTotal": subtotal,
+            "Impuesto": Decimal("0"),
+            "Total": subtotal,
+            "IdUsuarioCreacion": rng.choice(ids_usuario),
+        }
+
+
+def generar_movimientos(rng, cantidad, num_productos, stock, ids_usuario):
+    """
+    Genera movimientos en orden cronológico manteniendo la cadena
+    StockAnterior -> StockNuevo de cada producto (modifica 'stock')
+    """
+    inicio = datetime.now() - timedelta(days=365)
+    paso = 365 * 24 * 3600 / max(cantidad, 1)
+
+    for i in range(cantidad):
+        id_producto = rng.randint(1, num_productos)
+        anterior = stock[id_producto]
+        sorteo = rng.random()
+
+        if sorteo < 0.02:
+            tipo = "AJUSTE"
+            cantidad_mov = rng.randint(0, 300)
+            nuevo = cantidad_mov
+        elif sorteo < 0.6 and anterior > 0:
+            tipo = "SALIDA"
+            cantidad_mov = rng.randint(1, min(anterior, 10))
+            nuevo = anterior - cantidad_mov
+        else:
+            tipo = "ENTRADA"
+            cantidad_mov = rng.randint(1, 48)
+            nuevo = anterior + cantidad_mov
+
+        stock[id_producto] = nuevo
+        yield {
+            "IdProducto": id_producto,
+            "TipoMovimiento": tipo,
+            "Cantidad": cantidad_mov,
+            "StockAnterior": anterior,
+            "StockNuevo": nuevo,
+            "Motivo": None,
+            "IdUsuario": rng.choice(ids_usuario),
+            "FechaMovimiento": inicio + timedelta(seconds=i * paso),
+            "Referencia": None,
+        }
+
+
+# =============================================
+# PROGRAMA PRINCIPAL
+# =============================================
+
+def main():
+    args = parsear_argumentos()
+
+    # La URL debe fijarse antes de importar app.database
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    from sqlalchemy import select, func, update, bindparam
+    from app.database import engine, Base
+    from app import models
+    from app.utils import security
+
+    rng = random.Random(args.semilla)
+    inicio = time.perf_counter()
+
+    print(f"Destino: {engine.url.render_as_string(hide_password=True)}")
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(models.Producto)).scalar():
+            print("❌ La tabla Productos ya tiene datos. Use una base vacía.")
+            sys.exit(1)
+
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+    # Catálogos
+    print("Catálogos...")
+    insertar_por_lotes(engine, models.Rol, (
+        {"IdRol": i, "NombreRol": nombre, "Activo": True} for i, nombre in enumerate(ROLES, 1)
+    ), args.lote, ids_explicitos=True)
+
+    hash_demo = security.hash_password("Jey2demo1")
+    ids_usuario = list(range(1, 21))
+    insertar_por_lotes(engine, models.Usuario, (
+        {
+            "IdUsuario": i,
+            "NombreUsuario": f"usuario{i:02d}",
+            "ContrasenaHash": hash_demo,
+            "NombreCompleto": f"Usuario Sintético {i}",
+            "IdRol": 1 if i == 1 else rng.randint(2, len(ROLES)),
+            "IntentosLogin": 0,
+            "Bloqueado": False,
+            "Activo": True,
+        }
+        for i in ids_usuario
+    ), args.lote, ids_explicitos=True)
+
+    ids_categoria = list(range(1, len(CATEGORIAS) + 1))
+    insertar_por_lotes(engine, models.Categoria, (
+        {"IdCategoria": i, "NombreCategoria": nombre, "Activo": True}
+        for i, nombre in enumerate(CATEGORIAS, 1)
+    ), args.lote, ids_explicitos=True)
+
+    ids_unidad = list(range(1, len(UNIDADES) + 1))
+    insertar_por_lotes(engine, models.UnidadMedida, (
+        {"IdUnidad": i, "NombreUnidad": nombre, "Abreviatura": abrev, "Activo": True}
+        for i, (nombre, abrev) in enumerate(UNIDADES, 1)
+    ), args.lote, ids_explicitos=True)
+
+    insertar_por_lotes(engine, models.MetodoPago, (
+        {"IdMetodoPago": i, "NombreMetodo": nombre, "Activo": True}
+        for i, nombre in enumerate(METODOS_PAGO, 1)
+    ), args.lote, ids_explicitos=True)
+
+    insertar_por_lotes(engine, models.Cliente, (
+        {
+            "IdCliente": i,
+            "TipoDocumento": "CEDULA",
+            "NumeroDocumento": f"8-{i // 1000}-{i:06d}",
+            "NombreCompleto": f"Cliente {rng.choice(MARCAS)} {i}",
+            "Activo": True,
+        }
+        for i in range(1, args.clientes + 1)
+    ), args.lote, ids_explicitos=True)
+
+    insertar_por_lotes(engine, models.Proveedor, (
+        {
+            "IdProveedor": i,
+            "NombreProveedor": f"Distribuidora {rng.choice(MARCAS)} {rng.choice(PALABRAS)} {i}",
+            "RUC": f"155{i:06d}-2-{i % 100:02d}",
+            "Email": f"ventas{i}@proveedor.com.pa",
+            "ContactoPrincipal": f"Contacto {i}",
+            "Activo": True,
+        }
+        for i in range(1, args.proveedores + 1)
+    ), args.lote, ids_explicitos=True)
+
+    # Productos
+    print("Productos...")
+    stock = [0] + [rng.randint(0, 200) for _ in range(args.productos)]
+    precios = {}
+    costos = {}
+
+    def productos_con_precio():
+        for fila in generar_productos(rng, args.productos, ids_categoria, ids_unidad, stock):
+            precios[fila["IdProducto"]] = fila["PrecioVenta"]
+            costos[fila["IdProducto"]] = fila["PrecioCompra"]
+            yield fila
+
+    insertar_por_lotes(engine, models.Producto, productos_con_precio(), args.lote, ids_explicitos=True)
+
+    # Órdenes de compra y sus detalles
+    if args.ordenes and args.productos and args.proveedores:
+        print("Órdenes de compra...")
+        detalles_orden = []
+        insertar_por_lotes(engine, models.OrdenCompra, list(generar_ordenes_compra(
+            rng, args.ordenes, args.proveedores, args.productos, costos, ids_usuario, detalles_orden
+        )), args.lote, ids_explicitos=True)
+        insertar_por_lotes(engine, models.DetalleOrdenCompra, detalles_orden, args.lote)
+
+    # Ventas y sus detalles
+    if args.ventas and args.productos:
+        print("Ventas...")
+        detalles = []
+        total_detalles = 0
+        buffer_ventas = []
+
+        for venta in generar_ventas(
+            rng, args.ventas, args.max_detalles, args.productos,
+            precios, ids_usuario, args.clientes, detalles
+        ):
+            buffer_ventas.append(venta)
+            if len(buffer_ventas) >= args.lote:
+                insertar_por_lotes(engine, models.Venta, buffer_ventas, args.lote, ids_explicitos=True)
+                total_detalles += insertar_por_lotes(engine, models.DetalleVenta, detalles, args.lote)
+                buffer_ventas = []
+                detalles.clear()
+
+        if buffer_ventas:
+            insertar_por_lotes(engine, models.Venta, buffer_ventas, args.lote, ids_explicitos=True)
+            total_detalles += insertar_por_lotes(engine, models.DetalleVenta, detalles, args.lote)
+
+        print(f"   Detalles de venta totales: {total_detalles:,}")
+
+    # Movimientos de inventario
+    if args.movimientos and args.productos:
+        print("Movimientos de inventario...")
+        insertar_por_lotes(
+            engine, models.MovimientoInventario,
+            generar_movimientos(rng, args.movimientos, args.productos, stock, ids_usuario),
+            args.lote
+        )
+
+        # Dejar StockActual consistente con el último movimiento
+        print("Actualizando StockActual...")
+        stmt = update(models.Producto.__table__).where(
+            models.Producto.__table__.c.IdProducto == bindparam("b_id")
+        ).values(StockActual=bindparam("b_stock"))
+
+        for desde in range(1, args.productos + 1, args.lote):
+            hasta = min(desde + args.lote, args.productos + 1)
+            with engine.begin() as conn:
+                conn.execute(stmt, [
+                    {"b_id": i, "b_stock": stock[i]} for i in range(desde, hasta)
+                ])
+
+    print(f"✅ Tienda sintética generada en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
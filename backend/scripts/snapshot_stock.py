@@ -0,0 +1,84 @@
+"""
+Snapshot periódico del stock (ledger de inventario)
+Pensado para ejecutarse desde cron / el programador de tareas (por ejemplo
+cada noche y al cierre de mes). Solo escribe los productos con movimientos
+desde su snapshot anterior
+
+Uso (desde la carpeta backend):
+    python -m scripts.snapshot_stock                          # corte = ahora
+    python -m scripts.snapshot_stock --corte 2026-10-01       # cierre de septiembre
+    python -m scripts.snapshot_stock --verificar              # snapshot + consistencia
+    python -m scripts.snapshot_stock --solo-verificar
+    python -m scripts.snapshot_stock --resumenes              # + movimientos pendientes de resumir
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime
+
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Snapshot del stock y verificación del ledger")
+    parser.add_argument("--url", default=None, help="URL de SQLAlchemy (por defecto DATABASE_URL)")
+    parser.add_argument("--corte", type=datetime.fromisoformat, default=None,
+                        help="Instante del corte (AAAA-MM-DD[ HH:MM:SS]); por defecto ahora")
+    parser.add_argument("--verificar", action="store_true", help="Verificar consistencia después del snapshot")
+    parser.add_argument("--solo-verificar", action="store_true", help="Solo verificar consistencia")
+    parser.add_argument("--resumenes", action="store_true", help="Actualizar también los resúmenes diarios/semanales")
+    return parser.parse_args()
+
+
+async def main():
+    args = parsear_argumentos()
+
+    # La URL debe fijarse antes de importar app.database
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    from fastapi import HTTPException
+    from app.database import AsyncSessionLocal, async_engine
+    from app.services import ledger_inventario, resumen_movimientos
+
+    print(f"Destino: {async_engine.url.render_as_string(hide_password=True)}")
+
+    if not args.solo_verificar:
+        async with AsyncSessionLocal() as db:
+            try:
+                resultado = await ledger_inventario.tomar_snapshot(db, args.corte)
+            except HTTPException as e:
+                print(f"❌ {e.detail}")
+                return 1
+        print(f"✅ Snapshot al {resultado['corte']} | último movimiento {resultado['IdUltimoMovimiento']} | "
+              f"{resultado['productos']:,} productos | {resultado['duracion_ms']:.0f} ms")
+
+    if args.resumenes:
+        async with AsyncSessionLocal() as db:
+            resumen = await resumen_movimientos.actualizar(db)
+        print(f"✅ Resúmenes al día | {resumen['movimientos']:,} movimientos pendientes agregados | "
+              f"{resumen['duracion_ms']:.0f} ms")
+
+    if args.verificar or args.solo_verificar:
+        async with AsyncSessionLocal() as db:
+            reporte = await ledger_inventario.verificar_consistencia(db)
+        print(f"Productos revisados: {reporte['productos_revisados']:,} | "
+              f"movimientos reproducidos: {reporte['movimientos_reproducidos']:,} | "
+              f"snapshots revisados: {reporte['snapshots_revisados']:,} | "
+              f"{reporte['duracion_ms']:.0f} ms")
+        for diferencia in reporte["diferencias"][:20]:
+            print(f"   Producto {diferencia['IdProducto']}: StockActual {diferencia['StockActual']} "
+                  f"vs ledger {diferencia['stock_reproducido']}")
+        for snapshot in reporte["snapshots_incoherentes"][:20]:
+            print(f"   Snapshot {snapshot['FechaCorte']} producto {snapshot['IdProducto']}: "
+                  f"Stock {snapshot['Stock']} vs ledger {snapshot['stock_reproducido']}")
+        if reporte["total_diferencias"] or reporte["total_incoherencias"] or reporte["total_snapshots_incoherentes"]:
+            print(f"❌ {reporte['total_diferencias']:,} productos con diferencias | "
+                  f"{reporte['total_incoherencias']:,} movimientos incoherentes | "
+                  f"{reporte['total_snapshots_incoherentes']:,} snapshots incoherentes")
+            return 1
+        print("✅ StockActual y los snapshots coinciden con el ledger")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))